@@ -19,8 +19,12 @@ from flask_mail import Mail
 from config import config
 from models import db, User
 from utils import get_currency_symbol
+from money import format_money
 from middleware import add_security_headers
+from commands import register_commands
 from extensions import csrf, limiter
+from services.dashboard_cache import dashboard_cache
+from services.categorizer import rule_cache
 
 # Create instances
 login_manager = LoginManager()
@@ -70,6 +74,12 @@ def create_app(config_name=None):
     # Rate limiting (disabled in testing)
     limiter.init_app(app)
     
+    # Dashboard cache (size limits come from the config)
+    dashboard_cache.init_app(app)
+    
+    # Compiled categorization rules (per user, see services/categorizer.py)
+    rule_cache.init_app(app)
+    
     # Initialize login manager
     login_manager.init_app(app)
     login_manager.login_view = 'auth.login'  # Redirect here if not logged in
@@ -86,20 +96,30 @@ def create_app(config_name=None):
         """Convert currency code to symbol for use in templates."""
         return get_currency_symbol(currency_code)
     
+    @app.template_filter('money')
+    def money_filter(amount, currency_code=None):
+        """Format an amount with the currency's decimals (none for JPY)."""
+        return format_money(amount, currency_code)
+    
     # Register blueprints (route modules)
     # Blueprints help organize routes into separate files
     from routes.main import main_bp
     from routes.transactions import transactions_bp
     from routes.accounts import accounts_bp
     from routes.categories import categories_bp
+    from routes.budgets import budgets_bp
     from routes.auth import auth_bp
     
     app.register_blueprint(main_bp)
     app.register_blueprint(transactions_bp, url_prefix='/transactions')
     app.register_blueprint(accounts_bp, url_prefix='/accounts')
     app.register_blueprint(categories_bp, url_prefix='/categories')
+    app.register_blueprint(budgets_bp, url_prefix='/budgets')
     app.register_blueprint(auth_bp, url_prefix='/auth')
     
+    # Maintenance commands (flask rebuild-rollups, ...)
+    register_commands(app)
+    
     # Favicon route (prevents 404 for /favicon.ico)
     @app.route('/favicon.ico')
     def favicon():
@@ -113,11 +133,26 @@ def create_app(config_name=None):
     with app.app_context():
         db.create_all()
         
+        # Bring existing databases up to date (new indexes, columns, ...)
+        if app.config['AUTO_MIGRATE']:
+            from schema_migrations import upgrade
+            upgrade(db.engine)
+        
         # Create sample data only in development
         if app.config['DEBUG']:
             from seed_data import create_sample_data
             create_sample_data()
     
+    # Post due recurring transactions in the background (off by default)
+    if app.config['RECURRING_SCHEDULER_INTERVAL'] > 0 and not app.config['TESTING']:
+        from services.recurring import start_scheduler
+        start_scheduler(app, app.config['RECURRING_SCHEDULER_INTERVAL'])
+    
+    # Turn queued budget events into alerts in the background
+    if app.config['BUDGET_ALERT_INTERVAL'] > 0 and not app.config['TESTING']:
+        from services.budget_alerts import start_worker
+        start_worker(app, app.config['BUDGET_ALERT_INTERVAL'])
+    
     return app
 
 
@@ -0,0 +1,99 @@
+"""
+Command line tools for maintenance tasks.
+
+Run them with the flask CLI, for example:
+    flask --app app rebuild-rollups
+"""
+import click
+from models import db
+
+
+def register_commands(app):
+    """Register the maintenance commands with the app."""
+
+    @app.cli.command('rebuild-rollups')
+    @click.option('--user-id', type=int, default=None,
+                  help='Only rebuild this user (default: all users).')
+    def rebuild_rollups(user_id):
+        """Recompute monthly rollups from the transactions table (backfill)."""
+        from services import rollups
+        rows = rollups.rebuild(user_id)
+        db.session.commit()
+        click.echo(f'Rebuilt {rows} rollup rows.')
+
+    @app.cli.command('migrate-db')
+    @click.option('--status', is_flag=True,
+                  help='Only list pending migrations, apply nothing.')
+    def migrate_db(status):
+        """Apply pending schema migrations (see schema_migrations.py)."""
+        import schema_migrations
+        if status:
+            pending = schema_migrations.pending_migrations(db.engine)
+            for version, description, steps in pending:
+                click.echo(f'{version}: {description}')
+            click.echo(f'{len(pending)} pending migration(s).')
+            return
+        applied = schema_migrations.upgrade(db.engine)
+        click.echo(f'Applied {len(applied)} migration(s).')
+
+    @app.cli.command('post-recurring')
+    @click.option('--date', 'until', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+                  help='Post occurrences up to this date (default: today).')
+    def post_recurring(until):
+        """Post due recurring transactions for all users (safe to re-run)."""
+        from services.recurring import post_due
+        result = post_due(today=until.date() if until else None,
+                          batch_size=app.config['RECURRING_BATCH_SIZE'])
+        click.echo(f'Posted {result.posted} transaction(s) from {result.items} recurring item(s)'
+                   f'{f", {result.skipped} already posted" if result.skipped else ""}.')
+
+    @app.cli.command('verify-ledger')
+    @click.option('--repair', is_flag=True, help='Fix balances that are wrong.')
+    @click.option('--incremental', is_flag=True,
+                  help='Only check accounts whose balance changed since the last run.')
+    @click.option('--workers', type=int, default=None,
+                  help='Processes to check with (default: LEDGER_WORKERS).')
+    def verify_ledger(repair, incremental, workers):
+        """Check stored balances against starting balance + transactions."""
+        from services.ledger import verify_ledger as run
+        result = run(repair=repair, incremental=incremental,
+                     batch_size=app.config['LEDGER_BATCH_SIZE'],
+                     workers=workers or app.config['LEDGER_WORKERS'])
+        for drift in result.drifts:
+            click.echo(f'Account {drift.account_id} (user {drift.user_id}): '
+                       f'balance {drift.stored:.2f}, transactions say {drift.expected:.2f}')
+        click.echo(f'Checked {result.checked} account(s), {len(result.drifts)} wrong'
+                   f'{f", {result.repaired} repaired" if repair else ""}.')
+
+    @app.cli.command('move-category')
+    @click.argument('old_category_id', type=int)
+    @click.argument('new_category_id', type=int, required=False)
+    @click.option('--batch-size', type=int, default=None,
+                  help='Transactions per commit (default: CATEGORY_MOVE_BATCH_SIZE).')
+    def move_category(old_category_id, new_category_id, batch_size):
+        """Move a category's transactions to another category (or to none) in batches."""
+        from models import Category
+        from services.bulk_actions import move_category_in_batches
+        old = db.session.get(Category, old_category_id)
+        new = db.session.get(Category, new_category_id) if new_category_id else None
+        if old is None or (new_category_id and (new is None or new.user_id != old.user_id)):
+            raise click.ClickException('Both categories must exist and belong to the same user.')
+        moved = move_category_in_batches(
+            old.user_id, old.id, new_category_id,
+            batch_size=batch_size or app.config['CATEGORY_MOVE_BATCH_SIZE'],
+            progress=lambda done, total: click.echo(f'Moved {done} of {total}...')
+        )
+        click.echo(f'Moved {moved} transaction(s).')
+
+    @app.cli.command('process-budget-events')
+    @click.option('--date', 'today', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+                  help='Evaluate the budget periods of this date (default: today).')
+    def process_budget_events(today):
+        """Turn queued budget events into alerts (safe to re-run)."""
+        from services.budget_alerts import process_events
+        result = process_events(today=today.date() if today else None,
+                                batch_size=app.config['BUDGET_EVENT_BATCH_SIZE'])
+        click.echo(f'Handled {result.events} event(s), evaluated {result.budgets} budget(s), '
+                   f'wrote {result.alerts} alert(s).')
+
+    return app
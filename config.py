@@ -26,6 +26,53 @@ class Config:
     # Disable modification tracking (saves memory)
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
+    # Dashboard cache (per worker process, see services/dashboard_cache.py)
+    # Set DASHBOARD_CACHE_MAX_ENTRIES=0 to disable it. Entries expire after
+    # DASHBOARD_CACHE_TTL seconds, so writes by cron jobs show up by then.
+    DASHBOARD_CACHE_MAX_ENTRIES = int(os.environ.get('DASHBOARD_CACHE_MAX_ENTRIES') or 1024)
+    DASHBOARD_CACHE_MAX_BYTES = int(os.environ.get('DASHBOARD_CACHE_MAX_BYTES') or 16 * 1024 * 1024)
+    DASHBOARD_CACHE_TTL = int(os.environ.get('DASHBOARD_CACHE_TTL') or 60)
+    
+    # Transactions page size (?per_page= is capped at the maximum)
+    TRANSACTIONS_PER_PAGE = 50
+    TRANSACTIONS_MAX_PER_PAGE = 200
+    
+    # "All transactions" view: rows fetched per round trip and HTML chunk size
+    TRANSACTIONS_STREAM_BATCH_SIZE = 500
+    TRANSACTIONS_STREAM_CHUNK_BYTES = 16 * 1024
+    
+    # Maximum number of search results shown (best matches first)
+    SEARCH_RESULTS_LIMIT = 100
+    
+    # Statement imports: rows written per INSERT batch, and the largest upload accepted
+    IMPORT_BATCH_SIZE = 1000
+    MAX_CONTENT_LENGTH = 32 * 1024 * 1024
+    
+    # Recurring transactions (see services/recurring.py): items per batch, and
+    # how often (seconds) a background thread posts due ones. 0 = no thread,
+    # run `flask --app app post-recurring` from cron instead.
+    RECURRING_BATCH_SIZE = 1000
+    RECURRING_SCHEDULER_INTERVAL = int(os.environ.get('RECURRING_SCHEDULER_INTERVAL') or 0)
+    
+    # Ledger verification (see services/ledger.py): accounts per grouped
+    # query, and processes to spread the batches over.
+    LEDGER_BATCH_SIZE = 1000
+    LEDGER_WORKERS = int(os.environ.get('LEDGER_WORKERS') or 1)
+    
+    # Transactions moved per commit when a category with transactions is
+    # deleted (see move_category_in_batches in services/bulk_actions.py)
+    CATEGORY_MOVE_BATCH_SIZE = 1000
+    
+    # Budget alerts (see services/budget_alerts.py): queued events handled
+    # per batch, and how often (seconds) a background thread handles them.
+    # 0 = no thread, run `flask --app app process-budget-events` from cron instead.
+    BUDGET_EVENT_BATCH_SIZE = 1000
+    BUDGET_ALERT_INTERVAL = int(os.environ.get('BUDGET_ALERT_INTERVAL') or 0)
+    
+    # Apply pending schema migrations at startup (see schema_migrations.py).
+    # Set AUTO_MIGRATE=0 to run them yourself with: flask --app app migrate-db
+    AUTO_MIGRATE = os.environ.get('AUTO_MIGRATE', '1') != '0'
+    
     # Database encryption key
     DB_ENCRYPTION_KEY = os.environ.get('DB_ENCRYPTION_KEY')
     
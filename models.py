@@ -11,11 +11,23 @@ Relationships:
 - Account has many Transactions
 - Category has many Transactions
 - Category has one Budget (optional)
+- Category has an optional parent Category; CategoryPath lists every
+  (ancestor, descendant) pair of that tree
+- MonthlyRollup holds pre-computed monthly totals per account and category
+- SchemaMigration records which schema migrations have been applied
+- User has many CategoryRules (auto-categorization of new transactions)
+- User has many RecurringTransactions (posted automatically when due)
+- LedgerCheck records each run of the balance verification job
+- BudgetEvent queues "spending in this category grew" for the budget alert
+  worker, which writes BudgetAlerts (80% / 100% of a Budget reached)
+
+Money columns hold whole cents in the database (see money.py).
 """
 from datetime import datetime, timezone
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
+from money import Money
 
 # Create the database instance (will be initialized with the app later)
 db = SQLAlchemy()
@@ -48,6 +60,9 @@ class User(UserMixin, db.Model):
     accounts = db.relationship('Account', backref='user', lazy=True, cascade='all, delete-orphan')
     categories = db.relationship('Category', backref='user', lazy=True, cascade='all, delete-orphan')
     budgets = db.relationship('Budget', backref='user', lazy=True, cascade='all, delete-orphan')
+    category_rules = db.relationship('CategoryRule', backref='user', lazy=True, cascade='all, delete-orphan')
+    recurring_transactions = db.relationship('RecurringTransaction', backref='user', lazy=True,
+                                             cascade='all, delete-orphan')
     
     def set_password(self, password):
         """Hash and store the password."""
@@ -93,19 +108,30 @@ class Account(db.Model):
     Users can have multiple accounts to track money in different places.
     """
     __tablename__ = 'accounts'
+    __table_args__ = (
+        db.Index('ix_accounts_user_id', 'user_id'),
+        db.Index('ix_accounts_balance_changed_at', 'balance_changed_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     name = db.Column(db.String(100), nullable=False)  # e.g., "Chase Checking", "Cash"
     account_type = db.Column(db.String(50), nullable=False)  # 'bank', 'cash', 'credit', 'savings'
-    balance = db.Column(db.Float, default=0.0)  # Current balance
-    starting_balance = db.Column(db.Float, default=0.0)  # Initial balance when account was opened
+    balance = db.Column(Money, default=0.0)  # Current balance
+    starting_balance = db.Column(Money, default=0.0)  # Initial balance when account was opened
     starting_date = db.Column(db.Date, nullable=True)  # Date when this balance was recorded
     currency = db.Column(db.String(3), default='USD')  # Currency code
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    # Last time the balance changed (incremental ledger checks only look at
+    # accounts changed since the last check, see services/ledger.py)
+    balance_changed_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
     
     # Relationship to transactions
     transactions = db.relationship('Transaction', backref='account', lazy=True, cascade='all, delete-orphan')
+    # Categorization rules limited to this account go away with it
+    category_rules = db.relationship('CategoryRule', backref='account', lazy=True, cascade='all, delete-orphan')
+    recurring_transactions = db.relationship('RecurringTransaction', backref='account', lazy=True,
+                                             cascade='all, delete-orphan')
     
     def __repr__(self):
         return f'<Account {self.name}>'
@@ -117,6 +143,10 @@ class Category(db.Model):
     Categories help organize and analyze spending.
     """
     __tablename__ = 'categories'
+    __table_args__ = (
+        db.Index('ix_categories_user_type', 'user_id', 'category_type'),
+        db.Index('ix_categories_parent_id', 'parent_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -124,31 +154,80 @@ class Category(db.Model):
     category_type = db.Column(db.String(20), nullable=False)  # 'income' or 'expense'
     icon = db.Column(db.String(50), default='📦')  # Emoji or icon name
     color = db.Column(db.String(7), default='#6366f1')  # Hex color for charts
+    # Parent category ("Food" for "Groceries"), None for top-level categories.
+    # The whole tree is also stored as CategoryPath rows, see services/category_tree.py
+    parent_id = db.Column(db.Integer, db.ForeignKey('categories.id'), nullable=True)
+    # Number of transactions in this category, kept up to date on every
+    # transaction write together with the rollups (see services/rollups.py)
+    transaction_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     
     # Relationships
     transactions = db.relationship('Transaction', backref='category', lazy=True)
-    budget = db.relationship('Budget', backref='category', uselist=False)  # One budget per category
+    budget = db.relationship('Budget', backref='category', uselist=False,
+                             cascade='all, delete-orphan')  # One budget per category
+    rules = db.relationship('CategoryRule', backref='category', lazy=True, cascade='all, delete-orphan')
+    recurring_transactions = db.relationship('RecurringTransaction', backref='category', lazy=True)
+    parent = db.relationship('Category', remote_side=[id])
     
     def __repr__(self):
         return f'<Category {self.name}>'
 
 
+class CategoryPath(db.Model):
+    """
+    One ancestor/descendant pair of the category tree (a "closure table").
+    Every category has a row for itself (depth 0) and one for each category
+    above it (depth = number of levels between them), so all categories
+    under X are simply the rows with ancestor_id = X.
+    Maintained automatically, see services/category_tree.py.
+    """
+    __tablename__ = 'category_paths'
+    __table_args__ = (
+        db.Index('ix_category_paths_descendant', 'descendant_id', 'ancestor_id'),
+    )
+    
+    ancestor_id = db.Column(db.Integer, db.ForeignKey('categories.id'), primary_key=True)
+    descendant_id = db.Column(db.Integer, db.ForeignKey('categories.id'), primary_key=True)
+    depth = db.Column(db.Integer, nullable=False)
+    
+    def __repr__(self):
+        return f'<CategoryPath {self.ancestor_id} -> {self.descendant_id} ({self.depth})>'
+
+
 class Transaction(db.Model):
     """
     A single financial transaction (income or expense).
     This is the core of the app - every money movement is a transaction.
     """
     __tablename__ = 'transactions'
+    __table_args__ = (
+        # Balances, month ranges and the (date, id) keyset list per account.
+        # On Postgres the amount is stored in the index too, so SUM(amount)
+        # queries never have to visit the table.
+        db.Index('ix_transactions_account_date', 'account_id', 'date', 'id',
+                 postgresql_include=['amount']),
+        # Category counts and category migration
+        db.Index('ix_transactions_category_date', 'category_id', 'date'),
+        # Duplicate checks on import
+        db.Index('ix_transactions_fingerprint', 'fingerprint'),
+        # A recurring transaction is posted at most once per date
+        db.Index('ux_transactions_recurring_date', 'recurring_id', 'date', unique=True),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     account_id = db.Column(db.Integer, db.ForeignKey('accounts.id'), nullable=False)
     category_id = db.Column(db.Integer, db.ForeignKey('categories.id'), nullable=True)
     
-    amount = db.Column(db.Float, nullable=False)  # Positive = income, Negative = expense
+    amount = db.Column(Money, nullable=False)  # Positive = income, Negative = expense
     description = db.Column(db.String(255))  # Optional note about the transaction
     date = db.Column(db.Date, nullable=False)  # When the transaction happened
     location = db.Column(db.String(100))  #
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    # Hash of account, date, amount and description (see services/duplicates.py)
+    fingerprint = db.Column(db.String(32))
+    # Set when posted by the recurring scheduler (see services/recurring.py)
+    recurring_id = db.Column(db.Integer, db.ForeignKey('recurring_transactions.id', ondelete='SET NULL'),
+                             nullable=True)
     
     def __repr__(self):
         return f'<Transaction {self.amount} on {self.date}>'
@@ -156,17 +235,204 @@ class Transaction(db.Model):
 
 class Budget(db.Model):
     """
-    Monthly budget for a category.
+    Spending limit for a category (and its subcategories) per week, month or year.
     Helps users set spending limits and track if they're staying within budget.
+    See services/budgets.py for how the spending is added up.
     """
     __tablename__ = 'budgets'
+    __table_args__ = (
+        db.Index('ix_budgets_user_category', 'user_id', 'category_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     category_id = db.Column(db.Integer, db.ForeignKey('categories.id'), nullable=False)
     
-    amount = db.Column(db.Float, nullable=False)  # Budget limit
+    amount = db.Column(Money, nullable=False)  # Budget limit
     period = db.Column(db.String(20), default='monthly')  # 'weekly', 'monthly', 'yearly'
     
+    alerts = db.relationship('BudgetAlert', backref='budget', lazy=True, cascade='all, delete-orphan')
+    
     def __repr__(self):
         return f'<Budget {self.amount} for category {self.category_id}>'
+
+
+class BudgetEvent(db.Model):
+    """
+    "Spending in this category grew": queued by every write in the same
+    database transaction, and handled (then deleted) by the budget alert
+    worker (see services/budget_alerts.py).
+    """
+    __tablename__ = 'budget_events'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    # Plain integer (not a foreign key): the category may be deleted before the event is handled
+    category_id = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
+    
+    def __repr__(self):
+        return f'<BudgetEvent category {self.category_id}>'
+
+
+class BudgetAlert(db.Model):
+    """
+    Outbox of budget notifications: a budget reached a threshold (80 or 100
+    percent) in one period. At most one alert per budget, period and
+    threshold; sent_at is set by whatever delivers them.
+    """
+    __tablename__ = 'budget_alerts'
+    __table_args__ = (
+        db.UniqueConstraint('budget_id', 'period_start', 'threshold', name='uq_budget_alerts_period'),
+        db.Index('ix_budget_alerts_user_created', 'user_id', 'created_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    budget_id = db.Column(db.Integer, db.ForeignKey('budgets.id', ondelete='CASCADE'), nullable=False)
+    threshold = db.Column(db.Integer, nullable=False)  # Percent of the limit: 80 or 100
+    period_start = db.Column(db.Date, nullable=False)
+    spent = db.Column(Money, nullable=False)  # Spending when the alert was raised
+    budget_amount = db.Column(Money, nullable=False)  # The budget's limit at the time
+    created_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
+    sent_at = db.Column(db.DateTime)  # None until delivered
+    
+    def __repr__(self):
+        return f'<BudgetAlert {self.threshold}% of budget {self.budget_id}>'
+
+
+class MonthlyRollup(db.Model):
+    """
+    Pre-computed monthly totals for one account and category.
+
+    One row per (user, account, category, year, month). The dashboard reads
+    these instead of scanning every transaction in the month.
+    Kept up to date automatically whenever transactions are saved
+    (see services/rollups.py). Rebuild with: flask rebuild-rollups
+    """
+    __tablename__ = 'monthly_rollups'
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'account_id', 'category_id', 'year', 'month',
+                            name='uq_monthly_rollups_key'),
+        db.Index('ix_monthly_rollups_user_month', 'user_id', 'year', 'month'),
+        db.Index('ix_monthly_rollups_account_month', 'account_id', 'year', 'month'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    account_id = db.Column(db.Integer, db.ForeignKey('accounts.id', ondelete='CASCADE'), nullable=False)
+    # Plain integer (not a foreign key) so it can be part of the unique key:
+    # 0 means "no category"
+    category_id = db.Column(db.Integer, nullable=False, default=0)
+    year = db.Column(db.Integer, nullable=False)
+    month = db.Column(db.Integer, nullable=False)
+    
+    income_total = db.Column(Money, nullable=False, default=0.0)  # Sum of positive amounts
+    expense_total = db.Column(Money, nullable=False, default=0.0)  # Sum of negative amounts (<= 0)
+    income_count = db.Column(db.Integer, nullable=False, default=0)
+    expense_count = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<MonthlyRollup {self.year}-{self.month:02d} account {self.account_id}>'
+
+
+class CategoryRule(db.Model):
+    """
+    Picks the category of new transactions automatically.
+    A rule matches when every condition it has set matches; rules are tried
+    by priority (lowest number first) and the first match wins.
+    See services/categorizer.py.
+    """
+    __tablename__ = 'category_rules'
+    __table_args__ = (
+        db.Index('ix_category_rules_user_priority', 'user_id', 'priority'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    category_id = db.Column(db.Integer, db.ForeignKey('categories.id'), nullable=False)
+    priority = db.Column(db.Integer, nullable=False, default=100)
+    
+    # Conditions (empty = not checked)
+    description_pattern = db.Column(db.String(200))  # Text the description contains...
+    is_regex = db.Column(db.Boolean, nullable=False, default=False)  # ...or a regular expression
+    location_pattern = db.Column(db.String(100))  # Text the location contains
+    account_id = db.Column(db.Integer, db.ForeignKey('accounts.id'), nullable=True)
+    min_amount = db.Column(Money)  # Size of the amount (sign ignored)
+    max_amount = db.Column(Money)
+    
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    
+    def __repr__(self):
+        return f'<CategoryRule {self.id} -> category {self.category_id}>'
+
+
+class RecurringTransaction(db.Model):
+    """
+    A transaction that repeats: salary, rent, subscriptions, ...
+    The scheduler (services/recurring.py) posts a real Transaction for every
+    due date, from start_date until end_date (if any).
+    """
+    __tablename__ = 'recurring_transactions'
+    __table_args__ = (
+        # The scheduler's "what is due?" scan
+        db.Index('ix_recurring_transactions_next_date', 'next_date', 'id'),
+    )
+    
+    FREQUENCIES = ('daily', 'weekly', 'monthly', 'yearly')
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    account_id = db.Column(db.Integer, db.ForeignKey('accounts.id'), nullable=False)
+    category_id = db.Column(db.Integer, db.ForeignKey('categories.id'), nullable=True)
+    
+    amount = db.Column(Money, nullable=False)  # Positive = income, Negative = expense
+    description = db.Column(db.String(255))
+    location = db.Column(db.String(100))
+    
+    frequency = db.Column(db.String(10), nullable=False)  # One of FREQUENCIES
+    interval = db.Column(db.Integer, nullable=False, default=1)  # Every N days/weeks/months/years
+    start_date = db.Column(db.Date, nullable=False)  # First occurrence (monthly: day of month to use)
+    end_date = db.Column(db.Date, nullable=True)  # Last possible occurrence (None = forever)
+    next_date = db.Column(db.Date, nullable=True)  # Next occurrence to post (None = finished)
+    
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    
+    def __repr__(self):
+        return f'<RecurringTransaction {self.amount} {self.frequency}>'
+
+
+class SchemaMigration(db.Model):
+    """
+    One applied schema migration (see schema_migrations.py).
+    New databases get the full schema from db.create_all(); existing ones
+    are brought up to date by running the pending migrations in order.
+    """
+    __tablename__ = 'schema_migrations'
+    
+    version = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    description = db.Column(db.String(200), nullable=False)
+    applied_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    
+    def __repr__(self):
+        return f'<SchemaMigration {self.version}>'
+
+
+class LedgerCheck(db.Model):
+    """
+    One run of the ledger verification job (see services/ledger.py), which
+    compares every stored balance with starting_balance + sum of transactions.
+    The last finished run is the watermark for incremental checks.
+    """
+    __tablename__ = 'ledger_checks'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    started_at = db.Column(db.DateTime, nullable=False)
+    finished_at = db.Column(db.DateTime)  # None while running (or if the run crashed)
+    incremental = db.Column(db.Boolean, nullable=False, default=False)
+    accounts_checked = db.Column(db.Integer, nullable=False, default=0)
+    drifted = db.Column(db.Integer, nullable=False, default=0)  # Balances that were wrong
+    repaired = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<LedgerCheck {self.started_at}: {self.drifted} drifted>'
@@ -0,0 +1,115 @@
+"""
+Money - Amounts stored as whole numbers of cents.
+
+Floats can't hold most decimal amounts exactly (0.1 + 0.2 != 0.3), so sums
+over years of transactions slowly drift away from the real total. Money
+columns (see models.py) therefore store integers: the amount in minor
+units. Adding integers is exact, and SUM() over an integer column is also
+cheaper for the database than over floating point numbers.
+
+Python code keeps working with plain numbers (12.34): the Money column
+type multiplies by 100 when writing and divides when reading, so only
+the database sees the integers.
+
+Currencies differ in how many decimals they have (their "exponent"):
+USD, EUR, ... have 2, JPY has none. The database stores every currency
+with 2 decimals (the most any supported currency has), so one query can
+still add up amounts of different accounts. The currency's own exponent
+decides how amounts are rounded when they are entered and shown
+(round_money, format_money): ¥1,234 is stored as 123400.
+"""
+import math
+from decimal import Decimal, ROUND_HALF_UP
+from sqlalchemy.types import TypeDecorator, BigInteger
+
+# Decimals per currency (ISO 4217), where it isn't DEFAULT_EXPONENT
+CURRENCY_EXPONENTS = {
+    'JPY': 0,
+}
+DEFAULT_EXPONENT = 2
+
+# Decimals kept in the database (the largest exponent of any currency)
+STORAGE_EXPONENT = 2
+_SCALE = 10 ** STORAGE_EXPONENT
+
+
+def exponent(currency):
+    """Number of decimals of a currency (2 for USD, 0 for JPY)."""
+    return CURRENCY_EXPONENTS.get(currency, DEFAULT_EXPONENT)
+
+
+def parse_money(text):
+    """
+    Amount typed into a form field, as a float.
+
+    Raises:
+        ValueError: for text that isn't a finite number ("abc", "inf", "nan")
+    """
+    amount = float(text)
+    if not math.isfinite(amount):
+        raise ValueError(f'Not a finite amount: {text!r}')
+    return amount
+
+
+def to_minor(amount, currency=None):
+    """
+    Amount as a whole number of the currency's minor units, rounded half up.
+
+    to_minor(12.345, 'USD') == 1235, to_minor(1234.5, 'JPY') == 1235
+
+    Raises:
+        ValueError: for infinity and NaN
+    """
+    places = exponent(currency) if currency else STORAGE_EXPONENT
+    # repr() gives the shortest decimal that is the float, so 1.005 stays 1.005
+    value = Decimal(repr(amount)) if isinstance(amount, float) else Decimal(amount)
+    if not value.is_finite():
+        raise ValueError(f'Not a finite amount: {amount!r}')
+    return int(value.scaleb(places).to_integral_value(ROUND_HALF_UP))
+
+
+def from_minor(units, currency=None):
+    """Whole number of minor units back to an amount (1235 -> 12.35 for USD)."""
+    places = exponent(currency) if currency else STORAGE_EXPONENT
+    return units / 10 ** places if places else float(units)
+
+
+def round_money(amount, currency=None):
+    """Round an entered amount to what the currency can hold (half up)."""
+    return from_minor(to_minor(amount, currency), currency)
+
+
+def format_money(amount, currency=None):
+    """Amount with the currency's number of decimals (1234.50 for USD, 1235 for JPY)."""
+    places = exponent(currency) if currency else DEFAULT_EXPONENT
+    return f'{amount or 0:.{places}f}'
+
+
+class Money(TypeDecorator):
+    """
+    Column type for amounts: a BIGINT of cents in the database,
+    a float in Python.
+
+    Floats entered through the app have at most 2 decimals, so
+    round(amount * 100) is the exact number of cents.
+    """
+    impl = BigInteger
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        if isinstance(value, int):
+            return value * _SCALE
+        if isinstance(value, float):
+            return round(value * _SCALE)
+        return to_minor(value)
+
+    def process_literal_param(self, value, dialect):
+        return str(self.process_bind_param(value, dialect))
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        # int(): SUM() comes back as a Decimal on Postgres
+        return int(value) / _SCALE
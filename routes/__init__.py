@@ -6,4 +6,5 @@ Each file handles a different part of the app:
 - main.py: Home page and general pages
 - transactions.py: Adding, viewing, editing transactions
 - accounts.py: Managing bank accounts
+- budgets.py: Spending limits per category
 """
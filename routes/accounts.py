@@ -4,6 +4,7 @@ Account Routes - Managing financial accounts.
 from flask import Blueprint, render_template, request, redirect, url_for, flash
 from flask_login import login_required, current_user
 from models import db, Account
+from money import round_money, parse_money
 
 accounts_bp = Blueprint('accounts', __name__)
 
@@ -28,7 +29,12 @@ def add_account():
     if request.method == 'POST':
         from datetime import datetime
         
-        initial_balance = float(request.form.get('balance', 0))
+        currency = request.form.get('currency', 'USD')
+        try:
+            initial_balance = round_money(parse_money(request.form.get('balance') or 0), currency)
+        except ValueError:
+            flash('The balance must be a number.', 'error')
+            return redirect(url_for('accounts.add_account'))
         starting_date_str = request.form.get('starting_date')
         if not starting_date_str:
             starting_date_str = datetime.now().strftime('%Y-%m-%d')
@@ -41,7 +47,7 @@ def add_account():
             balance=initial_balance,
             starting_balance=initial_balance,
             starting_date=starting_date,
-            currency=request.form.get('currency', 'USD')
+            currency=currency
         )
         
         db.session.add(account)
@@ -0,0 +1,98 @@
+"""
+Budget Routes - Spending limits per category.
+"""
+from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask_login import login_required, current_user
+from sqlalchemy.orm import joinedload
+from models import db, Budget, BudgetAlert, Category, Account
+from money import round_money, parse_money
+from services import budgets, category_tree
+
+budgets_bp = Blueprint('budgets', __name__)
+
+
+@budgets_bp.route('/', methods=['GET', 'POST'])
+@login_required
+def list_budgets():
+    """
+    List the user's budgets with what has been spent in their current period.
+    GET: Show the budgets and the form for setting one
+    POST: Set a category's budget (replaces the one it has)
+    """
+    if request.method == 'POST':
+        error = _save_budget(request.form)
+        if error:
+            flash(error, 'error')
+        else:
+            flash('Budget saved!', 'success')
+        return redirect(url_for('budgets.list_budgets'))
+    
+    # All budgets from one query (see services/budgets.py)
+    statuses = budgets.evaluate(current_user.id)
+    categories = Category.query.filter_by(user_id=current_user.id, category_type='expense') \
+        .order_by(Category.name).all()
+    # Latest alerts written by the budget alert worker (see services/budget_alerts.py)
+    alerts = BudgetAlert.query.filter_by(user_id=current_user.id) \
+        .options(joinedload(BudgetAlert.budget).joinedload(Budget.category)) \
+        .order_by(BudgetAlert.created_at.desc(), BudgetAlert.id.desc()).limit(10).all()
+    # Amounts are shown in the currency of the first account, like on the dashboard
+    first_account = Account.query.filter_by(user_id=current_user.id).order_by(Account.id).first()
+    
+    return render_template('budgets/list.html',
+                           statuses=statuses,
+                           alerts=alerts,
+                           categories=category_tree.tree_order(categories),
+                           periods=budgets.PERIODS,
+                           primary_currency=first_account.currency if first_account else 'USD')
+
+
+def _save_budget(form):
+    """
+    Validate the budget form and save the budget.
+    
+    Returns:
+        An error message, or None if the budget was saved
+    """
+    # Ownership check: category must belong to current user
+    category_id = form.get('category_id', '')
+    category = db.session.get(Category, int(category_id)) if category_id.isdigit() else None
+    if not category or category.user_id != current_user.id or category.category_type != 'expense':
+        return 'Invalid category selected.'
+    
+    period = form.get('period', 'monthly')
+    if period not in budgets.PERIODS:
+        return 'Invalid period selected.'
+    
+    try:
+        amount = round_money(abs(parse_money(form.get('amount', ''))))
+    except ValueError:
+        return 'The limit must be a number.'
+    if not amount:
+        return 'The limit must be more than zero.'
+    
+    budget = category.budget or Budget(user_id=current_user.id, category_id=category.id)
+    budget.amount = amount
+    budget.period = period
+    db.session.add(budget)
+    db.session.commit()
+    return None
+
+
+@budgets_bp.route('/delete/<int:id>', methods=['POST'])
+@login_required
+def delete_budget(id):
+    """Delete a budget."""
+    budget = db.session.get(Budget, id)
+    if not budget:
+        return "Not found", 404
+    
+    # Make sure this budget belongs to the current user
+    if budget.user_id != current_user.id:
+        flash('Access denied.', 'error')
+        return redirect(url_for('budgets.list_budgets'))
+    
+    db.session.delete(budget)
+    db.session.commit()
+    
+    flash('Budget deleted!', 'info')
+    return redirect(url_for('budgets.list_budgets'))
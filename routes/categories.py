@@ -1,9 +1,13 @@
 """
 Category Routes - Manage transaction categories.
 """
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app
 from flask_login import login_required, current_user
-from models import db, Category, Transaction, Account
+from models import db, Category, CategoryPath, Account, CategoryRule
+from money import round_money, parse_money
+from services.categorizer import validate_pattern
+from services.bulk_actions import move_category_in_batches
+from services import category_tree
 
 categories_bp = Blueprint('categories', __name__)
 
@@ -11,20 +15,18 @@ categories_bp = Blueprint('categories', __name__)
 @categories_bp.route('/')
 @login_required
 def list_categories():
-    """List all categories for the current user."""
-    expense_categories = Category.query.filter_by(
-        user_id=current_user.id, 
-        category_type='expense'
-    ).all()
-    
-    income_categories = Category.query.filter_by(
-        user_id=current_user.id, 
-        category_type='income'
-    ).all()
+    """
+    List all categories for the current user.
     
-    # Count transactions per category
-    for cat in expense_categories + income_categories:
-        cat.transaction_count = Transaction.query.filter_by(category_id=cat.id).count()
+    One query for both types; the transaction counts are stored on the
+    categories (Category.transaction_count), so nothing is counted here.
+    Each list is in tree order as (category, depth), subcategories under
+    their parent.
+    """
+    categories = Category.query.filter_by(user_id=current_user.id).order_by(Category.id).all()
+    tree = category_tree.tree_order(categories)
+    expense_categories = [(cat, depth) for cat, depth in tree if cat.category_type == 'expense']
+    income_categories = [(cat, depth) for cat, depth in tree if cat.category_type == 'income']
     
     return render_template('categories/list.html',
                            expense_categories=expense_categories,
@@ -40,14 +42,20 @@ def add_category():
         category_type = request.form.get('category_type', '').strip()
         if not name or not category_type:
             flash('Name and type are required.', 'error')
-            return render_template('categories/add.html')
+            return render_template('categories/add.html', parents=_parent_choices())
+        
+        parent, error = _parent_from_form(request.form, category_type)
+        if error:
+            flash(error, 'error')
+            return render_template('categories/add.html', parents=_parent_choices())
         
         category = Category(
             user_id=current_user.id,
             name=name,
             category_type=category_type,
             icon=request.form.get('icon', '📦'),
-            color=request.form.get('color', '#6366f1')
+            color=request.form.get('color', '#6366f1'),
+            parent_id=parent.id if parent else None
         )
         
         db.session.add(category)
@@ -56,7 +64,7 @@ def add_category():
         flash('Category created!', 'success')
         return redirect(url_for('categories.list_categories'))
     
-    return render_template('categories/add.html')
+    return render_template('categories/add.html', parents=_parent_choices())
 
 
 @categories_bp.route('/edit/<int:id>', methods=['GET', 'POST'])
@@ -73,16 +81,65 @@ def edit_category(id):
         return redirect(url_for('categories.list_categories'))
     
     if request.method == 'POST':
+        category_type = request.form['category_type']
+        parent, error = _parent_from_form(request.form, category_type, category)
+        if error:
+            flash(error, 'error')
+            return render_template('categories/edit.html', category=category,
+                                   parents=_parent_choices(category))
+        
         category.name = request.form['name']
-        category.category_type = request.form['category_type']
+        category.category_type = category_type
         category.icon = request.form.get('icon', '📦')
         category.color = request.form.get('color', '#6366f1')
+        # Moving it moves its subcategories along (see services/category_tree.py)
+        category.parent_id = parent.id if parent else None
         
         db.session.commit()
         flash('Category updated!', 'success')
         return redirect(url_for('categories.list_categories'))
     
-    return render_template('categories/edit.html', category=category)
+    return render_template('categories/edit.html', category=category,
+                           parents=_parent_choices(category))
+
+
+def _parent_choices(category=None):
+    """
+    The categories that can be picked as parent, as (category, depth) in tree order.
+    
+    When editing, the category itself and everything under it are left out
+    (a category can't be moved below itself).
+    """
+    query = Category.query.filter_by(user_id=current_user.id)
+    if category is not None:
+        subtree = db.select(CategoryPath.descendant_id).where(CategoryPath.ancestor_id == category.id)
+        query = query.filter(Category.id.not_in(subtree))
+    return category_tree.tree_order(query.order_by(Category.name).all())
+
+
+def _parent_from_form(form, category_type, category=None):
+    """
+    Validate the parent picked in the add/edit form.
+    
+    Returns:
+        (parent category or None for top level, error message or None)
+    """
+    parent_id = form.get('parent_id', '')
+    if category is not None and category_type != category.category_type and \
+            Category.query.filter_by(parent_id=category.id).first():
+        return None, "A category with subcategories can't change its type."
+    if not parent_id:
+        return None, None
+    
+    # Ownership check: parent must belong to current user
+    parent = db.session.get(Category, int(parent_id)) if parent_id.isdigit() else None
+    if not parent or parent.user_id != current_user.id:
+        return None, 'Invalid parent category selected.'
+    if parent.category_type != category_type:
+        return None, 'The parent category must be of the same type.'
+    if category is not None and category_tree.is_below(parent.id, category.id):
+        return None, "A category can't be moved under itself."
+    return parent, None
 
 
 @categories_bp.route('/delete/<int:id>', methods=['GET', 'POST'])
@@ -101,25 +158,32 @@ def delete_category(id):
         flash('Access denied.', 'error')
         return redirect(url_for('categories.list_categories'))
     
-    # Count transactions using this category
-    transaction_count = Transaction.query.filter_by(category_id=id).count()
+    # Transactions using this category (stored count, see Category.transaction_count)
+    transaction_count = category.transaction_count
     
     if request.method == 'POST':
         # Handle migration if user selected a new category
         new_category_id = request.form.get('new_category_id')
         
         if transaction_count > 0:
-            if new_category_id == 'none':
-                # Set transactions to no category
-                Transaction.query.filter_by(category_id=id).update({'category_id': None})
-            elif new_category_id:
+            target_id = None  # 'none' (or nothing picked): set transactions to no category
+            if new_category_id and new_category_id != 'none':
                 # Ownership check: new category must belong to current user
                 new_cat = db.session.get(Category, int(new_category_id))
-                if not new_cat or new_cat.user_id != current_user.id:
+                if not new_cat or new_cat.user_id != current_user.id or new_cat.id == id:
                     flash('Invalid category selected for migration.', 'error')
                     return redirect(url_for('categories.delete_category', id=id))
-                # Migrate to selected category
-                Transaction.query.filter_by(category_id=id).update({'category_id': int(new_category_id)})
+                target_id = new_cat.id
+            # Move the transactions in short batches (each one committed), so a
+            # big category doesn't lock out everyone else's writes while it moves
+            moved = move_category_in_batches(
+                current_user.id, id, target_id,
+                batch_size=current_app.config['CATEGORY_MOVE_BATCH_SIZE'],
+                progress=lambda done, total: current_app.logger.info(
+                    'Category %d: moved %d of %d transactions', id, done, total)
+            )
+            if moved:
+                flash(f'Moved {moved} transaction{"s" if moved != 1 else ""}.', 'info')
         
         # Delete the category
         db.session.delete(category)
@@ -140,3 +204,108 @@ def delete_category(id):
                            category=category,
                            transaction_count=transaction_count,
                            other_categories=other_categories)
+
+
+# ============================================
+# Categorization rules (see services/categorizer.py)
+# ============================================
+
+@categories_bp.route('/rules', methods=['GET', 'POST'])
+@login_required
+def list_rules():
+    """
+    List the user's categorization rules.
+    GET: Show the rules and the form for a new one
+    POST: Add a rule
+    """
+    if request.method == 'POST':
+        error = _save_rule(request.form)
+        if error:
+            flash(error, 'error')
+        else:
+            flash('Rule added!', 'success')
+        return redirect(url_for('categories.list_rules'))
+    
+    rules = CategoryRule.query.filter_by(user_id=current_user.id) \
+        .order_by(CategoryRule.priority, CategoryRule.id).all()
+    categories = Category.query.filter_by(user_id=current_user.id).order_by(Category.name).all()
+    accounts = Account.query.filter_by(user_id=current_user.id).order_by(Account.name).all()
+    
+    return render_template('categories/rules.html',
+                           rules=rules, categories=categories, accounts=accounts)
+
+
+def _save_rule(form):
+    """
+    Validate the new-rule form and add the rule.
+    
+    Returns:
+        An error message, or None if the rule was saved
+    """
+    description_pattern = form.get('description_pattern', '').strip()
+    is_regex = form.get('is_regex') in ('1', 'on', 'true')
+    location_pattern = form.get('location_pattern', '').strip()
+    
+    # Ownership check: category must belong to current user
+    category_id = form.get('category_id')
+    category = db.session.get(Category, int(category_id)) if category_id and category_id.isdigit() else None
+    if not category or category.user_id != current_user.id:
+        return 'Invalid category selected.'
+    
+    # Ownership check: account must belong to current user (if provided)
+    account_id = form.get('account_id')
+    account = None
+    if account_id:
+        account = db.session.get(Account, int(account_id)) if account_id.isdigit() else None
+        if not account or account.user_id != current_user.id:
+            return 'Invalid account selected.'
+    
+    try:
+        priority = int(form.get('priority') or 100)
+        min_amount = round_money(abs(parse_money(form['min_amount']))) if form.get('min_amount') else None
+        max_amount = round_money(abs(parse_money(form['max_amount']))) if form.get('max_amount') else None
+    except ValueError:
+        return 'Priority and amounts must be numbers.'
+    
+    if not (description_pattern or location_pattern or account or
+            min_amount is not None or max_amount is not None):
+        return 'A rule needs at least one condition.'
+    error = validate_pattern(description_pattern, is_regex)
+    if error:
+        return error
+    if len(location_pattern) > CategoryRule.__table__.c.location_pattern.type.length:
+        return 'The location text is too long.'
+    
+    db.session.add(CategoryRule(
+        user_id=current_user.id,
+        category_id=category.id,
+        priority=priority,
+        description_pattern=description_pattern or None,
+        is_regex=is_regex and bool(description_pattern),
+        location_pattern=location_pattern or None,
+        account_id=account.id if account else None,
+        min_amount=min_amount,
+        max_amount=max_amount
+    ))
+    db.session.commit()
+    return None
+
+
+@categories_bp.route('/rules/delete/<int:id>', methods=['POST'])
+@login_required
+def delete_rule(id):
+    """Delete a categorization rule."""
+    rule = db.session.get(CategoryRule, id)
+    if not rule:
+        return "Not found", 404
+    
+    # Make sure this rule belongs to the current user
+    if rule.user_id != current_user.id:
+        flash('Access denied.', 'error')
+        return redirect(url_for('categories.list_rules'))
+    
+    db.session.delete(rule)
+    db.session.commit()
+    
+    flash('Rule deleted!', 'info')
+    return redirect(url_for('categories.list_rules'))
@@ -7,9 +7,12 @@ This makes it easy to organize your code as the app grows.
 from flask import Blueprint, render_template, request
 from flask_login import login_required, current_user
 from models import db, Transaction, Account, Category
-from sqlalchemy import func
+import calendar
 from datetime import datetime, timedelta
-from calendar import monthrange
+from services.balances import annotate_balances_at_month
+from services import rollups, category_tree, budgets
+from services.dashboard_cache import dashboard_cache
+from services.transaction_list import transaction_rows
 
 # Create a blueprint named 'main'
 main_bp = Blueprint('main', __name__)
@@ -27,10 +30,8 @@ def index():
     year = request.args.get('year', today.year, type=int)
     month = request.args.get('month', today.month, type=int)
     
-    # Calculate first and last day of selected month
+    # Calculate first day of selected month
     first_of_month = datetime(year, month, 1).date()
-    last_day = monthrange(year, month)[1]
-    last_of_month = datetime(year, month, last_day).date()
     
     # Calculate previous and next month for navigation
     if month == 1:
@@ -46,97 +47,114 @@ def index():
     # Check if next month is in the future
     is_current_month = (year == today.year and month == today.month)
     
-    # Get only THIS USER's accounts
-    accounts = Account.query.filter_by(user_id=current_user.id).all()
-    
-    # Get this user's account IDs for filtering transactions
-    user_account_ids = [a.id for a in accounts]
-    
-    # Calculate account balances as of the selected month
-    total_balance = 0
-    for account in accounts:
-        # Check if account existed at the end of this month
-        if account.starting_date and account.starting_date > last_of_month:
-            # Account didn't exist yet - don't include it
-            account.balance_at_month = None
-        else:
-            # Calculate balance at end of selected month
-            # Method: Current balance - sum of all transactions after the selected month
-            transactions_after = db.session.query(func.sum(Transaction.amount)) \
-                .filter(Transaction.account_id == account.id) \
-                .filter(Transaction.date > last_of_month) \
-                .scalar() or 0
-            account.balance_at_month = account.balance - transactions_after
-            total_balance += account.balance_at_month
+    # The numbers for the selected month are cached per user and month,
+    # and dropped again as soon as a write changes them
+    # (see services/dashboard_cache.py)
+    generation = dashboard_cache.generation(current_user.id)
+    summary = dashboard_cache.get(current_user.id, year, month)
+    if summary is None:
+        summary = month_summary(current_user.id, year, month)
+        dashboard_cache.put(current_user.id, year, month, summary, generation)
+    
+    # Drilling into a parent category: the chart shows its subcategories
+    # instead (one more grouped query, not cached), with a breadcrumb back up
+    drill_path = []
+    category_id = request.args.get('category', type=int)
+    if category_id:
+        category = db.session.get(Category, category_id)
+        if category and category.user_id == current_user.id:
+            drill_path = [{'id': c.id, 'name': c.name, 'icon': c.icon}
+                          for c in category_tree.ancestors(category_id)]
+            _, _, spending_by_category = rollups.month_aggregates(
+                current_user.id, year, month, parent_id=category_id)
+            summary = {**summary, **chart_fields(spending_by_category)}
+    
+    # Budgets in the periods of the selected month's last day (today for the
+    # current month): one query for all of them (see services/budgets.py)
+    last_of_month = first_of_month.replace(day=calendar.monthrange(year, month)[1])
+    budget_statuses = budgets.evaluate(current_user.id, min(today.date(), last_of_month))
     
     # Get recent transactions (last 10) - only from user's accounts
-    recent_transactions = Transaction.query \
-        .filter(Transaction.account_id.in_(user_account_ids)) \
-        .order_by(Transaction.date.desc()) \
+    # (lightweight rows with account and category joined in, one query)
+    recent_transactions = transaction_rows(current_user.id) \
+        .order_by(Transaction.date.desc(), Transaction.id.desc()) \
         .limit(10) \
         .all()
     
-    # Calculate spending for selected month - only from user's accounts
-    monthly_spending = db.session.query(func.sum(Transaction.amount)) \
-        .filter(Transaction.account_id.in_(user_account_ids)) \
-        .filter(Transaction.amount < 0) \
-        .filter(Transaction.date >= first_of_month) \
-        .filter(Transaction.date <= last_of_month) \
-        .scalar() or 0
-    
-    monthly_income = db.session.query(func.sum(Transaction.amount)) \
-        .filter(Transaction.account_id.in_(user_account_ids)) \
-        .filter(Transaction.amount > 0) \
-        .filter(Transaction.date >= first_of_month) \
-        .filter(Transaction.date <= last_of_month) \
-        .scalar() or 0
-    
-    # Get spending by category for selected month (for pie chart)
-    spending_by_category = db.session.query(
-        Category.name,
-        Category.icon,
-        Category.color,
-        func.sum(Transaction.amount).label('total')
-    ).join(Transaction, Transaction.category_id == Category.id) \
-     .filter(Transaction.account_id.in_(user_account_ids)) \
-     .filter(Transaction.amount < 0) \
-     .filter(Transaction.date >= first_of_month) \
-     .filter(Transaction.date <= last_of_month) \
-     .group_by(Category.id) \
-     .all()
-    
-    # Prepare chart data (only if there is spending data)
-    chart_labels = []
-    chart_data = []
-    chart_colors = []
-    
-    if spending_by_category:
-        chart_labels = [f"{row.icon} {row.name}" for row in spending_by_category]
-        chart_data = [abs(row.total) for row in spending_by_category]
-        chart_colors = [row.color for row in spending_by_category]
-    
     # Month name for display
     month_name = first_of_month.strftime('%B %Y')
     
-    # Get primary currency from first account or default to USD
-    primary_currency = accounts[0].currency if accounts else 'USD'
-    
     return render_template('index.html',
-                           total_balance=total_balance,
-                           accounts=accounts,
                            recent_transactions=recent_transactions,
-                           monthly_spending=abs(monthly_spending),
-                           monthly_income=monthly_income,
-                           chart_labels=chart_labels,
-                           chart_data=chart_data,
-                           chart_colors=chart_colors,
                            month_name=month_name,
                            prev_month=prev_month,
                            prev_year=prev_year,
                            next_month=next_month,
                            next_year=next_year,
                            is_current_month=is_current_month,
-                           primary_currency=primary_currency)
+                           year=year,
+                           month=month,
+                           drill_path=drill_path,
+                           budget_statuses=budget_statuses,
+                           **summary)
+
+
+def month_summary(user_id, year, month):
+    """
+    Calculate the dashboard numbers for one month.
+    
+    Returns plain data (no database objects) so it can be cached:
+    total_balance, accounts, monthly_income, monthly_spending,
+    chart_labels, chart_data, chart_colors, primary_currency
+    """
+    # Get only THIS USER's accounts
+    accounts = Account.query.filter_by(user_id=user_id).all()
+    
+    # Calculate account balances as of the selected month
+    # (one grouped query for all accounts, see services/balances.py)
+    total_balance = annotate_balances_at_month(accounts, year, month)
+    
+    # Income, spending and spending by category (for the pie chart)
+    # come from one query over the pre-computed rollups (see services/rollups.py)
+    monthly_income, monthly_spending, spending_by_category = \
+        rollups.month_aggregates(user_id, year, month)
+    
+    # Get primary currency from first account or default to USD
+    primary_currency = accounts[0].currency if accounts else 'USD'
+    
+    return {
+        'total_balance': total_balance,
+        'accounts': [
+            {
+                'id': a.id,
+                'name': a.name,
+                'account_type': a.account_type,
+                'currency': a.currency,
+                'balance_at_month': a.balance_at_month,
+            }
+            for a in accounts
+        ],
+        'monthly_income': monthly_income,
+        'monthly_spending': abs(monthly_spending),
+        'primary_currency': primary_currency,
+        **chart_fields(spending_by_category),
+    }
+
+
+def chart_fields(spending_by_category):
+    """
+    Pie chart data from rollups.month_aggregates rows.
+    
+    chart_drill holds, per slice, the category id to drill into (None if
+    the slice has no subcategories).
+    """
+    return {
+        'chart_labels': [f"{row.icon} {row.name}" for row in spending_by_category],
+        'chart_data': [abs(row.total) for row in spending_by_category],
+        'chart_colors': [row.color for row in spending_by_category],
+        'chart_drill': [row.category_id if row.has_children else None
+                        for row in spending_by_category],
+    }
 
 
 @main_bp.route('/about')
@@ -4,33 +4,338 @@ Transaction Routes - CRUD operations for transactions.
 CRUD = Create, Read, Update, Delete
 These are the basic operations for any data in your app.
 """
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask import (Blueprint, render_template, request, redirect, url_for, flash, current_app,
+                   Response, stream_template, stream_with_context, jsonify, abort)
 from flask_login import login_required, current_user
-from models import db, Transaction, Account, Category
-from utils import get_currency_symbol
+from models import db, Transaction, Account, Category, RecurringTransaction
+from utils import get_currency_symbol, chunked
+from money import round_money, format_money, parse_money
+from services.transaction_list import transaction_rows, keyset_page, TransactionFilters, row_to_dict
+from services.search import search_transactions
+from services.importer import import_file
+from services.exporter import export_chunks, FORMATS as EXPORT_FORMATS
+from services.categorizer import rules_for
+from services.bulk_actions import bulk_update, ACTIONS as BULK_ACTIONS
+from services.balances import add_to_balances, withdraw, lock_accounts
 from datetime import datetime
 
 transactions_bp = Blueprint('transactions', __name__)
 
+# Page sizes offered on the transactions page
+PAGE_SIZES = [25, 50, 100, 200]
+
 
 @transactions_bp.route('/')
 @login_required
 def list_transactions():
     """
-    List all transactions.
-    GET /transactions/
+    List transactions, newest first, one page at a time.
+    GET /transactions/?per_page=50&before=<cursor>  (older page)
+    GET /transactions/?per_page=50&after=<cursor>   (newer page)
+    GET /transactions/?all=1                        (everything, streamed)
+    Filters (see TransactionFilters): ?start=&end=&account=&category=
+    &min_amount=&max_amount=&type=&uncategorized=
+    """
+    filters = TransactionFilters.from_args(request.args)
+    if request.args.get('all'):
+        return stream_all_transactions(filters)
+    
+    page = filtered_page(filters)
+    
+    # Choices for the filter form
+    accounts = Account.query.filter_by(user_id=current_user.id).order_by(Account.name).all()
+    categories = Category.query.filter_by(user_id=current_user.id).order_by(Category.name).all()
+    
+    return render_template('transactions/list.html',
+                           transactions=page.items,
+                           page=page,
+                           page_sizes=PAGE_SIZES,
+                           filters=filters,
+                           accounts=accounts,
+                           categories=categories)
+
+
+@transactions_bp.route('/api')
+@login_required
+def list_transactions_json():
+    """
+    JSON version of the transaction list (same paging and filters).
+    GET /transactions/api?type=expense&start=2026-03-01&before=<cursor>
+    """
+    filters = TransactionFilters.from_args(request.args)
+    page = filtered_page(filters)
+    return jsonify({
+        'transactions': [row_to_dict(row) for row in page.items],
+        'per_page': page.per_page,
+        'newer_cursor': page.newer_cursor,
+        'older_cursor': page.older_cursor,
+        'filters': filters.as_args(),
+    })
+
+
+def filtered_page(filters):
+    """One page of the user's transactions with filters and paging from the request."""
+    per_page = request.args.get('per_page', current_app.config['TRANSACTIONS_PER_PAGE'], type=int)
+    per_page = max(1, min(per_page, current_app.config['TRANSACTIONS_MAX_PER_PAGE']))
+    
+    # Only this user's transactions (see services/transaction_list.py)
+    return keyset_page(filters.apply(transaction_rows(current_user.id)), per_page,
+                       before=request.args.get('before'),
+                       after=request.args.get('after'))
+
+
+def stream_all_transactions(filters):
+    """
+    Render every (matching) transaction of the user without holding them all in memory.
+    
+    Rows come from a server-side cursor (yield_per) and the template is
+    streamed, so the HTML is sent to the browser in chunks while it renders.
+    """
+    batch_size = current_app.config['TRANSACTIONS_STREAM_BATCH_SIZE']
+    rows = filters.apply(transaction_rows(current_user.id)) \
+        .order_by(Transaction.date.desc(), Transaction.id.desc()) \
+        .yield_per(batch_size)
+    
+    html = stream_template('transactions/all.html', transactions=rows)
+    return Response(chunked(html, current_app.config['TRANSACTIONS_STREAM_CHUNK_BYTES']),
+                    mimetype='text/html')
+
+
+@transactions_bp.route('/export.<file_format>')
+@login_required
+def export_transactions(file_format):
+    """
+    Download the user's transactions, oldest first.
+    GET /transactions/export.csv
+    GET /transactions/export.jsonl?gzip=1&account=3   (same filters as the list)
+    
+    The file is streamed from a server-side cursor while it is written
+    (see services/exporter.py), so memory stays flat for any export size.
+    """
+    if file_format not in EXPORT_FORMATS:
+        abort(404)
+    compress = request.args.get('gzip') in ('1', 'true', 'on')
+    filters = TransactionFilters.from_args(request.args)
+    
+    rows = filters.apply(transaction_rows(current_user.id)) \
+        .order_by(Transaction.date.asc(), Transaction.id.asc()) \
+        .yield_per(current_app.config['TRANSACTIONS_STREAM_BATCH_SIZE'])
+    chunks = export_chunks(rows, file_format,
+                           chunk_size=current_app.config['TRANSACTIONS_STREAM_CHUNK_BYTES'],
+                           compress=compress)
+    
+    filename = f'transactions.{file_format}' + ('.gz' if compress else '')
+    return Response(stream_with_context(chunks),
+                    mimetype='application/gzip' if compress else EXPORT_FORMATS[file_format],
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
+
+@transactions_bp.route('/search')
+@login_required
+def search():
+    """
+    Search the user's transactions by description and location.
+    GET /transactions/search?q=coffee
+    """
+    query = request.args.get('q', '').strip()
+    results = []
+    if query:
+        results = search_transactions(current_user.id, query,
+                                      limit=current_app.config['SEARCH_RESULTS_LIMIT'])
+    
+    return render_template('transactions/search.html', query=query, transactions=results)
+
+
+@transactions_bp.route('/import', methods=['GET', 'POST'])
+@login_required
+def import_transactions():
+    """
+    Import a bank statement (CSV, OFX or QIF).
+    GET: Show the upload form (with the CSV column mapping)
+    POST: Import the file in batches (see services/importer.py)
+    """
+    accounts = Account.query.filter_by(user_id=current_user.id).all()
+    
+    if request.method == 'POST':
+        upload = request.files.get('file')
+        account = db.session.get(Account, request.form.get('account_id', type=int) or 0)
+        
+        # Ownership check: account must belong to current user
+        if not account or account.user_id != current_user.id:
+            flash('Invalid account selected.', 'error')
+            return redirect(url_for('transactions.import_transactions'))
+        if not upload or not upload.filename:
+            flash('Please choose a statement file.', 'error')
+            return redirect(url_for('transactions.import_transactions'))
+        
+        result = import_file(account, upload.stream, upload.filename, request.form,
+                             batch_size=current_app.config['IMPORT_BATCH_SIZE'])
+        db.session.commit()
+        
+        names = {a.id: a.name for a in accounts}
+        for account_id, count in result.per_account.items():
+            flash(f'Imported {count} transactions into {names[account_id]}.', 'success')
+        if result.duplicates:
+            flash(f'{result.duplicates} duplicates skipped (already imported).', 'info')
+        if result.skipped:
+            flash(f'{result.skipped} rows could not be imported.', 'error')
+        return render_template('transactions/import.html', accounts=accounts, result=result)
+    
+    return render_template('transactions/import.html', accounts=accounts, result=None)
+
+
+@transactions_bp.route('/bulk', methods=['POST'])
+@login_required
+def bulk_action():
+    """
+    Change or delete many transactions at once (see services/bulk_actions.py).
+    POST /transactions/bulk  action=recategorize|move_account|delete
+    The transactions are picked by id (id=1&id=2...) or, without ids, by the
+    list filters (start, end, account, category, ...) sent with the form.
+    Targets: category_id (recategorize, empty = no category), account_id (move_account).
+    """
+    action = request.form.get('action')
+    ids = request.form.getlist('id', type=int) or None
+    filters = TransactionFilters.from_args(request.form)
+    back = url_for('transactions.list_transactions', **filters.as_args())
+    
+    if action not in BULK_ACTIONS:
+        flash('Unknown bulk action.', 'error')
+        return redirect(back)
+    
+    # Never touch every transaction by accident
+    if ids is None and not filters.active:
+        flash('Select transactions or set a filter first.', 'error')
+        return redirect(back)
+    
+    # Ownership check: target category must belong to current user (if provided)
+    category_id = request.form.get('category_id', type=int)
+    if action == 'recategorize' and category_id:
+        category = db.session.get(Category, category_id)
+        if not category or category.user_id != current_user.id:
+            flash('Invalid category selected.', 'error')
+            return redirect(back)
+    
+    # Ownership check: target account must belong to current user
+    account_id = request.form.get('account_id', type=int)
+    if action == 'move_account':
+        account = db.session.get(Account, account_id or 0)
+        if not account or account.user_id != current_user.id:
+            flash('Invalid account selected.', 'error')
+            return redirect(back)
+    
+    # One transaction for the whole action: all rows change or none
+    count = bulk_update(current_user.id, action,
+                        filters=filters if ids is None else None,
+                        ids=ids,
+                        category_id=category_id or None,
+                        account_id=account_id)
+    db.session.commit()
+    
+    done = {'recategorize': 'recategorized', 'move_account': 'moved', 'delete': 'deleted'}[action]
+    flash(f'{count} transaction{"s" if count != 1 else ""} {done}.', 'info' if action == 'delete' else 'success')
+    return redirect(back)
+
+
+@transactions_bp.route('/recurring', methods=['GET', 'POST'])
+@login_required
+def recurring():
+    """
+    Recurring transactions (salary, rent, subscriptions, ...).
+    GET: List them with the form for a new one
+    POST: Add one; it is posted on its due dates by the scheduler
+          (see services/recurring.py)
     """
-    # Get only this user's accounts
-    user_accounts = Account.query.filter_by(user_id=current_user.id).all()
-    user_account_ids = [a.id for a in user_accounts]
+    if request.method == 'POST':
+        amount_str = request.form.get('amount')
+        start_str = request.form.get('start_date')
+        frequency = request.form.get('frequency')
+        if not amount_str or not start_str or frequency not in RecurringTransaction.FREQUENCIES:
+            flash('Amount, start date and frequency are required.', 'error')
+            return redirect(url_for('transactions.recurring'))
+        
+        # Ownership check: account must belong to current user
+        account = db.session.get(Account, request.form.get('account_id', type=int) or 0)
+        if not account or account.user_id != current_user.id:
+            flash('Invalid account selected.', 'error')
+            return redirect(url_for('transactions.recurring'))
+        
+        # Ownership check: category must belong to current user (if provided)
+        category_id = request.form.get('category_id', type=int)
+        if category_id:
+            category = db.session.get(Category, category_id)
+            if not category or category.user_id != current_user.id:
+                flash('Invalid category selected.', 'error')
+                return redirect(url_for('transactions.recurring'))
+        
+        start_date = datetime.strptime(start_str, '%Y-%m-%d').date()
+        end_str = request.form.get('end_date')
+        end_date = datetime.strptime(end_str, '%Y-%m-%d').date() if end_str else None
+        if end_date and end_date < start_date:
+            flash('The end date must be after the start date.', 'error')
+            return redirect(url_for('transactions.recurring'))
+        
+        # Round to the account's currency (no cents for JPY), negative for expenses
+        try:
+            amount = abs(round_money(parse_money(amount_str), account.currency))
+        except ValueError:
+            flash('The amount must be a number.', 'error')
+            return redirect(url_for('transactions.recurring'))
+        if request.form.get('type') == 'expense':
+            amount = -amount
+        
+        db.session.add(RecurringTransaction(
+            user_id=current_user.id,
+            account_id=account.id,
+            category_id=category_id or None,
+            amount=amount,
+            description=request.form.get('description', ''),
+            location=request.form.get('location', ''),
+            frequency=frequency,
+            interval=max(1, request.form.get('interval', 1, type=int) or 1),
+            start_date=start_date,
+            end_date=end_date,
+            next_date=start_date
+        ))
+        db.session.commit()
+        
+        flash('Recurring transaction added!', 'success')
+        return redirect(url_for('transactions.recurring'))
+    
+    items = RecurringTransaction.query.filter_by(user_id=current_user.id) \
+        .order_by(RecurringTransaction.next_date, RecurringTransaction.id).all()
+    accounts = Account.query.filter_by(user_id=current_user.id).all()
+    categories = Category.query.filter_by(user_id=current_user.id).all()
+    today = datetime.now().strftime('%Y-%m-%d')
+    
+    return render_template('transactions/recurring.html',
+                           items=items,
+                           accounts=accounts,
+                           categories=categories,
+                           frequencies=RecurringTransaction.FREQUENCIES,
+                           today=today)
+
+
+@transactions_bp.route('/recurring/delete/<int:id>', methods=['POST'])
+@login_required
+def delete_recurring(id):
+    """Stop a recurring transaction (transactions already posted are kept)."""
+    item = db.session.get(RecurringTransaction, id)
+    if not item:
+        return "Not found", 404
     
-    # Get transactions only from user's accounts, newest first
-    transactions = Transaction.query \
-        .filter(Transaction.account_id.in_(user_account_ids)) \
-        .order_by(Transaction.date.desc()) \
-        .all()
+    # Make sure this item belongs to the current user
+    if item.user_id != current_user.id:
+        flash('Access denied.', 'error')
+        return redirect(url_for('transactions.recurring'))
+    
+    # Keep the posted transactions, just forget where they came from
+    Transaction.query.filter_by(recurring_id=id).update({'recurring_id': None})
+    db.session.delete(item)
+    db.session.commit()
     
-    return render_template('transactions/list.html', transactions=transactions)
+    flash('Recurring transaction deleted.', 'info')
+    return redirect(url_for('transactions.recurring'))
 
 
 @transactions_bp.route('/add', methods=['GET', 'POST'])
@@ -53,7 +358,11 @@ def add_transaction():
             return render_template('transactions/add.html',
                                    accounts=accounts, categories=categories, today=today)
         
-        amount = float(amount_str)
+        try:
+            amount = parse_money(amount_str)
+        except ValueError:
+            flash('The amount must be a number.', 'error')
+            return redirect(url_for('transactions.add_transaction'))
         description = request.form.get('description', '')
         account_id = int(request.form['account_id'])
         category_id = request.form.get('category_id')
@@ -75,7 +384,8 @@ def add_transaction():
         # Convert date string to date object
         date = datetime.strptime(date_str, '%Y-%m-%d').date()
         
-        # Make amount negative for expenses
+        # Round to the account's currency (no cents for JPY), negative for expenses
+        amount = round_money(amount, account.currency)
         if transaction_type == 'expense':
             amount = -abs(amount)
         else:
@@ -84,19 +394,24 @@ def add_transaction():
         # Get location from form
         location = request.form.get('location', '')
         
+        # No category picked: let the user's categorization rules choose one
+        if category_id:
+            category_id = int(category_id)
+        else:
+            category_id = rules_for(current_user.id).match(description, location, account_id, amount)
+        
         # Create new transaction
         transaction = Transaction(
             amount=amount,
             description=description,
             date=date,
             account_id=account_id,
-            category_id=int(category_id) if category_id else None,
+            category_id=category_id,
             location=location
         )
         
-        # Update account balance (account already validated above)
-        if account:
-            account.balance += amount
+        # Update account balance in the database (safe with concurrent requests)
+        add_to_balances({account_id: amount})
         
         # Save to database
         db.session.add(transaction)
@@ -138,7 +453,11 @@ def edit_transaction(id):
         old_account_id = transaction.account_id
         
         # Get new values
-        new_amount = float(request.form['amount'])
+        try:
+            new_amount = parse_money(request.form['amount'])
+        except ValueError:
+            flash('The amount must be a number.', 'error')
+            return redirect(url_for('transactions.edit_transaction', id=id))
         transaction_type = request.form['type']
         new_account_id = int(request.form['account_id'])
         
@@ -148,27 +467,12 @@ def edit_transaction(id):
             flash('Invalid account selected.', 'error')
             return redirect(url_for('transactions.edit_transaction', id=id))
         
+        new_amount = round_money(new_amount, new_account.currency)
         if transaction_type == 'expense':
             new_amount = -abs(new_amount)
         else:
             new_amount = abs(new_amount)
         
-        # If account changed, adjust both old and new account balances
-        if old_account_id != new_account_id:
-            # Reverse the transaction in the old account
-            old_account = db.session.get(Account, old_account_id)
-            if old_account:
-                old_account.balance -= old_amount
-            
-            # Apply the transaction to the new account
-            new_account.balance += new_amount
-            
-            transaction.account_id = new_account_id
-        else:
-            # Same account, just adjust the difference
-            if new_account:
-                new_account.balance = new_account.balance - old_amount + new_amount
-        
         # Ownership check: category must belong to current user (if provided)
         new_category_id = request.form.get('category_id')
         if new_category_id:
@@ -177,6 +481,14 @@ def edit_transaction(id):
                 flash('Invalid category selected.', 'error')
                 return redirect(url_for('transactions.edit_transaction', id=id))
         
+        # Reverse the old amount and apply the new one (in the database, so
+        # concurrent requests can't overwrite each other's balance changes).
+        # If the account changed, this moves the amount between accounts.
+        changes = {old_account_id: -old_amount}
+        changes[new_account_id] = changes.get(new_account_id, 0) + new_amount
+        add_to_balances(changes)
+        transaction.account_id = new_account_id
+        
         # Update transaction fields
         transaction.amount = new_amount
         transaction.description = request.form.get('description', '')
@@ -215,9 +527,7 @@ def delete_transaction(id):
         return redirect(url_for('transactions.list_transactions'))
     
     # Reverse the balance change
-    account = db.session.get(Account, transaction.account_id)
-    if account:
-        account.balance -= transaction.amount
+    add_to_balances({transaction.account_id: -transaction.amount})
     
     db.session.delete(transaction)
     db.session.commit()
@@ -237,7 +547,11 @@ def transfer():
     if request.method == 'POST':
         from_account_id = int(request.form['from_account_id'])
         to_account_id = int(request.form['to_account_id'])
-        amount = float(request.form['amount'])
+        try:
+            amount = parse_money(request.form['amount'])
+        except ValueError:
+            flash('The amount must be a number.', 'error')
+            return redirect(url_for('transactions.transfer'))
         date_str = request.form['date']
         description = request.form.get('description', '')
         
@@ -258,10 +572,16 @@ def transfer():
             flash('Access denied.', 'error')
             return redirect(url_for('transactions.transfer'))
         
-        # Check sufficient balance
-        if from_account.balance < amount:
+        amount = round_money(amount, from_account.currency)
+        
+        # Lock both accounts (in id order) until commit, then take the money
+        # only if the balance covers it - check and change in one statement
+        lock_accounts([from_account_id, to_account_id])
+        if not withdraw(from_account_id, amount):
+            db.session.rollback()
             flash('Insufficient balance in source account!', 'error')
             return redirect(url_for('transactions.transfer'))
+        add_to_balances({to_account_id: amount})
         
         # Convert date
         date = datetime.strptime(date_str, '%Y-%m-%d').date()
@@ -289,17 +609,13 @@ def transfer():
             category_id=None
         )
         
-        # Update balances
-        from_account.balance -= amount
-        to_account.balance += amount
-        
         # Save to database
         db.session.add(trans_out)
         db.session.add(trans_in)
         db.session.commit()
         
         currency_symbol = get_currency_symbol(from_account.currency)
-        flash(f'Successfully transferred {currency_symbol}{amount:.2f} from {from_account.name} to {to_account.name}!', 'success')
+        flash(f'Successfully transferred {currency_symbol}{format_money(amount, from_account.currency)} from {from_account.name} to {to_account.name}!', 'success')
         return redirect(url_for('transactions.list_transactions'))
     
     # GET request - show the form
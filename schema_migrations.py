@@ -0,0 +1,257 @@
+"""
+Schema Migrations - Bring existing databases up to date.
+
+db.create_all() only creates missing tables; it never changes tables that
+already exist. Changes to existing tables (new indexes, new columns) are
+listed here as numbered migrations. Applied versions are recorded in the
+schema_migrations table and pending ones run in order, at startup or with:
+    flask --app app migrate-db
+
+Rules for writing a migration:
+- It must also work on a database that already has the change, because new
+  databases get the full schema from create_all() (use IF NOT EXISTS,
+  check for columns before adding them).
+- It must not lock tables for long: on Postgres indexes are built with
+  CREATE INDEX CONCURRENTLY, which doesn't block reads or writes, so
+  migrations can run against a live database.
+"""
+from sqlalchemy import text, inspect, select, Integer
+from sqlalchemy.schema import CreateIndex
+from models import db, SchemaMigration
+from money import Money, STORAGE_EXPONENT
+from services import search, duplicates, rollups, category_tree
+
+# Any number works, it only has to be the same for every app process
+_ADVISORY_LOCK_KEY = 727274001
+
+# The migration that converts money to cents (see money_to_minor_units)
+_MONEY_VERSION = 5
+
+
+def _find_index(name):
+    """Look up an index declared in models.py by name."""
+    for table in db.metadata.tables.values():
+        for index in table.indexes:
+            if index.name == name:
+                return index
+    raise KeyError(f'No index named {name} in models.py')
+
+
+def create_index(name):
+    """Migration step: create one of the indexes declared in models.py."""
+    def step(engine):
+        index = _find_index(name)
+        if engine.dialect.name == 'postgresql':
+            _create_index_concurrently(engine, index)
+        else:
+            with engine.begin() as connection:
+                connection.execute(CreateIndex(index, if_not_exists=True))
+    step.__doc__ = f'Create index {name}'
+    return step
+
+
+def _create_index_concurrently(engine, index):
+    """CREATE INDEX CONCURRENTLY for an index declared in models.py."""
+    quote = engine.dialect.identifier_preparer.quote
+    columns = ', '.join(quote(column.name) for column in index.columns)
+    include = index.dialect_options['postgresql'].get('include') or []
+    include_sql = f' INCLUDE ({", ".join(quote(c) for c in include)})' if include else ''
+    unique = 'UNIQUE ' if index.unique else ''
+    create_index_concurrently(engine, index.name, (
+        f'CREATE {unique}INDEX CONCURRENTLY IF NOT EXISTS {quote(index.name)} '
+        f'ON {quote(index.table.name)} ({columns}){include_sql}'
+    ))
+
+
+def create_index_concurrently(engine, name, create_sql):
+    """
+    Run a Postgres CREATE INDEX CONCURRENTLY statement (outside a transaction).
+
+    A failed CONCURRENTLY build leaves an invalid index behind, which
+    IF NOT EXISTS would then skip: such an index is dropped and rebuilt.
+    """
+    quote = engine.dialect.identifier_preparer.quote
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+        invalid = connection.execute(text(
+            'SELECT 1 FROM pg_class c JOIN pg_index i ON i.indexrelid = c.oid '
+            'WHERE c.relname = :name AND NOT i.indisvalid'
+        ), {'name': name}).first()
+        if invalid:
+            connection.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS {quote(name)}'))
+        connection.execute(text(create_sql))
+
+
+def add_column(table_name, column_name):
+    """Migration step: add a column declared in models.py to an existing table."""
+    def step(engine):
+        if column_name in {c['name'] for c in inspect(engine).get_columns(table_name)}:
+            return
+        column = db.metadata.tables[table_name].c[column_name]
+        column_type = column.type.compile(dialect=engine.dialect)
+        quote = engine.dialect.identifier_preparer.quote
+        with engine.begin() as connection:
+            connection.execute(text(
+                f'ALTER TABLE {quote(table_name)} ADD COLUMN {quote(column_name)} {column_type}'
+            ))
+    step.__doc__ = f'Add column {table_name}.{column_name}'
+    return step
+
+
+def money_to_minor_units(engine):
+    """
+    Migration step: turn the old float money columns into whole cents.
+
+    Every Money column in models.py that is still a floating point column
+    gets its values multiplied by 100 (and rounded), all in one transaction.
+    - Postgres: ALTER COLUMN ... TYPE BIGINT USING ROUND(col * 100). This
+      rewrites the tables and locks them while it runs (unlike the index
+      migrations), so run it when the app is quiet.
+    - SQLite can't change a column's type: the values become whole numbers
+      of cents and the column keeps its old declared type, which is fine
+      for SQLite (dev and tests only).
+    Columns that are already integers (new databases) are left alone.
+
+    On SQLite the column type can't tell converted values from old ones, so
+    the migration is recorded in the same transaction as the conversion: if
+    the step runs again, it sees the record and doesn't multiply twice.
+    """
+    quote = engine.dialect.identifier_preparer.quote
+    scale = 10 ** STORAGE_EXPONENT
+    inspector = inspect(engine)
+    statements = []
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {c['name']: c['type'] for c in inspector.get_columns(table.name)}
+        for column in table.columns:
+            old_type = existing.get(column.name)
+            if not isinstance(column.type, Money) or old_type is None \
+                    or isinstance(old_type, Integer):
+                continue
+            name = quote(column.name)
+            if engine.dialect.name == 'postgresql':
+                statements.append(f'ALTER TABLE {quote(table.name)} ALTER COLUMN {name} '
+                                  f'TYPE BIGINT USING ROUND(CAST({name} AS NUMERIC) * {scale})')
+            else:
+                statements.append(f'UPDATE {quote(table.name)} SET {name} = ROUND({name} * {scale})')
+    if statements:
+        versions = SchemaMigration.__table__
+        with engine.begin() as connection:
+            versions.create(connection, checkfirst=True)
+            if _is_recorded(connection, _MONEY_VERSION):
+                return
+            for statement in statements:
+                connection.execute(text(statement))
+            _record(connection, _MONEY_VERSION)
+
+
+def _is_recorded(connection, version):
+    """Is this migration version in the schema_migrations table?"""
+    versions = SchemaMigration.__table__
+    return connection.execute(select(versions.c.version).where(versions.c.version == version)).first() is not None
+
+
+def _record(connection, version):
+    """Record a migration version as applied (unless a step already did)."""
+    if not _is_recorded(connection, version):
+        description = next(m[1] for m in MIGRATIONS if m[0] == version)
+        connection.execute(SchemaMigration.__table__.insert().values(
+            version=version, description=description
+        ))
+
+
+# ============================================
+# The migrations, oldest first. Never change or renumber an existing entry.
+# ============================================
+
+MIGRATIONS = [
+    (1, 'Composite indexes for the hot query shapes', [
+        create_index('ix_accounts_user_id'),
+        create_index('ix_categories_user_type'),
+        create_index('ix_transactions_account_date'),
+        create_index('ix_transactions_category_date'),
+        create_index('ix_budgets_user_category'),
+        create_index('ix_monthly_rollups_user_month'),
+        create_index('ix_monthly_rollups_account_month'),
+    ]),
+    (2, 'Full-text search index over transaction descriptions and locations', [
+        search.create_search_index,
+    ]),
+    (3, 'Transaction fingerprints for duplicate detection on import', [
+        add_column('transactions', 'fingerprint'),
+        create_index('ix_transactions_fingerprint'),
+        duplicates.backfill_fingerprints,
+    ]),
+    (4, 'Link transactions to the recurring item that posted them', [
+        add_column('transactions', 'recurring_id'),
+        create_index('ux_transactions_recurring_date'),
+    ]),
+    (5, 'Store money as whole cents instead of floats', [
+        money_to_minor_units,
+    ]),
+    (6, 'Remember when account balances changed (incremental ledger checks)', [
+        add_column('accounts', 'balance_changed_at'),
+        create_index('ix_accounts_balance_changed_at'),
+    ]),
+    (7, 'Stored transaction count per category', [
+        add_column('categories', 'transaction_count'),
+        rollups.backfill_category_counts,
+    ]),
+    (8, 'Parent categories (closure table of category paths)', [
+        add_column('categories', 'parent_id'),
+        create_index('ix_categories_parent_id'),
+        category_tree.backfill_paths,
+    ]),
+    (9, 'Recompute transaction fingerprints from whole-cent amounts', [
+        duplicates.refresh_fingerprints,
+    ]),
+    (10, 'Fill the monthly rollups from the existing transactions', [
+        rollups.backfill_rollups,
+    ]),
+]
+
+
+def applied_versions(engine):
+    """Versions already recorded in the schema_migrations table."""
+    with engine.connect() as connection:
+        return {row[0] for row in connection.execute(
+            SchemaMigration.__table__.select().with_only_columns(SchemaMigration.version)
+        )}
+
+
+def pending_migrations(engine):
+    """Migrations that haven't been applied yet, in order."""
+    SchemaMigration.__table__.create(engine, checkfirst=True)
+    done = applied_versions(engine)
+    return [m for m in MIGRATIONS if m[0] not in done]
+
+
+def upgrade(engine=None):
+    """
+    Apply all pending migrations.
+
+    On Postgres an advisory lock makes sure only one process migrates at a
+    time (several app workers may start at once).
+
+    Returns:
+        List of applied versions
+    """
+    engine = engine or db.engine
+    lock = None
+    if engine.dialect.name == 'postgresql':
+        lock = engine.connect().execution_options(isolation_level='AUTOCOMMIT')
+        lock.execute(text('SELECT pg_advisory_lock(:key)'), {'key': _ADVISORY_LOCK_KEY})
+
+    try:
+        applied = []
+        for version, _, steps in pending_migrations(engine):
+            for step in steps:
+                step(engine)
+            with engine.begin() as connection:
+                _record(connection, version)
+            applied.append(version)
+        return applied
+    finally:
+        if lock is not None:
+            lock.execute(text('SELECT pg_advisory_unlock(:key)'), {'key': _ADVISORY_LOCK_KEY})
+            lock.close()
@@ -0,0 +1,24 @@
+"""
+Services Package
+
+This folder contains the data/computation layer that the routes call into.
+Routes stay focused on request handling; anything that talks to the database
+in bulk or is shared between several pages lives here:
+- balances.py: Atomic balance changes, and balances as of a given date
+- rollups.py: Pre-computed monthly totals (kept in sync on every write)
+- category_tree.py: Parent categories stored as a closure table
+- dashboard_cache.py: LRU cache of computed dashboard months
+- transaction_list.py: Paged queries for the transactions page
+- search.py: Full-text search over transaction descriptions and locations
+- importer.py: Batched import of bank statements (CSV, OFX, QIF)
+- statement_parsers.py: Streaming OFX and QIF parsers
+- exporter.py: Streamed CSV / JSON Lines export
+- duplicates.py: Transaction fingerprints for skipping duplicate imports
+- categorizer.py: Per-user categorization rules compiled into one matcher
+- bulk_actions.py: Set-based recategorize / move / delete of many transactions
+- recurring.py: Scheduler that posts due recurring transactions in batches
+- ledger.py: Job that checks stored balances against the transactions
+- budgets.py: Spending against each budget's limit in its current period
+- budget_alerts.py: Queued events turned into 80% / 100% budget alerts by a worker
+- background.py: Batch retries and background threads shared by the queue jobs
+"""
@@ -0,0 +1,75 @@
+"""
+Background Jobs - What the jobs that work through a queue have in common.
+
+The recurring scheduler (recurring.py) and the budget alert worker
+(budget_alerts.py) work the same way:
+- they handle their queue a batch at a time, one commit per batch
+- several app processes (or a cron run next to one) may handle the same
+  batch at once; a unique index lets only one of them write it, and the
+  slower one starts its batch over (commit_batch)
+- they run from a CLI command, or every few seconds in a daemon thread
+  of the app (start_periodic)
+"""
+import logging
+import threading
+from sqlalchemy.exc import IntegrityError
+from models import db
+
+logger = logging.getLogger(__name__)
+
+# A conflicting batch (another process got there first) is retried this often
+RETRIES = 3
+
+
+def commit_batch(work):
+    """
+    Run work() and commit, starting over if another process wrote the same rows first.
+
+    Args:
+        work: Function that writes one batch (without committing)
+
+    Returns:
+        What work() returned
+    """
+    for attempt in range(RETRIES):
+        try:
+            result = work()
+            db.session.commit()
+            return result
+        except IntegrityError:
+            db.session.rollback()
+            if attempt == RETRIES - 1:
+                raise
+
+
+def start_periodic(app, interval, name, job):
+    """
+    Run job() every `interval` seconds in a daemon thread, inside an app context.
+
+    A failing run is rolled back and logged; the next one runs as usual.
+
+    Args:
+        app: The Flask app
+        interval: Seconds between runs
+        name: Thread name (also used in the log)
+        job: Function to run
+
+    Returns:
+        threading.Event; set it to stop the thread
+    """
+    stop = threading.Event()
+
+    def run():
+        while not stop.wait(interval):
+            with app.app_context():
+                try:
+                    job()
+                except Exception:
+                    db.session.rollback()
+                    logger.exception('Background job %s failed', name)
+                finally:
+                    db.session.remove()
+
+    thread = threading.Thread(target=run, name=name, daemon=True)
+    thread.start()
+    return stop
@@ -0,0 +1,140 @@
+"""
+Balance Engine - Current and historical account balances.
+
+Changing balances:
+Every write adds to the balance inside the database
+(UPDATE accounts SET balance = balance + :delta) instead of reading it into
+Python, adding and writing it back. With read-modify-write, two requests
+at the same time (phone and laptop) both read the old balance and one
+change is lost. See add_to_balances() and withdraw(). Both also stamp
+balance_changed_at, which the ledger check (services/ledger.py) uses to
+find the accounts to re-check.
+
+Reading balances:
+The dashboard shows what every account held at the end of the selected month.
+Instead of asking the database once per account, all balances are computed
+from a single grouped query over the monthly rollups, so the cost stays the
+same no matter how many accounts a user has (see balances_at_month()).
+"""
+from calendar import monthrange
+from datetime import date, datetime, timezone
+from sqlalchemy import select, update, bindparam
+from models import db, Account
+from services import rollups
+
+
+# ============================================
+# Changing balances (atomic, safe with concurrent requests)
+# ============================================
+
+def add_to_balances(changes):
+    """
+    Add amounts to account balances, in one (executemany) UPDATE.
+
+    Args:
+        changes: Dict of account id -> amount to add (negative to subtract)
+    """
+    params = [{'target_id': account_id, 'delta': delta}
+              for account_id, delta in sorted(changes.items()) if delta]
+    if not params:
+        return
+    accounts = Account.__table__
+    db.session.connection().execute(
+        update(accounts).where(accounts.c.id == bindparam('target_id'))
+        .values(balance=accounts.c.balance + bindparam('delta'),
+                balance_changed_at=datetime.now(timezone.utc)),
+        params
+    )
+    _expire_balances(changes)
+
+
+def withdraw(account_id, amount):
+    """
+    Take `amount` from an account, but only if its balance covers it.
+
+    The check and the change are one statement
+    (UPDATE ... SET balance = balance - :amount WHERE balance >= :amount),
+    so two withdrawals at the same time can't both pass the check.
+
+    Returns:
+        True if the money was taken, False if the balance was too low
+    """
+    accounts = Account.__table__
+    result = db.session.connection().execute(
+        update(accounts)
+        .where(accounts.c.id == account_id)
+        .where(accounts.c.balance >= amount)
+        .values(balance=accounts.c.balance - amount,
+                balance_changed_at=datetime.now(timezone.utc))
+    )
+    _expire_balances({account_id: amount})
+    return result.rowcount == 1
+
+
+def lock_accounts(account_ids):
+    """
+    Lock account rows until the end of the transaction (SELECT ... FOR UPDATE).
+
+    Rows are locked in id order, so two requests locking the same accounts
+    can't deadlock. SQLite has no row locks (it allows one writer at a
+    time anyway); there this only reads the rows.
+    """
+    db.session.execute(
+        select(Account.id).where(Account.id.in_(account_ids)).order_by(Account.id).with_for_update()
+    ).all()
+
+
+def _expire_balances(account_ids):
+    """Balances were changed in the database: reload them on next access."""
+    for obj in list(db.session.identity_map.values()):
+        if isinstance(obj, Account) and obj.id in account_ids:
+            db.session.expire(obj, ['balance', 'balance_changed_at'])
+
+
+# ============================================
+# Reading balances
+# ============================================
+
+
+def _existing_accounts(accounts, as_of):
+    """Accounts that already existed at the end of `as_of`."""
+    return [a for a in accounts
+            if not (a.starting_date and a.starting_date > as_of)]
+
+
+def balances_at_month(accounts, year, month):
+    """
+    Calculate the balance of each account at the end of a month.
+
+    Method: current balance - sum of all transactions after the month,
+    read from the pre-computed monthly rollups (one grouped query).
+    Accounts that didn't exist yet at the end of the month get None.
+
+    Returns:
+        Dict mapping account id -> balance (float) or None
+    """
+    last_of_month = date(year, month, monthrange(year, month)[1])
+    existing = _existing_accounts(accounts, last_of_month)
+    balances = {a.id: None for a in accounts}
+    if not existing:
+        return balances
+
+    amounts_after = rollups.amounts_after_month([a.id for a in existing], year, month)
+    for account in existing:
+        balances[account.id] = account.balance - amounts_after.get(account.id, 0)
+    return balances
+
+
+def annotate_balances_at_month(accounts, year, month):
+    """
+    Set `balance_at_month` on each account and return the total.
+
+    Accounts that didn't exist yet get None and are left out of the total.
+    """
+    balances = balances_at_month(accounts, year, month)
+    total_balance = 0
+    for account in accounts:
+        account.balance_at_month = balances[account.id]
+        if account.balance_at_month is not None:
+            total_balance += account.balance_at_month
+    return total_balance
@@ -0,0 +1,178 @@
+"""
+Budget Alerts - Tell users when spending reaches 80% or 100% of a budget.
+
+Checking the budgets while saving a transaction would slow down every
+write, so the work is split in two:
+
+1. Writes only queue an event. Whenever the rollups record more spending
+   in a category (see RollupDeltas.apply in rollups.py), one BudgetEvent
+   row per touched category that a budget covers (on it or on a category
+   above it) is inserted in the same database transaction. That covers
+   every write path (forms, imports, bulk actions, recurring postings) and
+   costs one small INSERT ... SELECT; spending nothing is budgeted for
+   queues nothing, so the queue doesn't grow when no worker runs.
+2. A worker (process_events) takes a batch of events, groups them by user,
+   finds the budgets over the touched categories (a budget on a parent
+   category is touched by its subcategories too) and re-evaluates only
+   those, with one query per user (see budgets.py). Each threshold reached
+   becomes a BudgetAlert in the outbox, and the events are deleted, in the
+   same commit.
+
+Each budget gets at most one alert per period and threshold: alerts that
+already exist are skipped, and a unique index stops two workers racing
+on the same batch (the slower one's batch is retried, see background.py).
+
+Run it with `flask --app app process-budget-events` (e.g. from cron), or
+set BUDGET_ALERT_INTERVAL to run it in a background thread.
+"""
+import logging
+from datetime import date
+from sqlalchemy import select, insert, delete, tuple_
+from models import db, Budget, BudgetEvent, BudgetAlert, CategoryPath
+from services import background, budgets
+
+logger = logging.getLogger(__name__)
+
+# Percent of the limit that raise an alert
+THRESHOLDS = (80, 100)
+
+
+# ============================================
+# Write side: queue events
+# ============================================
+
+def enqueue(connection, touched):
+    """
+    Queue one event per budgeted (user_id, category_id) pair (call inside the write's transaction).
+
+    Args:
+        connection: The write's database connection
+        touched: Set of (user_id, category_id) whose spending grew
+    """
+    if not touched:
+        return
+    # Touched categories with a budget on themselves or an ancestor
+    budgeted = (
+        select(Budget.user_id, CategoryPath.descendant_id).distinct()
+        .join(CategoryPath, CategoryPath.ancestor_id == Budget.category_id)
+        .where(tuple_(Budget.user_id, CategoryPath.descendant_id).in_(sorted(touched)))
+    )
+    connection.execute(
+        insert(BudgetEvent.__table__).from_select(['user_id', 'category_id'], budgeted)
+    )
+
+
+# ============================================
+# Worker side: evaluate and write alerts
+# ============================================
+
+class ProcessResult:
+    """What a worker run did."""
+
+    def __init__(self):
+        self.events = 0     # events handled
+        self.budgets = 0    # budgets re-evaluated
+        self.alerts = 0     # alerts written
+
+
+def thresholds_reached(status):
+    """The thresholds (percent) a BudgetStatus has reached."""
+    return [threshold for threshold in THRESHOLDS
+            if status.limit and status.spent >= status.limit * threshold / 100]
+
+
+def process_events(today=None, batch_size=1000):
+    """
+    Handle all queued events, a batch at a time (one commit per batch).
+
+    Args:
+        today: Day that picks the budget periods (default: today)
+        batch_size: Events per batch
+
+    Returns:
+        ProcessResult
+    """
+    today = today or date.today()
+    result = ProcessResult()
+    while True:
+        events, evaluated, alerts = background.commit_batch(lambda: _process_batch(today, batch_size))
+        result.events += events
+        result.budgets += evaluated
+        result.alerts += alerts
+        if events < batch_size:
+            return result
+
+
+def _process_batch(today, batch_size):
+    """
+    One batch of events: re-evaluate the budgets they touch and write the alerts.
+
+    Returns:
+        (events handled, budgets evaluated, alerts written)
+    """
+    events = db.session.execute(
+        select(BudgetEvent.id, BudgetEvent.user_id, BudgetEvent.category_id)
+        .order_by(BudgetEvent.id).limit(batch_size)
+    ).all()
+    if not events:
+        return 0, 0, 0
+
+    # Budgets over the touched categories (categories belong to one user,
+    # so the category ids alone pick the right users' budgets)
+    touched = {category_id for _, _, category_id in events}
+    budget_rows = db.session.execute(
+        select(Budget.id, Budget.user_id).distinct()
+        .join(CategoryPath, CategoryPath.ancestor_id == Budget.category_id)
+        .where(CategoryPath.descendant_id.in_(touched))
+    ).all()
+    by_user = {}
+    for budget_id, user_id in budget_rows:
+        by_user.setdefault(user_id, []).append(budget_id)
+
+    # One query per user for their touched budgets
+    reached = []
+    for user_id, budget_ids in sorted(by_user.items()):
+        for status in budgets.evaluate(user_id, today, budget_ids):
+            reached.extend((user_id, status, threshold) for threshold in thresholds_reached(status))
+
+    new_alerts = _new_alerts(reached)
+    if new_alerts:
+        db.session.execute(insert(BudgetAlert.__table__), new_alerts)
+    db.session.execute(delete(BudgetEvent).where(BudgetEvent.id.in_([row.id for row in events])))
+    return len(events), len(budget_rows), len(new_alerts)
+
+
+def _new_alerts(reached):
+    """Rows for the reached thresholds that have no alert yet in this period."""
+    if not reached:
+        return []
+    keys = [(status.budget_id, status.start, threshold) for _, status, threshold in reached]
+    existing = set(db.session.execute(
+        select(BudgetAlert.budget_id, BudgetAlert.period_start, BudgetAlert.threshold)
+        .where(tuple_(BudgetAlert.budget_id, BudgetAlert.period_start, BudgetAlert.threshold).in_(keys))
+    ).all())
+    return [
+        {'user_id': user_id, 'budget_id': status.budget_id, 'threshold': threshold,
+         'period_start': status.start, 'spent': status.spent, 'budget_amount': status.limit}
+        for user_id, status, threshold in reached
+        if (status.budget_id, status.start, threshold) not in existing
+    ]
+
+
+# ============================================
+# Background thread (optional)
+# ============================================
+
+def start_worker(app, interval):
+    """
+    Run process_events() every `interval` seconds in a daemon thread.
+
+    Several app processes may each run one: the unique index keeps them
+    from writing the same alert twice.
+    """
+    def job():
+        alerts = process_events(batch_size=app.config['BUDGET_EVENT_BATCH_SIZE']).alerts
+        if alerts:
+            logger.info('Wrote %d budget alerts', alerts)
+
+    return background.start_periodic(app, interval, 'budget-alerts', job)
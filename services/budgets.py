@@ -0,0 +1,117 @@
+"""
+Budgets - How much of each budget has been spent in its current period.
+
+A Budget is a spending limit for a category per week, month or year. A
+budget on a parent category also counts the spending of its subcategories
+(see category_tree.py).
+
+All of a user's budgets are evaluated with one query, whatever their
+number, and without scanning the period's transactions where possible:
+- monthly and yearly budgets add up the pre-computed MonthlyRollup rows
+  of their period (one month, or the twelve months of the year)
+- weekly budgets don't line up with the monthly rollups, so they add up
+  the transactions of their (at most 7) days through the
+  ix_transactions_category_date index
+
+Periods are calendar periods: weeks run Monday to Sunday.
+"""
+import calendar
+from collections import namedtuple
+from datetime import date, timedelta
+from sqlalchemy import select, func, case, and_, or_, union_all
+from models import db, Budget, Category, CategoryPath, MonthlyRollup, Transaction
+
+PERIODS = ('weekly', 'monthly', 'yearly')
+
+# Share of the limit from which a budget counts as nearly used up
+WARNING_RATIO = 0.8
+
+
+class BudgetStatus(namedtuple('BudgetStatus', 'budget_id category_id name icon color '
+                                              'period limit spent start end')):
+    """One budget in its current period. spent is positive (money spent)."""
+
+    @property
+    def percent(self):
+        """Spent share of the limit, in percent (can be over 100)."""
+        return round(self.spent / self.limit * 100) if self.limit else 0
+
+    @property
+    def level(self):
+        """'over' the limit, 'warning' (WARNING_RATIO reached) or 'ok'."""
+        if self.spent > self.limit:
+            return 'over'
+        if self.spent >= self.limit * WARNING_RATIO:
+            return 'warning'
+        return 'ok'
+
+
+def period_window(period, on_date):
+    """First and last day of the period (weekly/monthly/yearly) that on_date falls in."""
+    if period == 'weekly':
+        start = on_date - timedelta(days=on_date.weekday())
+        return start, start + timedelta(days=6)
+    if period == 'yearly':
+        return date(on_date.year, 1, 1), date(on_date.year, 12, 31)
+    last_day = calendar.monthrange(on_date.year, on_date.month)[1]
+    return on_date.replace(day=1), on_date.replace(day=last_day)
+
+
+def evaluate(user_id, on_date=None, budget_ids=None):
+    """
+    Spending against the limit of a user's budgets, for the periods on_date is in.
+
+    Args:
+        user_id: Whose budgets
+        on_date: Day that picks the periods (default: today)
+        budget_ids: Only these budgets (default: all of the user's)
+
+    Returns:
+        List of BudgetStatus, ordered by category name
+    """
+    on_date = on_date or date.today()
+    period = func.coalesce(Budget.period, 'monthly')
+    week_start, week_end = period_window('weekly', on_date)
+
+    def budgets():
+        query = select(Budget.id).where(Budget.user_id == user_id)
+        if budget_ids is not None:
+            query = query.where(Budget.id.in_(budget_ids))
+        return query
+
+    # Monthly and yearly budgets: the rollups of the budget's category subtree
+    from_rollups = budgets().add_columns(MonthlyRollup.expense_total.label('spent')) \
+        .join(CategoryPath, CategoryPath.ancestor_id == Budget.category_id) \
+        .join(MonthlyRollup, and_(
+            MonthlyRollup.user_id == Budget.user_id,
+            MonthlyRollup.category_id == CategoryPath.descendant_id,
+            MonthlyRollup.year == on_date.year,
+            or_(period == 'yearly', and_(period == 'monthly', MonthlyRollup.month == on_date.month))
+        ))
+    # Weekly budgets: the week's expenses in the category subtree
+    from_transactions = budgets().add_columns(
+        case((Transaction.amount < 0, Transaction.amount), else_=0).label('spent')
+    ).join(CategoryPath, CategoryPath.ancestor_id == Budget.category_id) \
+     .join(Transaction, and_(
+         Transaction.category_id == CategoryPath.descendant_id,
+         Transaction.date >= week_start,
+         Transaction.date <= week_end
+     )).where(period == 'weekly')
+    spent = union_all(from_rollups, from_transactions).subquery()
+
+    rows = db.session.execute(
+        select(Budget.id, Budget.category_id, Category.name, Category.icon, Category.color,
+               period, Budget.amount, func.sum(spent.c.spent))
+        .join(Category, Category.id == Budget.category_id)
+        .outerjoin(spent, spent.c.id == Budget.id)
+        .where(Budget.id.in_(budgets()))
+        .group_by(Budget.id, Budget.category_id, Category.name, Category.icon, Category.color,
+                  period, Budget.amount)
+        .order_by(Category.name, Budget.id)
+    ).all()
+
+    return [
+        BudgetStatus(budget_id, category_id, name, icon, color, budget_period, limit,
+                     abs(total or 0), *period_window(budget_period, on_date))
+        for budget_id, category_id, name, icon, color, budget_period, limit, total in rows
+    ]
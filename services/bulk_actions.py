@@ -0,0 +1,224 @@
+"""
+Bulk Actions - Change or delete many transactions with a few statements.
+
+Fixing a merchant that was miscategorized for two years would otherwise
+mean hundreds of edits, each a form POST with its own lookups and commit.
+Here the transactions are picked by the list filters (or by id) and changed
+set-based:
+
+- recategorize: one UPDATE ... SET category_id
+- move_account: one UPDATE ... SET account_id (plus one executemany
+                UPDATE for the duplicate-detection fingerprints, which
+                include the account and are computed in Python)
+- delete:       one DELETE
+
+Every statement has the ownership check in its WHERE clause (the
+transaction's account must belong to the user), so ids of other users'
+transactions are simply not matched.
+
+Set-based writes bypass the ORM flush hooks, so the side effects are done
+here too, from one GROUP BY query over the picked transactions:
+- rollups (and category transaction counts) get one delta per
+  (account, category, month), see RollupDeltas
+- balances get one delta per account, in one executemany UPDATE
+
+The picked rows are locked (SELECT ... FOR UPDATE) before they are added
+up, so a concurrent edit can't change them between the totals and the
+write (Postgres runs in READ COMMITTED, where it otherwise could; SQLite
+locks the whole database for a write anyway and ignores FOR UPDATE).
+
+The caller commits, so an action is all or nothing.
+
+Emptying a big category (when it is deleted) is different: one UPDATE of
+tens of thousands of rows keeps them locked (Postgres) or blocks every
+other writer (SQLite) until it is done. move_category_in_batches() moves
+the rows a batch at a time instead, committing after each batch.
+"""
+from sqlalchemy import select, update, delete, bindparam, func, case, extract
+from models import db, Account, Category, Transaction
+from services.rollups import RollupDeltas, UNCATEGORIZED
+from services.balances import add_to_balances
+from services.duplicates import fingerprint
+
+ACTIONS = ('recategorize', 'move_account', 'delete')
+
+
+def selection(user_id, filters=None, ids=None):
+    """
+    WHERE clause for the user's transactions picked by filters and/or ids.
+
+    Args:
+        user_id: Owner (the only user whose transactions can match)
+        filters: TransactionFilters, or None
+        ids: List of transaction ids, or None for "all that match the filters"
+    """
+    query = select(Transaction.id).where(
+        Transaction.account_id.in_(select(Account.id).where(Account.user_id == user_id))
+    )
+    if ids is not None:
+        query = query.where(Transaction.id.in_(ids))
+    if filters is not None:
+        query = filters.apply(query)
+    return query.whereclause
+
+
+def _lock(connection, where):
+    """Lock the picked transactions until the commit (see module docstring)."""
+    connection.execute(select(Transaction.id).where(where).with_for_update(of=Transaction)).all()
+
+
+def _totals(where):
+    """
+    Rollup-style totals of the picked transactions per (account, category, year, month),
+    plus the number of transactions of amount 0 (counted, but not in the rollups).
+    """
+    year = extract('year', Transaction.date)
+    month = extract('month', Transaction.date)
+    is_income = Transaction.amount > 0
+    is_expense = Transaction.amount < 0
+    return db.session.connection().execute(
+        select(
+            Transaction.account_id,
+            Transaction.category_id,
+            year,
+            month,
+            func.sum(case((is_income, Transaction.amount), else_=0)),
+            func.sum(case((is_expense, Transaction.amount), else_=0)),
+            func.sum(case((is_income, 1), else_=0)),
+            func.sum(case((is_expense, 1), else_=0)),
+            func.sum(case((Transaction.amount == 0, 1), else_=0)),
+        ).where(where)
+         .group_by(Transaction.account_id, Transaction.category_id, year, month)
+    ).all()
+
+
+def bulk_update(user_id, action, filters=None, ids=None, category_id=None, account_id=None):
+    """
+    Apply a bulk action to the user's transactions.
+
+    Args:
+        user_id: Owner of the transactions
+        action: One of ACTIONS
+        filters: TransactionFilters picking the transactions
+        ids: Transaction ids picking the transactions (combined with filters)
+        category_id: New category for 'recategorize' (None = no category),
+                     ownership already checked
+        account_id: New account for 'move_account', ownership already checked
+
+    Returns:
+        Number of transactions changed or deleted
+    """
+    if action not in ACTIONS:
+        raise ValueError(f'Unknown bulk action {action!r}')
+    if action == 'move_account' and account_id is None:
+        raise ValueError('move_account needs an account_id')
+
+    where = selection(user_id, filters, ids)
+    table = Transaction.__table__
+    connection = db.session.connection()
+    _lock(connection, where)
+    totals = _totals(where)
+
+    deltas = RollupDeltas()
+    net = {}  # account id -> change to its balance
+    for row in totals:
+        old_account, old_category, year, month = row[0], row[1] or UNCATEGORIZED, int(row[2]), int(row[3])
+        values, zero_amounts = tuple(row[4:8]), row[8]
+        amount = values[0] + values[1]
+        deltas.add_row((user_id, old_account, old_category, year, month), *[-value for value in values])
+        if action != 'move_account':
+            deltas.add_count(old_category, -zero_amounts)
+        if action == 'recategorize':
+            deltas.add_row((user_id, old_account, category_id or UNCATEGORIZED, year, month), *values)
+            deltas.add_count(category_id, zero_amounts)
+        elif action == 'move_account':
+            deltas.add_row((user_id, account_id, old_category, year, month), *values)
+            net[old_account] = net.get(old_account, 0) - amount
+            net[account_id] = net.get(account_id, 0) + amount
+        else:
+            net[old_account] = net.get(old_account, 0) - amount
+
+    if action == 'recategorize':
+        count = connection.execute(update(table).where(where).values(category_id=category_id)).rowcount
+    elif action == 'move_account':
+        count = _move_account(connection, where, table, account_id)
+    else:
+        count = connection.execute(delete(table).where(where)).rowcount
+
+    deltas.apply(db.session)
+    add_to_balances(net)
+    _expire_loaded()
+    return count
+
+
+def move_category_in_batches(user_id, old_category_id, new_category_id, batch_size=1000,
+                             progress=None):
+    """
+    Move all of a category's transactions to another category, a batch at a time.
+
+    Every batch is a recategorize bulk_update() of at most batch_size
+    transactions and is committed on its own, so locks are held only
+    briefly and other requests can write in between. Rollups and counts
+    are updated in the same commit as their batch, so they are right after
+    every batch; if the move stops halfway, running it again finishes it.
+
+    Args:
+        user_id: Owner of the category
+        old_category_id: Category to empty
+        new_category_id: Category to move to (None = no category), ownership already checked
+        batch_size: Transactions per batch (and commit)
+        progress: Called as progress(moved, total) after each batch
+
+    Returns:
+        Number of transactions moved
+    """
+    if new_category_id == old_category_id:
+        return 0
+    total = db.session.execute(
+        select(Category.transaction_count).where(Category.id == old_category_id)
+    ).scalar() or 0
+    moved = 0
+    while True:
+        ids = db.session.execute(
+            select(Transaction.id).where(selection(user_id))
+            .where(Transaction.category_id == old_category_id)
+            .order_by(Transaction.id).limit(batch_size)
+        ).scalars().all()
+        if not ids:
+            return moved
+        moved += bulk_update(user_id, 'recategorize', ids=ids, category_id=new_category_id)
+        db.session.commit()
+        if progress:
+            progress(moved, max(total, moved))
+
+
+def _move_account(connection, where, table, account_id):
+    """
+    Move the picked transactions to another account.
+
+    The duplicate-detection fingerprint includes the account, so it is
+    recomputed for the moved rows (read before the move, since the filters
+    may pick by account).
+    """
+    rows = connection.execute(
+        select(Transaction.id, Transaction.date, Transaction.amount, Transaction.description)
+        .where(where)
+    ).all()
+    if not rows:
+        return 0
+    count = connection.execute(update(table).where(where).values(account_id=account_id)).rowcount
+    connection.execute(
+        update(table).where(table.c.id == bindparam('target_id'))
+        .values(fingerprint=bindparam('new_fingerprint')),
+        [{'target_id': row.id,
+          'new_fingerprint': fingerprint(account_id, row.date, row.amount, row.description)}
+         for row in rows]
+    )
+    return count
+
+
+def _expire_loaded():
+    """Transactions were changed behind the ORM's back."""
+    for obj in list(db.session.identity_map.values()):
+        if isinstance(obj, Transaction):
+            db.session.expire(obj)
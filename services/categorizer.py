@@ -0,0 +1,370 @@
+"""
+Categorizer - Pick categories for new transactions from the user's rules.
+
+A CategoryRule (see models.py) says "transactions like this go into that
+category". Its conditions are all optional, and all the ones that are set
+must match:
+- description contains a text, or matches a regular expression
+- location contains a text
+- the transaction is in a certain account
+- the amount (sign ignored) is within a range
+
+Rules are tried by priority (lowest number first, then oldest first) and
+the first rule that matches wins.
+
+Imports run the rules on every row, so they are not checked one by one.
+All plain-text patterns of a user are compiled into ONE multi-pattern
+matcher (see _Literals; regex rules are combined into one expression of
+their own): a single pass over the text tells which rules' patterns occur
+in it. What's left per rule is a few cheap comparisons. The compiled rules are cached per user (see RuleCache) and
+dropped when the user's rules change.
+
+Regex rules run on every description, so a pattern that backtracks
+exponentially (like `(a+)+$`) could hang the app. Python's re has no
+timeout, so such patterns are refused instead: a repeated part may not
+itself contain a repetition or an alternative (see _backtracks). The
+expressions also only see the first _TEXT_LENGTH characters of a text.
+"""
+import re
+import threading
+try:
+    from re import _parser as sre_parse   # Python 3.11+
+except ImportError:
+    import sre_parse
+from collections import OrderedDict
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from models import Account, Category, CategoryRule
+
+# session.info key for users whose rules changed in this transaction
+_PENDING_USERS = 'categorizer_users'
+
+_PATTERN_LENGTH = CategoryRule.__table__.c.description_pattern.type.length
+
+# Things that would break the combined expression: named groups (their names
+# could clash) and back references (group numbers shift when combined)
+_UNSUPPORTED = re.compile(r'\(\?P|\\[1-9]|\\g<')
+
+# Regex rules are matched against at most this much of a text (the length
+# of a transaction description)
+_TEXT_LENGTH = 255
+
+
+class _Rule:
+    """The parts of a CategoryRule needed to match it (no database access)."""
+    __slots__ = ('category_id', 'key', 'has_description', 'has_location',
+                 'account_id', 'min_amount', 'max_amount')
+
+    def __init__(self, rule, key):
+        self.category_id = rule.category_id
+        self.key = key
+        self.has_description = bool(rule.description_pattern)
+        self.has_location = bool(rule.location_pattern)
+        self.account_id = rule.account_id
+        self.min_amount = rule.min_amount
+        self.max_amount = rule.max_amount
+
+
+def _trie_pattern(node):
+    """Regular expression for a trie of words (see _Literals)."""
+    branches = [re.escape(char) + _trie_pattern(child) for char, child in sorted(node.items()) if char]
+    if not branches:
+        return ''
+    body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+    return f'(?:{body})?' if '' in node else body
+
+
+class _Literals:
+    """
+    Finds which of many plain texts occur in a string, in one pass.
+
+    The texts are put in a trie (shared prefixes stored once) which is
+    written out as a regular expression, e.g. "star", "starbucks", "stop"
+    become st(?:ar(?:bucks)?|op). Scanning a string tries that expression
+    at every position, which costs about one character comparison per
+    position, however many texts there are (like Aho-Corasick, but run by
+    the C regex engine).
+
+    At each position the longest text is found; shorter texts are covered
+    by remembering, for every text, all the texts contained in it.
+    """
+
+    def __init__(self, literals):
+        keys = {}  # lower-case text -> rule keys
+        for key, text in literals:
+            keys.setdefault(text.lower(), set()).add(key)
+        self._keys = {
+            text: frozenset(key for other, other_keys in keys.items() if other in text for key in other_keys)
+            for text in keys
+        }
+        trie = {}
+        for text in keys:
+            node = trie
+            for char in text:
+                node = node.setdefault(char, {})
+            node[''] = True
+        self._expression = re.compile(f'(?=({_trie_pattern(trie)}))', re.IGNORECASE)
+
+    def found(self, text, keys):
+        """Add the keys of the texts that occur in `text` to the set `keys`."""
+        for match in self._expression.finditer(text):
+            keys.update(self._keys.get(match.group(1).lower(), ()))
+
+
+class _Expressions:
+    """
+    Finds which of several regular expressions match a string, in one call.
+
+    Every expression becomes an optional lookahead with a named group, all
+    anchored at the start of the string: each lookahead searches the whole
+    string without consuming it, so after one match() the groups that are
+    set tell which expressions matched. Each expression still scans the
+    string, so this is for the (few) regex rules; plain texts go to _Literals.
+    """
+
+    def __init__(self, patterns):
+        parts = ''.join(f'(?:(?=.*?(?P<{key}>{body})))?' for key, body in patterns)
+        self._expression = re.compile(parts, re.IGNORECASE | re.DOTALL)
+
+    def found(self, text, keys):
+        """Add the keys of the expressions that match `text` to the set `keys`."""
+        groups = self._expression.match(text[:_TEXT_LENGTH]).groupdict()
+        keys.update(key for key, value in groups.items() if value is not None)
+
+
+def _backtracks(items, repeated=False):
+    """
+    Can this parsed expression backtrack exponentially?
+
+    True if a repeated part (*, +, {2,}, ...) contains another repetition
+    or an alternative of several characters, e.g. `(a+)+` or `(a|ab)*`:
+    the ways to split a text between them grow exponentially with its
+    length. Alternatives of single characters become sets (`[ab]`) when
+    parsed, so `(a|b)+` is fine.
+    """
+    for op, value in items:
+        name = str(op)
+        if name in ('MAX_REPEAT', 'MIN_REPEAT', 'POSSESSIVE_REPEAT'):
+            _, most, part = value
+            if repeated and most > 1:
+                return True
+            if _backtracks(part, repeated or most > 1):
+                return True
+        elif name == 'BRANCH':
+            if repeated or any(_backtracks(branch, repeated) for branch in value[1]):
+                return True
+        elif name == 'SUBPATTERN':
+            if _backtracks(value[-1], repeated):
+                return True
+        elif name in ('ASSERT', 'ASSERT_NOT'):
+            if _backtracks(value[1], repeated):
+                return True
+        elif name == 'ATOMIC_GROUP':
+            if _backtracks(value, repeated):
+                return True
+        elif name == 'GROUPREF_EXISTS':
+            if any(part is not None and _backtracks(part, repeated) for part in value[1:]):
+                return True
+    return False
+
+
+def _is_safe(pattern):
+    """Is this regular expression fine to run on every description (see _backtracks)?"""
+    try:
+        return not _UNSUPPORTED.search(pattern) and not _backtracks(sre_parse.parse(pattern))
+    except (re.error, RecursionError):
+        return False
+
+
+def _matchers(literals, patterns):
+    """The matchers needed for these plain texts and regular expressions."""
+    matchers = []
+    if literals:
+        matchers.append(_Literals(literals))
+    if patterns:
+        matchers.append(_Expressions(patterns))
+    return matchers
+
+
+def _found(matchers, text):
+    """Keys of the rules whose pattern occurs in the text."""
+    keys = set()
+    if text:
+        for matcher in matchers:
+            matcher.found(text, keys)
+    return keys
+
+
+class CompiledRules:
+    """
+    A user's rules, ready to match.
+
+    Usage:
+        rules = CompiledRules(CategoryRule.query.filter_by(user_id=...).all())
+        category_id = rules.match(description, location, account_id, amount)
+    """
+
+    def __init__(self, rules):
+        rules = sorted(rules, key=lambda rule: (rule.priority, rule.id))
+        self.rules = []
+        descriptions, description_patterns, locations = [], [], []
+        for index, rule in enumerate(rules):
+            key = f'r{index}'
+            self.rules.append(_Rule(rule, key))
+            if rule.description_pattern and rule.is_regex:
+                # Unsafe patterns saved before they were refused never match
+                if _is_safe(rule.description_pattern):
+                    description_patterns.append((key, rule.description_pattern))
+            elif rule.description_pattern:
+                descriptions.append((key, rule.description_pattern))
+            if rule.location_pattern:
+                locations.append((key, rule.location_pattern))
+        self._descriptions = _matchers(descriptions, description_patterns)
+        self._locations = _matchers(locations, [])
+
+    def __len__(self):
+        return len(self.rules)
+
+    def match(self, description, location, account_id, amount):
+        """
+        Category id of the first rule the transaction matches, or None.
+        """
+        if not self.rules:
+            return None
+        in_description = _found(self._descriptions, description)
+        in_location = _found(self._locations, location)
+        size = abs(amount or 0)
+        for rule in self.rules:
+            if rule.has_description and rule.key not in in_description:
+                continue
+            if rule.has_location and rule.key not in in_location:
+                continue
+            if rule.account_id is not None and rule.account_id != account_id:
+                continue
+            if rule.min_amount is not None and size < rule.min_amount:
+                continue
+            if rule.max_amount is not None and size > rule.max_amount:
+                continue
+            return rule.category_id
+        return None
+
+
+def validate_pattern(pattern, is_regex=False):
+    """
+    Check a description pattern before saving a rule.
+
+    Returns:
+        An error message for the user, or None if the pattern is fine
+    """
+    if not pattern:
+        return None
+    if len(pattern) > _PATTERN_LENGTH:
+        return f'The pattern can be at most {_PATTERN_LENGTH} characters long.'
+    if not is_regex:
+        return None
+    if _UNSUPPORTED.search(pattern):
+        return 'Named groups and back references are not supported in rule patterns.'
+    try:
+        _Expressions([('r0', pattern)])
+    except re.error as error:
+        return f'Invalid regular expression: {error}.'
+    if not _is_safe(pattern):
+        return ('Repeated groups may not contain repetitions or alternatives, '
+                'e.g. use (ab)+ or [ab]+ but not (a+)+ or (a|ab)*.')
+    return None
+
+
+# ============================================
+# Per-user cache of compiled rules
+# ============================================
+
+class RuleCache:
+    """
+    Thread-safe cache of CompiledRules per user.
+
+    Compiling is cheap next to a page load but not next to a single row, so
+    every request and import of a user shares the compiled rules until the
+    rules change (see the session hooks below).
+    """
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # user_id -> CompiledRules
+        self._generations = {}         # user_id -> change counter
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """Start empty for every app (user ids differ between databases)."""
+        self.clear()
+
+    def get(self, user_id):
+        """The user's compiled rules, compiled now if not cached."""
+        with self._lock:
+            compiled = self._entries.get(user_id)
+            if compiled is not None:
+                self._entries.move_to_end(user_id)
+                return compiled
+            generation = self._generations.get(user_id, 0)
+
+        compiled = CompiledRules(CategoryRule.query.filter_by(user_id=user_id).all())
+
+        with self._lock:
+            # Rules changed while compiling: use the result but don't keep it
+            if self._generations.get(user_id, 0) == generation and self.max_entries > 0:
+                self._entries[user_id] = compiled
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return compiled
+
+    def invalidate(self, user_id):
+        """Forget a user's compiled rules."""
+        with self._lock:
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        """Forget everything."""
+        with self._lock:
+            self._entries.clear()
+            self._generations.clear()
+
+
+rule_cache = RuleCache()
+
+
+def rules_for(user_id):
+    """The user's rules, compiled (cached)."""
+    return rule_cache.get(user_id)
+
+
+# ============================================
+# Session hooks - invalidate after commit
+# ============================================
+
+@event.listens_for(Session, 'after_flush')
+def _collect_changes(session, flush_context):
+    """Remember whose rules changed until the transaction commits."""
+    users = session.info.setdefault(_PENDING_USERS, set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, CategoryRule):
+            users.add(obj.user_id)
+    # Deleting a category or account deletes its rules too
+    for obj in session.deleted:
+        if isinstance(obj, (Category, Account)):
+            users.add(obj.user_id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_after_commit(session):
+    for user_id in session.info.pop(_PENDING_USERS, set()):
+        rule_cache.invalidate(user_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _invalidate_after_rollback(session):
+    """
+    Rules may have been compiled from changes that were flushed but are now
+    rolled back: drop those too.
+    """
+    for user_id in session.info.pop(_PENDING_USERS, set()):
+        rule_cache.invalidate(user_id)
@@ -0,0 +1,176 @@
+"""
+Category Tree - Parent categories ("Food > Groceries") stored as a closure table.
+
+Next to its parent_id, every category has one CategoryPath row for itself
+(depth 0) and one for each category above it:
+
+    Food > Groceries > Organic
+
+    ancestor    descendant  depth
+    Food        Food        0
+    Food        Groceries   1
+    Food        Organic     2
+    Groceries   Groceries   0
+    Groceries   Organic     1
+    Organic     Organic     0
+
+So "everything under Food" is one join on ancestor_id = Food instead of a
+recursive walk, and totals per subtree are a join plus GROUP BY over the
+rollups (see rollups.month_aggregates).
+
+The paths are kept up to date by the mapper hooks at the bottom of this
+file whenever a category is created, moved under another parent or
+deleted. Deleting a category moves its children up to its own parent.
+"""
+from sqlalchemy import event, inspect, select, insert, update, delete, literal, or_, true
+from sqlalchemy.orm import object_session
+from sqlalchemy.orm.attributes import set_committed_value
+from models import db, Category, CategoryPath
+
+_COLUMNS = ['ancestor_id', 'descendant_id', 'depth']
+
+
+# ============================================
+# Reading the tree
+# ============================================
+
+def is_below(category_id, ancestor_id):
+    """Is category_id ancestor_id itself or somewhere under it?"""
+    return db.session.execute(
+        select(CategoryPath.depth)
+        .where(CategoryPath.ancestor_id == ancestor_id)
+        .where(CategoryPath.descendant_id == category_id)
+    ).first() is not None
+
+
+def ancestors(category_id):
+    """The categories from the top of the tree down to category_id (inclusive)."""
+    return Category.query.join(CategoryPath, CategoryPath.ancestor_id == Category.id) \
+        .filter(CategoryPath.descendant_id == category_id) \
+        .order_by(CategoryPath.depth.desc()) \
+        .all()
+
+
+def tree_order(categories):
+    """
+    Already loaded categories sorted as a tree: each parent followed by its children.
+
+    Returns:
+        List of (category, depth); categories whose parent isn't in the list
+        are treated as top-level
+    """
+    ids = {category.id for category in categories}
+    children = {}
+    for category in categories:
+        parent_id = category.parent_id if category.parent_id in ids else None
+        children.setdefault(parent_id, []).append(category)
+
+    ordered = []
+    stack = [(category, 0) for category in reversed(children.get(None, []))]
+    while stack:
+        category, depth = stack.pop()
+        ordered.append((category, depth))
+        stack.extend((child, depth + 1) for child in reversed(children.get(category.id, [])))
+    return ordered
+
+
+# ============================================
+# Changing the paths (set-based, one statement per step)
+# ============================================
+
+def add_paths(connection, category_id, parent_id):
+    """Paths of a new category: itself, plus every ancestor of its parent one level deeper."""
+    paths = CategoryPath.__table__
+    connection.execute(insert(paths).values(ancestor_id=category_id, descendant_id=category_id, depth=0))
+    if parent_id is not None:
+        connection.execute(insert(paths).from_select(_COLUMNS, select(
+            paths.c.ancestor_id, literal(category_id), paths.c.depth + 1
+        ).where(paths.c.descendant_id == parent_id)))
+
+
+def move_subtree(connection, category_id, new_parent_id):
+    """
+    Move a category (and everything under it) under a new parent (None = top level).
+
+    Paths from the old ancestors into the subtree are deleted, then every
+    new ancestor is connected to every category of the subtree.
+    """
+    paths = CategoryPath.__table__
+    subtree = select(paths.c.descendant_id).where(paths.c.ancestor_id == category_id)
+    old_ancestors = select(paths.c.ancestor_id) \
+        .where(paths.c.descendant_id == category_id) \
+        .where(paths.c.ancestor_id != category_id)
+    connection.execute(delete(paths)
+                       .where(paths.c.descendant_id.in_(subtree))
+                       .where(paths.c.ancestor_id.in_(old_ancestors)))
+
+    if new_parent_id is not None:
+        above = paths.alias('above')
+        below = paths.alias('below')
+        # Every ancestor of the new parent x every category of the subtree
+        connection.execute(insert(paths).from_select(_COLUMNS, select(
+            above.c.ancestor_id, below.c.descendant_id, above.c.depth + below.c.depth + 1
+        ).select_from(above.join(below, true()))
+         .where(above.c.descendant_id == new_parent_id).where(below.c.ancestor_id == category_id)))
+
+
+def remove_category(connection, category_id, parent_id):
+    """
+    Take a category out of the tree; its children move up to its parent.
+
+    Everything below it gets one level closer to everything above it, and
+    the category's own paths are deleted.
+    """
+    paths = CategoryPath.__table__
+    below = select(paths.c.descendant_id) \
+        .where(paths.c.ancestor_id == category_id) \
+        .where(paths.c.descendant_id != category_id)
+    above = select(paths.c.ancestor_id) \
+        .where(paths.c.descendant_id == category_id) \
+        .where(paths.c.ancestor_id != category_id)
+    connection.execute(update(paths)
+                       .where(paths.c.ancestor_id.in_(above))
+                       .where(paths.c.descendant_id.in_(below))
+                       .values(depth=paths.c.depth - 1))
+    connection.execute(delete(paths).where(or_(paths.c.ancestor_id == category_id,
+                                               paths.c.descendant_id == category_id)))
+
+    categories = Category.__table__
+    connection.execute(update(categories)
+                       .where(categories.c.parent_id == category_id)
+                       .values(parent_id=parent_id))
+
+
+def backfill_paths(engine):
+    """Migration step: add the depth-0 path of every category that has none (all top-level)."""
+    paths = CategoryPath.__table__
+    categories = Category.__table__
+    with engine.begin() as connection:
+        connection.execute(insert(paths).from_select(_COLUMNS, select(
+            categories.c.id, categories.c.id, literal(0)
+        ).where(categories.c.id.not_in(select(paths.c.descendant_id).where(paths.c.depth == 0)))))
+
+
+# ============================================
+# Mapper hooks - keep the paths in sync with ORM writes
+# ============================================
+
+@event.listens_for(Category, 'after_insert')
+def _add_category(mapper, connection, target):
+    add_paths(connection, target.id, target.parent_id)
+
+
+@event.listens_for(Category, 'after_update')
+def _move_category(mapper, connection, target):
+    if inspect(target).attrs.parent_id.history.has_changes():
+        move_subtree(connection, target.id, target.parent_id)
+
+
+@event.listens_for(Category, 'before_delete')
+def _remove_category(mapper, connection, target):
+    remove_category(connection, target.id, target.parent_id)
+    # Children already loaded in the session now have the deleted category's parent
+    session = object_session(target)
+    for obj in list(session.identity_map.values()):
+        if isinstance(obj, Category) and obj.parent_id == target.id:
+            set_committed_value(obj, 'parent_id', target.parent_id)
@@ -0,0 +1,265 @@
+"""
+Dashboard Cache - Remembers computed dashboard months per user.
+
+Clicking back and forth through months with the prev/next links would
+otherwise recompute the same numbers on every click. The cache keeps the
+month-specific part of the dashboard (balances, totals, chart data) keyed by
+(user_id, year, month):
+
+- LRU eviction, bounded by both entry count and approximate memory size
+- Invalidated after commit, only for the months a write actually affected:
+    * a transaction change in month M drops M and every later month of that
+      user (balances carry forward); a pure category move drops only M
+    * account changes drop all of that user's months
+    * category changes (name/icon/color) drop the months where it or one
+      of its subcategories is used (a parent labels its subtree's slice)
+    * category tree changes (moved to another parent, deleted) drop all of
+      that user's months, since the top-level pie slices add up subtrees
+- entries expire after max_age seconds (DASHBOARD_CACHE_TTL)
+- hit/miss/eviction counters via stats() for sizing
+
+Note: the cache lives in the worker process. Writes are seen by the cache of
+the process that made them. Writes from other processes (cron jobs such as
+post-recurring, process-budget-events, verify-ledger --repair or
+rebuild-rollups, or other workers) show up once the entry expires, so keep
+the TTL short, or set DASHBOARD_CACHE_MAX_ENTRIES = 0 to disable the cache.
+"""
+import sys
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+from models import Account, Category, CategoryPath, MonthlyRollup
+from services import rollups
+
+# session.info key for users whose whole cache must go after commit
+_PENDING_USERS = 'dashboard_cache_users'
+
+# Account and category fields shown on the dashboard. Balance changes are not
+# listed: they always come with a transaction change, which is tracked by
+# the rollups (see rollups.CHANGED_MONTHS).
+_ACCOUNT_FIELDS = ('name', 'account_type', 'currency', 'starting_date', 'user_id')
+_CATEGORY_FIELDS = ('name', 'icon', 'color')
+
+
+def _has_changes(obj, fields):
+    """Did any of these fields change on a modified object?"""
+    state = inspect(obj)
+    return any(state.attrs[name].history.has_changes() for name in fields)
+
+
+def _estimate_size(value):
+    """Rough memory size of a payload made of dicts, lists, strings and numbers."""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(_estimate_size(k) + _estimate_size(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set)):
+        size += sum(_estimate_size(item) for item in value)
+    return size
+
+
+class DashboardCache:
+    """
+    Thread-safe LRU cache of dashboard payloads.
+
+    Usage:
+        generation = dashboard_cache.generation(user_id)
+        payload = dashboard_cache.get(user_id, year, month)
+        if payload is None:
+            payload = compute()
+            dashboard_cache.put(user_id, year, month, payload, generation)
+    """
+
+    def __init__(self, max_entries=1024, max_bytes=16 * 1024 * 1024, max_age=60):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_age = max_age          # seconds; 0 = entries never expire
+        self._entries = OrderedDict()   # (user_id, year, month) -> (payload, size, stored at)
+        self._months = {}               # user_id -> set of (year, month) in the cache
+        self._generations = {}          # user_id -> write counter
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def init_app(self, app):
+        """Read size limits from the app config."""
+        self.max_entries = app.config.get('DASHBOARD_CACHE_MAX_ENTRIES', self.max_entries)
+        self.max_bytes = app.config.get('DASHBOARD_CACHE_MAX_BYTES', self.max_bytes)
+        self.max_age = app.config.get('DASHBOARD_CACHE_TTL', self.max_age)
+        self.clear()
+
+    def get(self, user_id, year, month):
+        """Return the cached payload or None."""
+        key = (user_id, year, month)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.max_age > 0 and time.monotonic() - entry[2] > self.max_age:
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def generation(self, user_id):
+        """Counter that changes whenever this user's data changes."""
+        with self._lock:
+            return self._generations.get(user_id, 0)
+
+    def put(self, user_id, year, month, payload, generation):
+        """
+        Store a payload.
+
+        `generation` must be read *before* computing the payload: if the
+        user's data changed in the meantime the (possibly stale) payload
+        is not stored.
+        """
+        if self.max_entries <= 0:
+            return
+        size = _estimate_size(payload)
+        if size > self.max_bytes:
+            return
+        key = (user_id, year, month)
+        with self._lock:
+            if self._generations.get(user_id, 0) != generation:
+                return
+            self._remove(key)
+            self._entries[key] = (payload, size, time.monotonic())
+            self._months.setdefault(user_id, set()).add((year, month))
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def invalidate(self, user_id, months=None, from_month=None):
+        """
+        Drop cached months of one user.
+
+        Args:
+            user_id: Whose cache entries to drop
+            months: Iterable of (year, month) to drop
+            from_month: (year, month) - also drop this month and every later one
+            (with neither given, all of the user's months are dropped)
+        """
+        with self._lock:
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+            cached = self._months.get(user_id, set())
+            if months is None and from_month is None:
+                doomed = set(cached)
+            else:
+                doomed = cached & set(months or ())
+                if from_month is not None:
+                    doomed |= {m for m in cached if m >= tuple(from_month)}
+            for year, month in doomed:
+                self._remove((user_id, year, month))
+
+    def clear(self):
+        """Drop everything and reset the counters."""
+        with self._lock:
+            self._entries.clear()
+            self._months.clear()
+            self._generations.clear()
+            self._bytes = 0
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        """Counters for sizing the cache."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+            }
+
+    def _remove(self, key):
+        """Remove one entry (caller holds the lock)."""
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._bytes -= entry[1]
+        user_id, year, month = key
+        months = self._months.get(user_id)
+        if months is not None:
+            months.discard((year, month))
+            if not months:
+                del self._months[user_id]
+
+
+dashboard_cache = DashboardCache()
+
+
+# ============================================
+# Session hooks - invalidate after commit
+# ============================================
+
+@event.listens_for(Session, 'after_flush')
+def _collect_changes(session, flush_context):
+    """Remember account and category changes until the transaction commits."""
+    users = session.info.setdefault(_PENDING_USERS, set())
+    for obj in list(session.new) + list(session.deleted):
+        if isinstance(obj, Account):
+            users.add(obj.user_id)
+    for obj in session.deleted:
+        if isinstance(obj, Category):
+            users.add(obj.user_id)
+
+    changed_categories = []
+    for obj in session.dirty:
+        if isinstance(obj, Account) and _has_changes(obj, _ACCOUNT_FIELDS):
+            users.add(obj.user_id)
+        elif isinstance(obj, Category) and _has_changes(obj, ('parent_id',)):
+            users.add(obj.user_id)
+        elif isinstance(obj, Category) and _has_changes(obj, _CATEGORY_FIELDS):
+            changed_categories.append(obj.id)
+
+    # Category look changed: only the months where it or a subcategory has
+    # rollups show it (the closure table includes each category itself)
+    if changed_categories:
+        subtree = select(CategoryPath.descendant_id).where(CategoryPath.ancestor_id.in_(changed_categories))
+        rows = session.connection().execute(
+            select(MonthlyRollup.user_id, MonthlyRollup.year, MonthlyRollup.month)
+            .where(MonthlyRollup.category_id.in_(subtree))
+            .distinct()
+        ).all()
+        changed_months = session.info.setdefault(rollups.CHANGED_MONTHS, {})
+        for user_id, year, month in rows:
+            changed_months.setdefault(user_id, {}).setdefault((year, month), False)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_after_commit(session):
+    """Apply all invalidations collected during the transaction."""
+    changed_months = session.info.pop(rollups.CHANGED_MONTHS, {})
+    users = session.info.pop(_PENDING_USERS, set())
+
+    for user_id in users:
+        dashboard_cache.invalidate(user_id)
+
+    for user_id, months in changed_months.items():
+        if user_id in users:
+            continue
+        balance_months = [m for m, moved_balance in months.items() if moved_balance]
+        dashboard_cache.invalidate(
+            user_id,
+            months=months.keys(),
+            from_month=min(balance_months) if balance_months else None
+        )
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changes(session):
+    """Nothing was written - forget the pending invalidations."""
+    session.info.pop(rollups.CHANGED_MONTHS, None)
+    session.info.pop(_PENDING_USERS, None)
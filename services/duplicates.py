@@ -0,0 +1,131 @@
+"""
+Duplicates - Recognize transactions that are already in the database.
+
+Importing a statement that overlaps an earlier one would otherwise add the
+same transactions twice. Every transaction gets a fingerprint: a hash of
+its account, date, amount and (normalized) description, stored in the
+indexed transactions.fingerprint column.
+
+- ORM writes fill it in through the mapper hooks at the bottom of this file.
+- Bulk inserts (the importer) compute it with fingerprint() themselves.
+- Migration 3 (schema_migrations.py) backfills existing rows, and
+  migration 9 recomputes them once amounts are whole cents (migration 3
+  ran before migration 5 on older databases, so it read the old float
+  amounts as cents).
+
+On import, each batch is checked with one query (fingerprint IN (...)),
+not one per row and never by comparing every pair of rows.
+"""
+import hashlib
+import re
+from sqlalchemy import event, select, func, update, bindparam
+from models import db, Transaction
+
+_SPACES = re.compile(r'\s+')
+
+# Rows per round trip when backfilling fingerprints
+_BACKFILL_BATCH = 1000
+
+
+def fingerprint(account_id, on_date, amount, description):
+    """
+    Fingerprint of a transaction.
+
+    The description is compared case- and whitespace-insensitively, and the
+    amount to the cent, so small formatting differences between two exports
+    of the same statement don't matter.
+    """
+    text = _SPACES.sub(' ', (description or '').strip().lower())
+    key = f'{account_id}|{on_date.isoformat()}|{round(amount, 2) + 0.0:.2f}|{text}'
+    return hashlib.blake2b(key.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def last_transaction_id():
+    """Highest transaction id right now (0 if there are none)."""
+    return db.session.execute(select(func.max(Transaction.id))).scalar() or 0
+
+
+def drop_duplicates(rows, before_id):
+    """
+    Remove rows that already exist in the database, with one query.
+
+    A file can legitimately contain the same transaction twice (two coffees
+    on the same day), so fingerprints are counted: if the database has one
+    matching transaction, one of the two rows is a duplicate, the other
+    one is new.
+
+    Args:
+        rows: Parsed rows with 'fingerprint' set
+        before_id: Only transactions with an id up to this one count as
+                   existing (so an import doesn't match its own earlier batches)
+
+    Returns:
+        (new rows, number of duplicates dropped)
+    """
+    fingerprints = {row['fingerprint'] for row in rows}
+    existing = dict(db.session.execute(
+        select(Transaction.fingerprint, func.count())
+        .where(Transaction.fingerprint.in_(fingerprints))
+        .where(Transaction.id <= before_id)
+        .group_by(Transaction.fingerprint)
+    ).all())
+    if not existing:
+        return rows, 0
+
+    new_rows = []
+    for row in rows:
+        if existing.get(row['fingerprint'], 0) > 0:
+            existing[row['fingerprint']] -= 1
+        else:
+            new_rows.append(row)
+    return new_rows, len(rows) - len(new_rows)
+
+
+def backfill_fingerprints(engine):
+    """Migration step: compute fingerprints for transactions that have none."""
+    _fill_fingerprints(engine, only_missing=True)
+
+
+def refresh_fingerprints(engine):
+    """Migration step: recompute every fingerprint, writing only the ones that changed."""
+    _fill_fingerprints(engine, only_missing=False)
+
+
+def _fill_fingerprints(engine, only_missing):
+    """Compute fingerprints a batch of transactions at a time (one commit per batch)."""
+    table = Transaction.__table__
+    set_fingerprint = update(table) \
+        .where(table.c.id == bindparam('target_id')) \
+        .values(fingerprint=bindparam('value'))
+    last_id = 0
+    while True:
+        with engine.begin() as connection:
+            query = select(table.c.id, table.c.account_id, table.c.date, table.c.amount,
+                           table.c.description, table.c.fingerprint) \
+                .where(table.c.id > last_id) \
+                .order_by(table.c.id) \
+                .limit(_BACKFILL_BATCH)
+            if only_missing:
+                query = query.where(table.c.fingerprint.is_(None))
+            rows = connection.execute(query).all()
+            if not rows:
+                return
+            changed = []
+            for row in rows:
+                value = fingerprint(row.account_id, row.date, row.amount, row.description)
+                if value != row.fingerprint:
+                    changed.append({'target_id': row.id, 'value': value})
+            if changed:
+                connection.execute(set_fingerprint, changed)
+            last_id = rows[-1].id
+
+
+# ============================================
+# Mapper hooks - fingerprint every ORM write
+# ============================================
+
+@event.listens_for(Transaction, 'before_insert')
+@event.listens_for(Transaction, 'before_update')
+def _set_fingerprint(mapper, connection, target):
+    """Keep the fingerprint in step with the transaction's fields."""
+    target.fingerprint = fingerprint(target.account_id, target.date, target.amount, target.description)
@@ -0,0 +1,78 @@
+"""
+Exporter - Stream a user's transactions out as CSV or JSON Lines.
+
+Exports can be millions of rows, so nothing here builds the whole file:
+- rows come from a server-side cursor (yield_per) over the joined
+  projection in transaction_list.py, a batch at a time
+- each row is turned into one line of text and the lines are grouped
+  into chunks of about TRANSACTIONS_STREAM_CHUNK_BYTES
+- with gzip the chunks are compressed on the fly
+
+Memory per export is about one batch of rows plus one chunk, whatever the
+size of the account.
+"""
+import csv
+import json
+import zlib
+from utils import chunked
+from services.transaction_list import row_to_dict
+
+# Columns of the export, in order (same names as the JSON API)
+EXPORT_FIELDS = ['id', 'date', 'amount', 'description', 'location',
+                 'account', 'currency', 'category']
+
+FORMATS = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+}
+
+
+class _Echo:
+    """File-like object for csv.writer that hands back the line instead of storing it."""
+
+    def write(self, line):
+        return line
+
+
+def csv_lines(rows):
+    """Yield the header and one CSV line per row."""
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    for row in rows:
+        values = row_to_dict(row)
+        yield writer.writerow([values[field] for field in EXPORT_FIELDS])
+
+
+def jsonl_lines(rows):
+    """Yield one JSON object per line and row."""
+    for row in rows:
+        values = row_to_dict(row)
+        yield json.dumps({field: values[field] for field in EXPORT_FIELDS}, ensure_ascii=False) + '\n'
+
+
+def gzip_chunks(chunks):
+    """Compress a stream of byte chunks into a gzip stream, on the fly."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # 31 = gzip header and trailer
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def export_chunks(rows, file_format, chunk_size=16 * 1024, compress=False):
+    """
+    The export file as a stream of byte chunks.
+
+    Args:
+        rows: Transaction rows (a yield_per query, see transaction_rows())
+        file_format: 'csv' or 'jsonl'
+        chunk_size: Approximate size of each chunk before compression
+        compress: gzip the output
+
+    Returns:
+        Generator of bytes
+    """
+    lines = csv_lines(rows) if file_format == 'csv' else jsonl_lines(rows)
+    chunks = (text.encode('utf-8') for text in chunked(lines, chunk_size))
+    return gzip_chunks(chunks) if compress else chunks
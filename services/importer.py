@@ -0,0 +1,378 @@
+"""
+Importer - Bring bank statements (CSV, OFX, QIF) in as transactions.
+
+Adding transactions one form POST at a time costs two ownership lookups and
+a commit per row. Years of history are imported here in batches instead:
+
+1. The file is read as a stream, one row at a time (never fully in memory).
+2. Rows are parsed and validated; bad rows are skipped and reported with
+   their line number.
+3. Every `batch_size` valid rows are checked for duplicates with one
+   query (see services/duplicates.py), then written with one executemany
+   INSERT, one rollup upsert (see rollups.RollupDeltas) and one balance
+   UPDATE - not one of each per row.
+
+The caller commits (the whole import is one database transaction, so a
+crash halfway leaves nothing behind).
+
+CSV files can have any column layout; ColumnMapping says which column holds
+what. OFX and QIF files are read by services/statement_parsers.py and may
+hold several accounts (see AccountMatcher).
+"""
+import csv
+import io
+from datetime import date, datetime
+from functools import lru_cache
+from itertools import islice
+from sqlalchemy import select
+from models import db, Account, Category, Transaction
+from money import round_money
+from services.rollups import RollupDeltas
+from services.balances import add_to_balances
+from services.duplicates import fingerprint, drop_duplicates, last_transaction_id
+from services.categorizer import rules_for
+from services.statement_parsers import (parse_amount, transaction_values, parse_ofx, parse_qif,
+                                        detect_format)
+
+# Only the first few bad rows are reported (the count covers all of them)
+MAX_REPORTED_ERRORS = 20
+
+
+class ImportResult:
+    """What an import did: rows imported, rows skipped and why."""
+
+    def __init__(self):
+        self.imported = 0
+        self.skipped = 0
+        self.duplicates = 0  # rows already in the database (see services/duplicates.py)
+        self.per_account = {}  # account id -> rows imported
+        self.errors = []  # (line number, message), at most MAX_REPORTED_ERRORS
+
+    def add_error(self, line, message):
+        """Record a row that could not be imported."""
+        self.skipped += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, message))
+
+
+class ColumnMapping:
+    """
+    Which CSV column holds which transaction field.
+
+    Column names are matched against the header row, ignoring case and
+    surrounding spaces. Optional columns (description, location, category)
+    may be missing from the file. Banks differ in how they show amounts:
+    - one signed column (amount), or separate debit/credit columns
+    - expenses as positive numbers (set negate=True)
+    - a decimal comma, e.g. "1.234,56" (set decimal=',')
+    """
+
+    def __init__(self, date='date', amount='amount', description='description',
+                 location='location', category='category', debit=None, credit=None,
+                 date_format='%Y-%m-%d', decimal='.', negate=False):
+        self.date = _column_key(date)
+        self.amount = _column_key(amount)
+        self.description = _column_key(description)
+        self.location = _column_key(location)
+        self.category = _column_key(category)
+        self.debit = _column_key(debit)
+        self.credit = _column_key(credit)
+        self.date_format = date_format or '%Y-%m-%d'
+        self.decimal = decimal if decimal in ('.', ',') else '.'
+        self.negate = bool(negate)
+
+    @classmethod
+    def from_form(cls, form):
+        """Build a mapping from the import form (empty fields use the defaults)."""
+        def field(name, default=None):
+            return (form.get(name) or '').strip() or default
+
+        return cls(
+            date=field('date_column', 'date'),
+            amount=field('amount_column', 'amount'),
+            description=field('description_column', 'description'),
+            location=field('location_column', 'location'),
+            category=field('category_column', 'category'),
+            debit=field('debit_column'),
+            credit=field('credit_column'),
+            date_format=field('date_format', '%Y-%m-%d'),
+            decimal=field('decimal', '.'),
+            negate=form.get('negate') in ('1', 'on', 'true'),
+        )
+
+    def missing_columns(self, header):
+        """Required columns that are not in the header row."""
+        header = {_column_key(name) for name in header}
+        required = [self.date]
+        required += [c for c in (self.debit, self.credit) if c] if (self.debit or self.credit) \
+            else [self.amount]
+        return [name for name in required if name not in header]
+
+    def parse(self, record, categories):
+        """
+        Turn one CSV record into transaction values.
+
+        Args:
+            record: Dict of column key -> text
+            categories: Dict of lower-case category name -> id (for the category column)
+
+        Raises:
+            ValueError: with a message for the user if the row is invalid
+        """
+        date_text = record.get(self.date) or ''
+        try:
+            on_date = parse_date(date_text.strip(), self.date_format)
+        except ValueError:
+            raise ValueError(f'invalid date "{date_text}" (expected format {self.date_format})')
+
+        if self.debit or self.credit:
+            credit = parse_amount(record.get(self.credit), self.decimal) if self.credit else 0
+            debit = parse_amount(record.get(self.debit), self.decimal) if self.debit else 0
+            amount = abs(credit or 0) - abs(debit or 0)
+        else:
+            amount = parse_amount(record.get(self.amount), self.decimal)
+            if amount is None:
+                raise ValueError(f'invalid amount "{record.get(self.amount) or ""}"')
+        if self.negate:
+            amount = -amount
+
+        category_id = None
+        if self.category:
+            category_id = categories.get((record.get(self.category) or '').strip().lower())
+
+        return transaction_values(
+            on_date, amount,
+            description=record.get(self.description),
+            location=record.get(self.location) if self.location else None,
+            category_id=category_id,
+        )
+
+
+def _column_key(name):
+    """Normalize a column name for matching ("  Date " == "date")."""
+    return name.strip().lower() if name else None
+
+
+@lru_cache(maxsize=4096)
+def parse_date(text, date_format='%Y-%m-%d'):
+    """
+    Parse a date with the given format.
+
+    Statements have many rows per day, so results are cached, and ISO dates
+    skip strptime (which is slow) altogether.
+    """
+    if date_format == '%Y-%m-%d' and len(text) == 10 and text[4] == text[7] == '-':
+        return date.fromisoformat(text)
+    return datetime.strptime(text, date_format).date()
+
+
+def category_lookup(user_id):
+    """The user's categories as {lower-case name: id}."""
+    rows = db.session.query(Category.name, Category.id).filter(Category.user_id == user_id).all()
+    return {name.strip().lower(): category_id for name, category_id in rows}
+
+
+def import_file(account, stream, filename, form, batch_size=1000):
+    """
+    Import an uploaded statement, whatever its format (CSV, OFX or QIF).
+
+    Args:
+        account: Account picked on the import form (ownership already checked)
+        stream: The uploaded file (binary file object)
+        filename: Name of the uploaded file (its extension tells the format)
+        form: The import form (CSV column mapping, QIF date order)
+        batch_size: Rows per INSERT/UPDATE batch
+
+    Returns:
+        ImportResult
+    """
+    head = b''
+    if stream.seekable():
+        head = stream.read(512)
+        stream.seek(0)
+    file_format = detect_format(filename, head.decode('utf-8', errors='replace').lstrip('\ufeff'))
+
+    if file_format == 'csv':
+        return import_csv(account, stream, ColumnMapping.from_form(form), batch_size)
+
+    text = _text_stream(stream)
+    if file_format == 'ofx':
+        entries = parse_ofx(text)
+    else:
+        entries = parse_qif(text, day_first=form.get('day_first') in ('1', 'on', 'true'))
+    return import_statement(account, entries, batch_size)
+
+
+def _text_stream(stream):
+    """Read an uploaded (binary) file as text."""
+    if isinstance(stream, io.TextIOBase):
+        return stream
+    # utf-8-sig drops the byte order mark Excel puts in front of CSV files
+    return io.TextIOWrapper(stream, encoding='utf-8-sig', errors='replace', newline='')
+
+
+def import_csv(account, stream, mapping, batch_size=1000):
+    """
+    Import a CSV bank statement into an account.
+
+    Args:
+        account: Account to import into (ownership already checked)
+        stream: The uploaded file (binary or text file object)
+        mapping: ColumnMapping for this file
+        batch_size: Rows per INSERT/UPDATE batch
+
+    Returns:
+        ImportResult
+    """
+    result = ImportResult()
+    reader = csv.reader(_text_stream(stream))
+
+    header = next(reader, None)
+    if not header:
+        result.add_error(1, 'the file is empty')
+        return result
+    missing = mapping.missing_columns(header)
+    if missing:
+        result.add_error(1, f'missing column(s): {", ".join(missing)}')
+        return result
+
+    keys = [_column_key(name) for name in header]
+    categories = category_lookup(account.user_id)
+
+    def parsed_rows():
+        for values in reader:
+            if not any(value.strip() for value in values):
+                continue  # blank line
+            try:
+                row = mapping.parse(dict(zip(keys, values)), categories)
+            except ValueError as error:
+                result.add_error(reader.line_num, str(error))
+                continue
+            row['account_id'] = account.id
+            yield row
+
+    insert_transactions(account.user_id, parsed_rows(), result, batch_size)
+    return result
+
+
+class AccountMatcher:
+    """
+    Decides which of the user's accounts a statement account goes into.
+
+    OFX and QIF files can hold several accounts. Each one goes into the
+    user's account with the same name (QIF names its accounts) or whose
+    name contains the account number or its last 4 digits (OFX uses
+    numbers, e.g. an account named "Checking 1234"). Accounts that match
+    none go into the account picked on the import form.
+    """
+
+    def __init__(self, accounts, default):
+        self.accounts = accounts
+        self.default = default
+        self._matches = {}
+
+    def match(self, label):
+        """The Account for a statement account label (None = not named in the file)."""
+        if label not in self._matches:
+            self._matches[label] = self._find(label) or self.default
+        return self._matches[label]
+
+    def _find(self, label):
+        if not label:
+            return None
+        label = label.strip().lower()
+        for account in self.accounts:
+            if account.name.strip().lower() == label:
+                return account
+        digits = ''.join(c for c in label if c.isdigit())
+        for number in (digits, digits[-4:]):
+            if len(number) >= 4:
+                for account in self.accounts:
+                    if number in account.name:
+                        return account
+        return None
+
+
+def import_statement(account, entries, batch_size=1000):
+    """
+    Import parsed OFX/QIF entries (see services/statement_parsers.py).
+
+    Args:
+        account: Account picked on the import form (used for statement
+                 accounts that match none of the user's accounts)
+        entries: (account_label, position, values) items from a parser
+        batch_size: Rows per INSERT/UPDATE batch
+
+    Returns:
+        ImportResult
+    """
+    result = ImportResult()
+    matcher = AccountMatcher(Account.query.filter_by(user_id=account.user_id).all(), account)
+    categories = category_lookup(account.user_id)
+
+    def parsed_rows():
+        for label, position, values in entries:
+            if isinstance(values, ValueError):
+                result.add_error(position, str(values))
+                continue
+            # QIF categories: "Food:Groceries" falls back to "Food"
+            name = (values.pop('category_name') or '').lower()
+            if name:
+                values['category_id'] = categories.get(name) or categories.get(name.split(':')[0].strip())
+            values['account_id'] = matcher.match(label).id
+            yield values
+
+    insert_transactions(account.user_id, parsed_rows(), result, batch_size)
+    return result
+
+
+def insert_transactions(user_id, rows, result, batch_size=1000):
+    """
+    Write parsed rows (see transaction_values(), plus account_id) in batches.
+
+    Per batch: one duplicate check, one executemany INSERT, one rollup upsert
+    and one executemany balance UPDATE (one row per account) - never one
+    statement per row. Rows already in the database are skipped and counted
+    in result.duplicates. Rows without a category get one from the user's
+    categorization rules (see services/categorizer.py), if one matches.
+    Amounts are rounded to their account's currency (whole yen for JPY),
+    like the forms do. The ORM flush hooks don't see these Core statements, so the rollups are
+    updated here (which also tells the dashboard cache which months changed).
+    """
+    table = Transaction.__table__
+    connection = db.session.connection()
+    existing_up_to = last_transaction_id()
+    rules = rules_for(user_id)
+    currencies = dict(db.session.execute(
+        select(Account.id, Account.currency).where(Account.user_id == user_id)
+    ).all())
+    rows = iter(rows)
+
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            break
+        for row in batch:
+            row['amount'] = round_money(row['amount'], currencies.get(row['account_id']))
+            row['fingerprint'] = fingerprint(row['account_id'], row['date'], row['amount'],
+                                             row['description'])
+            if row['category_id'] is None:
+                row['category_id'] = rules.match(row['description'], row['location'],
+                                                 row['account_id'], row['amount'])
+        batch, duplicates = drop_duplicates(batch, existing_up_to)
+        result.duplicates += duplicates
+        if not batch:
+            continue
+        connection.execute(table.insert(), batch)
+
+        deltas = RollupDeltas()
+        net = {}
+        for row in batch:
+            deltas.add(user_id, row['account_id'], row['category_id'], row['date'], row['amount'])
+            net[row['account_id']] = net.get(row['account_id'], 0) + row['amount']
+            result.per_account[row['account_id']] = result.per_account.get(row['account_id'], 0) + 1
+        deltas.apply(db.session)
+
+        add_to_balances(net)
+        result.imported += len(batch)
+    return result
@@ -0,0 +1,213 @@
+"""
+Ledger - Check that the stored account balances add up.
+
+Account.balance is stored so pages don't have to add up all transactions.
+Every write changes it together with the transactions (see balances.py),
+but a bug or a lost update would leave it wrong without anyone noticing.
+This job recomputes
+
+    expected balance = starting_balance + sum of the account's transactions
+
+and reports accounts whose stored balance is different ("drift"), and
+can repair them.
+
+- Accounts are checked in batches of ids, with one grouped query per batch.
+- Amounts are compared as whole cents, so there is no rounding noise.
+- Incremental runs only check accounts whose balance changed
+  (Account.balance_changed_at) since the last finished run. Writes that
+  were still running when that run started are covered by starting a bit
+  earlier (WATERMARK_OVERLAP). A full run checks every account.
+- With workers > 1 the batches are spread over a pool of processes, each
+  with its own database connection.
+
+Run it with `flask --app app verify-ledger` (e.g. nightly from cron).
+"""
+import logging
+import multiprocessing
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+from itertools import repeat
+from sqlalchemy import select, update, func, bindparam, type_coerce, create_engine, BigInteger
+from models import db, Account, Transaction, LedgerCheck
+from money import from_minor
+
+logger = logging.getLogger(__name__)
+
+# Incremental runs also re-check accounts changed this long before the last run
+WATERMARK_OVERLAP = timedelta(minutes=5)
+
+# One wrong balance: amounts as stored / as recomputed from the transactions
+Drift = namedtuple('Drift', 'account_id user_id stored expected')
+
+
+class VerifyResult:
+    """What a verification run found."""
+
+    def __init__(self):
+        self.checked = 0    # accounts checked
+        self.drifts = []    # Drift for each wrong balance
+        self.repaired = 0   # wrong balances that were fixed
+
+
+# ============================================
+# Checking one batch of accounts
+# ============================================
+
+def _cents(column):
+    """A Money column as its raw whole cents (no conversion to an amount)."""
+    return type_coerce(column, BigInteger)
+
+
+def check_batch(connection, account_ids, repair=False):
+    """
+    Compare stored and recomputed balances of some accounts.
+
+    One grouped query: accounts LEFT JOIN transactions GROUP BY account.
+    A repair sets the balance only if it is still the one that was checked;
+    a balance changed in the meantime is left for the next run.
+
+    Args:
+        connection: Database connection (the caller commits)
+        account_ids: Accounts to check
+        repair: Fix wrong balances
+
+    Returns:
+        (accounts checked, list of Drift, balances repaired)
+    """
+    rows = connection.execute(
+        select(
+            Account.id,
+            Account.user_id,
+            _cents(Account.balance),
+            func.coalesce(_cents(Account.starting_balance), 0)
+            + func.coalesce(func.sum(_cents(Transaction.amount)), 0),
+        )
+        .select_from(Account)
+        .outerjoin(Transaction, Transaction.account_id == Account.id)
+        .where(Account.id.in_(account_ids))
+        .group_by(Account.id, Account.user_id, Account.balance, Account.starting_balance)
+    ).all()
+
+    # SUM() is a Decimal on Postgres
+    wrong = [(account_id, user_id, stored or 0, int(expected))
+             for account_id, user_id, stored, expected in rows
+             if (stored or 0) != int(expected)]
+    drifts = [Drift(account_id, user_id, from_minor(stored), from_minor(expected))
+              for account_id, user_id, stored, expected in wrong]
+
+    repaired = 0
+    if repair and wrong:
+        accounts = Account.__table__
+        repaired = connection.execute(
+            update(accounts)
+            .where(accounts.c.id == bindparam('target_id'))
+            .where(_cents(accounts.c.balance) == bindparam('stored', type_=BigInteger))
+            .values(balance=bindparam('expected', type_=BigInteger),
+                    balance_changed_at=datetime.now(timezone.utc)),
+            [{'target_id': account_id, 'stored': stored, 'expected': expected}
+             for account_id, user_id, stored, expected in wrong]
+        ).rowcount
+    return len(rows), drifts, repaired
+
+
+def _account_batches(batch_size, since=None):
+    """Lists of account ids (oldest first), only accounts changed since `since` if given."""
+    last_id = 0
+    while True:
+        query = select(Account.id).where(Account.id > last_id)
+        if since is not None:
+            query = query.where(Account.balance_changed_at >= since)
+        ids = db.session.execute(query.order_by(Account.id).limit(batch_size)).scalars().all()
+        if ids:
+            yield ids
+        if len(ids) < batch_size:
+            return
+        last_id = ids[-1]
+
+
+# ============================================
+# Process pool (one database connection per process)
+# ============================================
+
+_worker_engine = None
+
+
+def _start_worker(database_uri):
+    """Runs once in each pool process."""
+    global _worker_engine
+    _worker_engine = create_engine(database_uri)
+
+
+def _check_in_worker(account_ids, repair):
+    """check_batch() in a pool process, committed there."""
+    with _worker_engine.begin() as connection:
+        return check_batch(connection, account_ids, repair)
+
+
+# ============================================
+# The job
+# ============================================
+
+def last_watermark():
+    """When the last finished run started (None if there was none)."""
+    return db.session.execute(
+        select(LedgerCheck.started_at)
+        .where(LedgerCheck.finished_at.isnot(None))
+        .order_by(LedgerCheck.started_at.desc())
+        .limit(1)
+    ).scalar()
+
+
+def verify_ledger(repair=False, incremental=False, batch_size=1000, workers=1):
+    """
+    Check (and optionally repair) every account balance.
+
+    The run is recorded as a LedgerCheck; incremental runs start from the
+    last finished one. Without a finished run, an incremental run checks
+    all accounts.
+
+    Args:
+        repair: Fix wrong balances
+        incremental: Only check accounts whose balance changed since the last run
+        batch_size: Accounts per grouped query
+        workers: Processes to spread the batches over (1 = check here)
+
+    Returns:
+        VerifyResult
+    """
+    started = datetime.now(timezone.utc)
+    watermark = last_watermark() if incremental else None
+    since = watermark - WATERMARK_OVERLAP if watermark else None
+    run = LedgerCheck(started_at=started, incremental=since is not None)
+    db.session.add(run)
+    db.session.commit()
+
+    result = VerifyResult()
+    batches = _account_batches(batch_size, since)
+    if workers > 1:
+        database_uri = db.engine.url.render_as_string(hide_password=False)
+        # spawn: don't fork a process that may have threads and open connections
+        with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=_start_worker, initargs=(database_uri,)) as pool:
+            outcomes = list(pool.map(_check_in_worker, batches, repeat(repair)))
+    else:
+        outcomes = []
+        for account_ids in batches:
+            outcomes.append(check_batch(db.session.connection(), account_ids, repair))
+            db.session.commit()
+
+    for checked, drifts, repaired in outcomes:
+        result.checked += checked
+        result.drifts.extend(drifts)
+        result.repaired += repaired
+    for drift in result.drifts:
+        logger.warning('Account %d (user %d): balance %.2f, transactions say %.2f',
+                       drift.account_id, drift.user_id, drift.stored, drift.expected)
+
+    run.finished_at = datetime.now(timezone.utc)
+    run.accounts_checked = result.checked
+    run.drifted = len(result.drifts)
+    run.repaired = result.repaired
+    db.session.commit()
+    return result
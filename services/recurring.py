@@ -0,0 +1,217 @@
+"""
+Recurring - Post recurring transactions (salary, rent, ...) when they are due.
+
+A RecurringTransaction (see models.py) describes the repeating transaction
+and remembers the next date to post (next_date). The scheduler walks all
+users' due items together, a batch at a time, instead of one user or one
+item at a time. Per batch it runs:
+- one SELECT of the due items (oldest id first)
+- one SELECT of occurrences that were already posted (see below)
+- one executemany INSERT of the new transactions
+- one rollup upsert and one executemany balance UPDATE
+- one executemany UPDATE moving next_date forward
+and commits.
+
+Running it twice never posts twice:
+- the transactions and the new next_date are committed together, so after
+  a crash either both are there or neither is
+- posted transactions remember their recurring item (recurring_id), and a
+  unique index allows one transaction per item and date. Occurrences that
+  are already there are skipped; if two schedulers race, the slower one's
+  batch fails on the index and is retried (see background.py).
+
+Run it with `flask --app app post-recurring` (e.g. from cron), or set
+RECURRING_SCHEDULER_INTERVAL to run it in a background thread.
+"""
+import calendar
+import logging
+from datetime import date, timedelta
+from sqlalchemy import select, update, bindparam
+from models import db, Transaction, RecurringTransaction
+from services import background
+from services.rollups import RollupDeltas
+from services.balances import add_to_balances
+from services.duplicates import fingerprint
+
+logger = logging.getLogger(__name__)
+
+
+# ============================================
+# Dates
+# ============================================
+
+def add_months(start, months):
+    """
+    The date `months` months after start, on the same day of the month.
+    Days that don't exist in the target month become its last day
+    (Jan 31 + 1 month = Feb 28/29).
+    """
+    month_index = start.month - 1 + months
+    year, month = start.year + month_index // 12, month_index % 12 + 1
+    return date(year, month, min(start.day, calendar.monthrange(year, month)[1]))
+
+
+def following(item, current):
+    """
+    The occurrence after `current`.
+
+    Months and years are counted from start_date, not from the previous
+    occurrence, so a rule starting on the 31st goes back to the 31st after
+    a short month.
+    """
+    if item.frequency == 'daily':
+        return current + timedelta(days=item.interval)
+    if item.frequency == 'weekly':
+        return current + timedelta(weeks=item.interval)
+    step = item.interval * (12 if item.frequency == 'yearly' else 1)
+    months = (current.year - item.start_date.year) * 12 + current.month - item.start_date.month
+    return add_months(item.start_date, months + step)
+
+
+def due_dates(item, today):
+    """
+    The occurrences of an item to post by `today`, and the next_date after them.
+
+    Returns:
+        (list of dates, new next_date or None when the item has ended)
+    """
+    dates = []
+    current = item.next_date
+    while current is not None and current <= today:
+        if item.end_date is not None and current > item.end_date:
+            current = None
+            break
+        dates.append(current)
+        current = following(item, current)
+    if current is not None and item.end_date is not None and current > item.end_date:
+        current = None
+    return dates, current
+
+
+# ============================================
+# Scheduler
+# ============================================
+
+class PostResult:
+    """What a scheduler run did."""
+
+    def __init__(self):
+        self.posted = 0     # transactions created
+        self.items = 0      # recurring items that were due
+        self.skipped = 0    # occurrences that had been posted already
+
+
+def post_due(today=None, batch_size=1000):
+    """
+    Post every due occurrence of every user's recurring transactions.
+
+    Commits after each batch (a crash loses at most the running batch,
+    which is then posted by the next run).
+
+    Args:
+        today: Post occurrences up to and including this date (default: today)
+        batch_size: Recurring items per batch
+
+    Returns:
+        PostResult
+    """
+    today = today or date.today()
+    result = PostResult()
+    last_id = 0
+    while True:
+        items, posted, skipped = background.commit_batch(
+            lambda: _post_batch(today, last_id, batch_size))
+        result.items += len(items)
+        result.posted += posted
+        result.skipped += skipped
+        if len(items) < batch_size:
+            return result
+        last_id = items[-1].id
+
+
+def _post_batch(today, last_id, batch_size):
+    """
+    Post one batch of due items (ids after last_id).
+
+    Returns:
+        (the items, transactions posted, occurrences skipped)
+    """
+    connection = db.session.connection()
+    items = connection.execute(
+        select(RecurringTransaction.__table__)
+        .where(RecurringTransaction.next_date <= today)
+        .where(RecurringTransaction.id > last_id)
+        .order_by(RecurringTransaction.id)
+        .limit(batch_size)
+    ).all()
+    if not items:
+        return items, 0, 0
+
+    rows, next_dates = [], []
+    owners = {item.id: item.user_id for item in items}
+    for item in items:
+        dates, next_date = due_dates(item, today)
+        next_dates.append({'target_id': item.id, 'new_next_date': next_date})
+        for on_date in dates:
+            rows.append({
+                'account_id': item.account_id,
+                'category_id': item.category_id,
+                'amount': item.amount,
+                'description': item.description,
+                'location': item.location,
+                'date': on_date,
+                'recurring_id': item.id,
+                'fingerprint': fingerprint(item.account_id, on_date, item.amount, item.description),
+            })
+
+    # Occurrences posted by an earlier run that crashed before moving next_date
+    # (or by hand-edited next_date values) are not posted again
+    skipped = 0
+    if rows:
+        posted = set(connection.execute(
+            select(Transaction.recurring_id, Transaction.date)
+            .where(Transaction.recurring_id.in_([item.id for item in items]))
+            .where(Transaction.date >= min(row['date'] for row in rows))
+        ).all())
+        if posted:
+            new_rows = [row for row in rows if (row['recurring_id'], row['date']) not in posted]
+            skipped = len(rows) - len(new_rows)
+            rows = new_rows
+
+    if rows:
+        connection.execute(Transaction.__table__.insert(), rows)
+        deltas = RollupDeltas()
+        net = {}
+        for row in rows:
+            deltas.add(owners[row['recurring_id']], row['account_id'], row['category_id'],
+                       row['date'], row['amount'])
+            net[row['account_id']] = net.get(row['account_id'], 0) + row['amount']
+        deltas.apply(db.session)
+        add_to_balances(net)
+
+    table = RecurringTransaction.__table__
+    connection.execute(
+        update(table).where(table.c.id == bindparam('target_id'))
+        .values(next_date=bindparam('new_next_date')),
+        next_dates
+    )
+    return items, len(rows), skipped
+
+
+# ============================================
+# Background thread (optional)
+# ============================================
+
+def start_scheduler(app, interval):
+    """
+    Run post_due() every `interval` seconds in a daemon thread.
+
+    Several app processes may each run one: the unique index keeps them
+    from posting the same occurrence twice.
+    """
+    def job():
+        posted = post_due(batch_size=app.config['RECURRING_BATCH_SIZE']).posted
+        if posted:
+            logger.info('Posted %d recurring transactions', posted)
+
+    return background.start_periodic(app, interval, 'recurring-scheduler', job)
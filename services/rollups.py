@@ -0,0 +1,432 @@
+"""
+Monthly Rollups - Pre-computed totals per account, category and month.
+
+Every time transactions are saved, the matching MonthlyRollup rows are
+updated in the same database transaction, so dashboard reads cost
+O(categories) instead of O(transactions in the month).
+
+How it stays up to date:
+- ORM writes (db.session.add / delete / changing a transaction) are picked
+  up automatically by the flush hooks at the bottom of this file.
+- Set-based writes that bypass the ORM (Query.update, bulk inserts) must
+  collect their changes in a RollupDeltas themselves and apply it, as
+  bulk_actions.py, importer.py and recurring.py do.
+- `flask rebuild-rollups` recomputes everything from the transactions table;
+  migration 10 (schema_migrations.py) does that once for existing databases.
+
+The same deltas keep Category.transaction_count up to date, so the
+categories page reads the counts instead of counting transactions, and
+queue the budget alert events (see budget_alerts.py).
+"""
+from collections import namedtuple
+from sqlalchemy import (event, inspect, func, case, extract, select, insert, update, delete, or_, and_,
+                        bindparam, type_coerce)
+from sqlalchemy.orm import Session, aliased
+from models import db, Account, Category, CategoryPath, Transaction, MonthlyRollup
+from money import Money
+from services import budget_alerts
+
+# category_id stored for transactions without a category
+UNCATEGORIZED = 0
+
+# session.info key listing the months changed in the current DB transaction:
+# {user_id: {(year, month): True if account balances moved, False if only categories}}
+# Used by the dashboard cache to drop exactly the affected months after commit.
+CHANGED_MONTHS = 'rollups_changed_months'
+
+_KEY_COLUMNS = ('user_id', 'account_id', 'category_id', 'year', 'month')
+
+# One slice of the spending-by-category chart. category_id is None for the
+# "Uncategorized" slice; has_children tells whether the slice can be drilled into.
+CategoryTotal = namedtuple('CategoryTotal',
+                           ['name', 'icon', 'color', 'total', 'category_id', 'has_children'],
+                           defaults=[None, False])
+
+# How spending without a category is shown (name, icon, color)
+UNCATEGORIZED_BUCKET = ('Uncategorized', '📦', '#94a3b8')
+
+
+class RollupDeltas:
+    """
+    Collects changes to rollup rows (and category transaction counts) and
+    writes them in one go.
+
+    Usage:
+        deltas = RollupDeltas()
+        deltas.add(user_id, account_id, category_id, date, amount)       # new transaction
+        deltas.add(user_id, account_id, category_id, date, amount, -1)   # removed transaction
+        deltas.apply(db.session)
+    """
+
+    def __init__(self):
+        self.rows = {}
+        self.counts = {}  # category id -> change to its transaction_count
+
+    def add(self, user_id, account_id, category_id, on_date, amount, sign=1, count=1):
+        """Add (sign=1) or remove (sign=-1) `count` transactions totalling `amount`."""
+        self.add_count(category_id, sign * count)
+        if not amount:
+            return
+        key = (user_id, account_id, category_id or UNCATEGORIZED, on_date.year, on_date.month)
+        row = self.rows.setdefault(key, [0.0, 0.0, 0, 0])
+        if amount > 0:
+            row[0] += sign * amount
+            row[2] += sign * count
+        else:
+            row[1] += sign * amount
+            row[3] += sign * count
+
+    def add_row(self, key, income_total, expense_total, income_count, expense_count):
+        """Add the totals of an existing rollup row under a (possibly different) key."""
+        row = self.rows.setdefault(key, [0.0, 0.0, 0, 0])
+        row[0] += income_total
+        row[1] += expense_total
+        row[2] += income_count
+        row[3] += expense_count
+        self.add_count(key[2], income_count + expense_count)
+
+    def add_count(self, category_id, change):
+        """
+        Change a category's transaction count only. Rollups have no totals
+        for transactions of amount 0, so set-based writes count those here.
+        """
+        if category_id and change:
+            self.counts[category_id] = self.counts.get(category_id, 0) + change
+
+    def apply(self, session):
+        """Write all collected changes (insert missing rows, add to existing ones)."""
+        self._record_changed_months(session)
+        # Categories whose spending grew: their budgets are checked later, off the write path
+        budget_alerts.enqueue(session.connection(), {
+            (key[0], key[2]) for key, row in self.rows.items()
+            if row[1] < -1e-9 and key[2] != UNCATEGORIZED
+        })
+        params = [
+            dict(zip(_KEY_COLUMNS, key),
+                 income_total=row[0], expense_total=row[1],
+                 income_count=row[2], expense_count=row[3])
+            for key, row in self.rows.items()
+            if any(row)
+        ]
+        self.rows = {}
+        if params:
+            _upsert(session.connection(), params)
+        self._apply_counts(session)
+
+    def _apply_counts(self, session):
+        """One executemany UPDATE of the changed categories' transaction counts."""
+        params = [{'target_id': category_id, 'delta': change}
+                  for category_id, change in sorted(self.counts.items()) if change]
+        self.counts = {}
+        if not params:
+            return
+        table = Category.__table__
+        session.connection().execute(
+            update(table).where(table.c.id == bindparam('target_id'))
+            .values(transaction_count=table.c.transaction_count + bindparam('delta')),
+            params
+        )
+        changed = {row['target_id'] for row in params}
+        for obj in list(session.identity_map.values()):
+            if isinstance(obj, Category) and obj.id in changed:
+                session.expire(obj, ['transaction_count'])
+
+    def _record_changed_months(self, session):
+        """Remember which (user, month) pairs changed, see CHANGED_MONTHS."""
+        net_by_account = {}
+        for (user_id, account_id, category_id, year, month), row in self.rows.items():
+            if any(row):
+                key = (user_id, account_id, year, month)
+                net_by_account[key] = net_by_account.get(key, 0) + row[0] + row[1]
+
+        changed = session.info.setdefault(CHANGED_MONTHS, {})
+        for (user_id, account_id, year, month), net in net_by_account.items():
+            months = changed.setdefault(user_id, {})
+            months[(year, month)] = months.get((year, month), False) or abs(net) > 1e-9
+
+
+def _upsert(connection, params):
+    """INSERT ... ON CONFLICT DO UPDATE, adding the deltas to existing rows."""
+    table = MonthlyRollup.__table__
+    dialect = connection.dialect.name
+
+    if dialect in ('sqlite', 'postgresql'):
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        stmt = dialect_insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c[name] for name in _KEY_COLUMNS],
+            set_={
+                name: table.c[name] + stmt.excluded[name]
+                for name in ('income_total', 'expense_total', 'income_count', 'expense_count')
+            }
+        )
+        connection.execute(stmt, params)
+        return
+
+    # Other databases: update, then insert if the row didn't exist yet
+    for row in params:
+        key_filter = and_(*[table.c[name] == row[name] for name in _KEY_COLUMNS])
+        result = connection.execute(
+            table.update().where(key_filter).values(
+                income_total=table.c.income_total + row['income_total'],
+                expense_total=table.c.expense_total + row['expense_total'],
+                income_count=table.c.income_count + row['income_count'],
+                expense_count=table.c.expense_count + row['expense_count'],
+            )
+        )
+        if result.rowcount == 0:
+            connection.execute(insert(table).values(**row))
+
+
+# ============================================
+# Reading rollups (dashboard)
+# ============================================
+
+def month_aggregates(user_id, year, month, parent_id=None):
+    """
+    Everything the dashboard needs about one month, from a single query.
+
+    One grouped pass over the month's rollup rows gives the income total,
+    the spending total and the spending per category of one level of the
+    category tree. Each rollup row is joined to the one category of that
+    level it falls under (through the CategoryPath closure table), so a
+    slice is the total of its whole subtree:
+    - top level (parent_id None): the top-level categories; rollups without
+      a category (including transfers) get their own "Uncategorized" bucket
+    - below a category: its children, plus a "(other)" slice for spending
+      booked on the category itself
+
+    Returns:
+        (income, spending, by_category)
+        - income and spending are always for the whole month;
+          spending is negative (sum of expenses)
+        - by_category: list of CategoryTotal, only categories with
+          spending, total is negative
+    """
+    level = Category.parent_id.is_(None) if parent_id is None else Category.parent_id == parent_id
+    level_ids = select(Category.id).where(Category.user_id == user_id).where(level)
+    on_level = CategoryPath.ancestor_id.in_(level_ids)
+    if parent_id is not None:
+        on_level = or_(on_level, and_(CategoryPath.ancestor_id == parent_id, CategoryPath.depth == 0))
+
+    child = aliased(Category)
+    has_children = select(child.id).where(child.parent_id == CategoryPath.ancestor_id).exists()
+
+    rows = db.session.query(
+        CategoryPath.ancestor_id,
+        Category.name,
+        Category.icon,
+        Category.color,
+        has_children,
+        func.sum(MonthlyRollup.income_total),
+        func.sum(MonthlyRollup.expense_total)
+    ).select_from(MonthlyRollup) \
+     .outerjoin(CategoryPath, and_(CategoryPath.descendant_id == MonthlyRollup.category_id, on_level)) \
+     .outerjoin(Category, Category.id == CategoryPath.ancestor_id) \
+     .filter(MonthlyRollup.user_id == user_id) \
+     .filter(MonthlyRollup.year == year) \
+     .filter(MonthlyRollup.month == month) \
+     .group_by(CategoryPath.ancestor_id, Category.name, Category.icon, Category.color) \
+     .all()
+
+    income = 0
+    spending = 0
+    by_category = []
+    uncategorized = 0
+    for category_id, name, icon, color, drillable, income_total, expense_total in rows:
+        income += income_total or 0
+        spending += expense_total or 0
+        if not expense_total:
+            continue
+        if category_id is None:
+            # No category, or (below the top level) outside the drilled-into category
+            if parent_id is None:
+                uncategorized += expense_total
+        elif category_id == parent_id:
+            by_category.append(CategoryTotal(f'{name} (other)', icon, color, expense_total, category_id))
+        else:
+            by_category.append(CategoryTotal(name, icon, color, expense_total,
+                                             category_id, bool(drillable)))
+
+    if uncategorized:
+        by_category.append(CategoryTotal(*UNCATEGORIZED_BUCKET, uncategorized))
+    return income, spending, by_category
+
+
+def amounts_after_month(account_ids, year, month):
+    """
+    Sum of all transaction amounts after the given month, per account.
+
+    Returns:
+        Dict mapping account id -> sum (accounts without later transactions are missing)
+    """
+    if not account_ids:
+        return {}
+    rows = db.session.query(
+        MonthlyRollup.account_id,
+        # type_coerce: read the sum back as an amount, not as raw cents
+        func.sum(type_coerce(MonthlyRollup.income_total + MonthlyRollup.expense_total, Money))
+    ).filter(MonthlyRollup.account_id.in_(account_ids)) \
+     .filter(or_(MonthlyRollup.year > year,
+                 and_(MonthlyRollup.year == year, MonthlyRollup.month > month))) \
+     .group_by(MonthlyRollup.account_id) \
+     .all()
+    return {account_id: total or 0 for account_id, total in rows}
+
+
+# ============================================
+# Rebuilding from the transactions
+# ============================================
+
+def rebuild(user_id=None):
+    """
+    Recompute rollups (and category transaction counts) from the transactions table.
+
+    Args:
+        user_id: Only rebuild this user's rollups (default: everyone)
+
+    Returns:
+        Number of rollup rows written
+    """
+    return _rebuild(db.session.connection(), user_id)
+
+
+def backfill_rollups(engine):
+    """Migration step: fill the rollups (and category counts) of an existing database."""
+    with engine.begin() as connection:
+        _rebuild(connection)
+
+
+def _rebuild(connection, user_id=None):
+    """rebuild() on the given connection (the caller commits)."""
+    table = MonthlyRollup.__table__
+
+    clear = delete(table)
+    if user_id is not None:
+        clear = clear.where(table.c.user_id == user_id)
+    connection.execute(clear)
+
+    category_key = func.coalesce(Transaction.category_id, UNCATEGORIZED)
+    year = extract('year', Transaction.date)
+    month = extract('month', Transaction.date)
+    is_income = Transaction.amount > 0
+    is_expense = Transaction.amount < 0
+
+    grouped = select(
+        Account.user_id,
+        Transaction.account_id,
+        category_key,
+        year,
+        month,
+        func.sum(case((is_income, Transaction.amount), else_=0)),
+        func.sum(case((is_expense, Transaction.amount), else_=0)),
+        func.sum(case((is_income, 1), else_=0)),
+        func.sum(case((is_expense, 1), else_=0)),
+    ).join(Account, Account.id == Transaction.account_id) \
+     .where(Transaction.amount != 0) \
+     .group_by(Account.user_id, Transaction.account_id, category_key, year, month)
+    if user_id is not None:
+        grouped = grouped.where(Account.user_id == user_id)
+
+    result = connection.execute(
+        insert(table).from_select(
+            list(_KEY_COLUMNS) + ['income_total', 'expense_total', 'income_count', 'expense_count'],
+            grouped
+        )
+    )
+    recount_categories(connection, user_id)
+    return result.rowcount
+
+
+def recount_categories(connection, user_id=None):
+    """Recompute Category.transaction_count from the transactions table."""
+    categories = Category.__table__
+    count = select(func.count()).select_from(Transaction) \
+        .where(Transaction.category_id == categories.c.id).scalar_subquery()
+    stmt = update(categories).values(transaction_count=count)
+    if user_id is not None:
+        stmt = stmt.where(categories.c.user_id == user_id)
+    connection.execute(stmt)
+
+
+def backfill_category_counts(engine):
+    """Migration step: count the transactions of every category."""
+    with engine.begin() as connection:
+        recount_categories(connection)
+
+
+# ============================================
+# Flush hooks - keep rollups in sync with ORM writes
+# ============================================
+
+_TRACKED_FIELDS = ('amount', 'date', 'account_id', 'category_id')
+
+
+def _is_changed(obj):
+    """Did any field that affects rollups change on this transaction?"""
+    state = inspect(obj)
+    return any(state.attrs[name].history.has_changes() for name in _TRACKED_FIELDS)
+
+
+@event.listens_for(Session, 'before_flush')
+def _remove_old_values(session, flush_context, instances):
+    """
+    Subtract the stored (pre-change) values of changed and deleted transactions.
+
+    Old values are read from the database in one query because the objects
+    may have been expired or changed without loading them first.
+    """
+    changed_ids = [obj.id for obj in session.dirty
+                   if isinstance(obj, Transaction) and obj.id is not None and _is_changed(obj)]
+    changed_ids += [obj.id for obj in session.deleted
+                    if isinstance(obj, Transaction) and obj.id is not None]
+    deleted_account_ids = [obj.id for obj in session.deleted if isinstance(obj, Account)]
+    if not changed_ids and not deleted_account_ids:
+        return
+
+    connection = session.connection()
+    deltas = RollupDeltas()
+    if changed_ids:
+        rows = connection.execute(
+            select(Account.user_id, Transaction.account_id, Transaction.category_id,
+                   Transaction.date, Transaction.amount)
+            .join(Account, Account.id == Transaction.account_id)
+            .where(Transaction.id.in_(changed_ids))
+        ).all()
+        for row in rows:
+            if row.account_id not in deleted_account_ids:
+                deltas.add(row.user_id, row.account_id, row.category_id, row.date, row.amount, -1)
+            else:
+                # The account's rollup rows are deleted below; only the count changes
+                deltas.add_count(row.category_id, -1)
+    deltas.apply(session)
+
+    # Rollups of deleted accounts go away with the account
+    if deleted_account_ids:
+        connection.execute(
+            delete(MonthlyRollup.__table__).where(MonthlyRollup.account_id.in_(deleted_account_ids))
+        )
+
+
+@event.listens_for(Session, 'after_flush')
+def _add_new_values(session, flush_context):
+    """Add the new values of created and changed transactions."""
+    transactions = [obj for obj in session.new if isinstance(obj, Transaction)]
+    transactions += [obj for obj in session.dirty
+                     if isinstance(obj, Transaction) and _is_changed(obj)]
+    if not transactions:
+        return
+
+    connection = session.connection()
+    account_ids = {t.account_id for t in transactions}
+    owners = dict(connection.execute(
+        select(Account.id, Account.user_id).where(Account.id.in_(account_ids))
+    ).all())
+
+    deltas = RollupDeltas()
+    for t in transactions:
+        deltas.add(owners[t.account_id], t.account_id, t.category_id, t.date, t.amount)
+    deltas.apply(session)
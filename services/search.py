@@ -0,0 +1,125 @@
+"""
+Search - Full-text search over transaction descriptions and locations.
+
+A LIKE '%coffee%' filter has to read every transaction of the user. Instead
+the words are kept in a full-text index, so a search only touches the
+matching rows no matter how many years of history there are:
+
+- SQLite: an FTS5 virtual table (transactions_fts) that points at the
+  transactions table. Triggers on transactions keep it in sync on every
+  insert, update and delete - including bulk statements that bypass the ORM.
+- Postgres: a GIN index on a tsvector expression of description and
+  location. Postgres updates it itself on every write.
+
+Both are created by migration 2 in schema_migrations.py.
+
+Every word of the search must match (as a prefix, so "coff" finds
+"Coffee"); results are ranked best match first, newest first on ties.
+"""
+import re
+from sqlalchemy import func, text, literal_column, or_, table, column
+from models import db, Transaction
+from services.transaction_list import transaction_rows
+
+FTS_TABLE = 'transactions_fts'
+SEARCH_INDEX = 'ix_transactions_search'
+
+# Longer queries are cut off (each word adds work to the index lookup)
+MAX_TERMS = 8
+
+# Postgres: the indexed document. The query must use the exact same
+# expression or the planner won't use the index.
+_PG_DOCUMENT = ("to_tsvector('simple', coalesce({t}description, '') || ' ' || "
+                "coalesce({t}location, ''))")
+
+_SQLITE_DDL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        description, location,
+        content='transactions', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS transactions_fts_insert AFTER INSERT ON transactions BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, description, location)
+        VALUES (new.id, new.description, new.location);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS transactions_fts_delete AFTER DELETE ON transactions BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, description, location)
+        VALUES ('delete', old.id, old.description, old.location);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS transactions_fts_update
+        AFTER UPDATE OF id, description, location ON transactions BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, description, location)
+        VALUES ('delete', old.id, old.description, old.location);
+        INSERT INTO {FTS_TABLE}(rowid, description, location)
+        VALUES (new.id, new.description, new.location);
+    END""",
+    # Index the transactions that already exist
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+]
+
+
+def create_search_index(engine):
+    """Migration step: create the full-text index for this database."""
+    if engine.dialect.name == 'sqlite':
+        with engine.begin() as connection:
+            for statement in _SQLITE_DDL:
+                connection.execute(text(statement))
+    elif engine.dialect.name == 'postgresql':
+        from schema_migrations import create_index_concurrently
+        create_index_concurrently(engine, SEARCH_INDEX, (
+            f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {SEARCH_INDEX} '
+            f'ON transactions USING gin ({_PG_DOCUMENT.format(t="")})'
+        ))
+    # Other databases have no index and fall back to LIKE (see search_transactions)
+
+
+def search_terms(query):
+    """
+    Split what the user typed into plain words.
+
+    Punctuation and operators are dropped, so user input can never be read
+    as FTS/tsquery syntax.
+    """
+    return re.findall(r'[^\W_]+', query or '')[:MAX_TERMS]
+
+
+def search_transactions(user_id, query, limit=50):
+    """
+    Find a user's transactions whose description or location match a search.
+
+    Args:
+        user_id: Only this user's transactions are searched
+        query: What the user typed, e.g. "coffee march"
+        limit: Maximum number of results
+
+    Returns:
+        List of rows like transaction_rows(), best match first
+    """
+    terms = search_terms(query)
+    if not terms:
+        return []
+
+    rows = transaction_rows(user_id)
+    dialect = db.session.get_bind().dialect.name
+
+    if dialect == 'sqlite':
+        match = ' '.join('"{}"*'.format(term) for term in terms)
+        fts = table(FTS_TABLE, column('rowid'))
+        rows = rows.join(fts, fts.c.rowid == Transaction.id) \
+            .filter(text(f'{FTS_TABLE} MATCH :match').bindparams(match=match)) \
+            .order_by(text(f'bm25({FTS_TABLE})'), Transaction.date.desc(), Transaction.id.desc())
+    elif dialect == 'postgresql':
+        document = literal_column(_PG_DOCUMENT.format(t='transactions.'))
+        tsquery = func.to_tsquery(literal_column("'simple'"),
+                                  ' & '.join(f'{term}:*' for term in terms))
+        rows = rows.filter(document.op('@@')(tsquery)) \
+            .order_by(func.ts_rank(document, tsquery).desc(),
+                      Transaction.date.desc(), Transaction.id.desc())
+    else:
+        for term in terms:
+            pattern = f'%{term}%'
+            rows = rows.filter(or_(Transaction.description.ilike(pattern),
+                                   Transaction.location.ilike(pattern)))
+        rows = rows.order_by(Transaction.date.desc(), Transaction.id.desc())
+
+    return rows.limit(limit).all()
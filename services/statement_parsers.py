@@ -0,0 +1,265 @@
+"""
+Statement Parsers - Read OFX and QIF bank statement files.
+
+Both parsers are generators: they read the file a piece at a time and yield
+one transaction at a time, so a 50 MB multi-year statement is never held in
+memory. Each item is
+
+    (account_label, position, values)
+
+- account_label: how the file names the account the transaction belongs to
+  (OFX: the account number, QIF: the account name; None if the file doesn't
+  say). One file can contain several accounts.
+- position: where the transaction is, for error messages (QIF: line number,
+  OFX: number of the transaction in the file)
+- values: dict from transaction_values() plus 'category_name'
+  (QIF only, None otherwise), or a ValueError if the transaction can't be
+  read - the importer reports it and goes on.
+"""
+import html
+import re
+from datetime import date
+from models import Transaction
+
+_DESCRIPTION_LENGTH = Transaction.__table__.c.description.type.length
+_LOCATION_LENGTH = Transaction.__table__.c.location.type.length
+
+# OFX: read the file in pieces of this size
+_OFX_CHUNK = 64 * 1024
+
+# One OFX tag with the text after it, e.g. "<TRNAMT>-12.50" or "</STMTTRN>"
+_OFX_TAG = re.compile(r'<(/?)([A-Za-z0-9.]+)>([^<]*)')
+
+# OFX account blocks: the number is in ACCTID inside one of these
+_OFX_ACCOUNT_BLOCKS = ('BANKACCTFROM', 'CCACCTFROM', 'INVACCTFROM')
+
+
+# ============================================
+# Shared by all formats (CSV too, see importer.py)
+# ============================================
+
+def parse_amount(text, decimal='.'):
+    """
+    Parse a money amount as banks write it.
+
+    Handles currency symbols, thousands separators, a leading or trailing
+    minus and accounting-style negatives like "(12.50)".
+
+    Returns:
+        The amount as float, or None for an empty or invalid value
+    """
+    text = (text or '').strip()
+    if not text:
+        return None
+    negative = text.startswith('(') and text.endswith(')') or '-' in text
+    thousands = ',' if decimal == '.' else '.'
+    cleaned = re.sub(r'[^\d.,]', '', text).replace(thousands, '').replace(decimal, '.')
+    try:
+        amount = round(float(cleaned), 2)
+    except ValueError:
+        return None
+    return -amount if negative else amount
+
+
+def transaction_values(on_date, amount, description=None, location=None, category_id=None):
+    """Column values for one imported transaction (texts trimmed to the column sizes)."""
+    return {
+        'date': on_date,
+        'amount': amount,
+        'description': (description or '').strip()[:_DESCRIPTION_LENGTH] or None,
+        'location': (location or '').strip()[:_LOCATION_LENGTH] or None,
+        'category_id': category_id,
+    }
+
+
+# ============================================
+# OFX (Open Financial Exchange, versions 1.x SGML and 2.x XML)
+# ============================================
+
+def parse_ofx(stream):
+    """
+    Yield the transactions of an OFX file.
+
+    OFX 1.x is SGML where simple values have no closing tag (<TRNAMT>-12.50),
+    OFX 2.x is XML (<TRNAMT>-12.50</TRNAMT>). Both are read the same way:
+    every tag's value is the text up to the next tag.
+    """
+    account = None
+    in_account_block = False
+    transaction = None
+    count = 0
+
+    for closing, tag, value in _ofx_tags(stream):
+        tag = tag.upper()
+        if tag in _OFX_ACCOUNT_BLOCKS:
+            in_account_block = not closing
+        elif tag == 'ACCTID' and in_account_block and not closing:
+            account = value.strip() or None
+        elif tag == 'STMTTRN':
+            if closing and transaction is not None:
+                count += 1
+                yield account, count, _ofx_transaction(transaction)
+                transaction = None
+            elif not closing:
+                transaction = {}
+        elif transaction is not None and not closing:
+            transaction[tag] = html.unescape(value.strip())  # OFX 2 escapes & < >
+
+
+def _ofx_tags(stream):
+    """Yield (closing, tag, value) for every tag, reading the stream in pieces."""
+    buffer = ''
+    while True:
+        chunk = stream.read(_OFX_CHUNK)
+        buffer += chunk
+        # Keep the last (maybe incomplete) tag for the next round
+        cut = len(buffer) if not chunk else buffer.rfind('<')
+        if cut < 0:
+            buffer = ''  # no tags in this piece (e.g. the OFX 1.x header lines)
+        elif cut > 0:
+            for match in _OFX_TAG.finditer(buffer, 0, cut):
+                yield match.group(1) == '/', match.group(2), match.group(3)
+            buffer = buffer[cut:]
+        if not chunk:
+            return
+
+
+def _ofx_transaction(fields):
+    """Values of one <STMTTRN> block, or ValueError if it's unusable."""
+    posted = fields.get('DTPOSTED') or fields.get('DTUSER') or ''
+    try:
+        on_date = date(int(posted[0:4]), int(posted[4:6]), int(posted[6:8]))
+    except ValueError:
+        return ValueError(f'invalid date "{posted}"')
+
+    raw_amount = fields.get('TRNAMT', '')
+    amount = parse_amount(raw_amount, decimal=',' if ',' in raw_amount and '.' not in raw_amount else '.')
+    if amount is None:
+        return ValueError(f'invalid amount "{raw_amount}"')
+
+    name, memo = fields.get('NAME'), fields.get('MEMO')
+    values = transaction_values(on_date, amount, description=name or memo)
+    values['category_name'] = None
+    return values
+
+
+# ============================================
+# QIF (Quicken Interchange Format)
+# ============================================
+
+def parse_qif(stream, day_first=False):
+    """
+    Yield the transactions of a QIF file.
+
+    QIF is line based: a code letter, then the value. '^' ends a record.
+    "!Account" sections name the account the following transactions
+    belong to (files exported from one account don't have them).
+
+    Args:
+        stream: Text file object
+        day_first: Dates are DD/MM/YY instead of the usual MM/DD/YY
+    """
+    account = None
+    section = None
+    fields = {}
+    line_number = 0
+
+    for line_number, line in enumerate(stream, start=1):
+        line = line.rstrip('\r\n')
+        if not line.strip():
+            continue
+        if line.startswith('!'):
+            header = line.strip().lower()
+            if header == '!account':
+                section = 'account'
+            elif header.startswith('!type:'):
+                kind = header[len('!type:'):]
+                # Only money transactions; lists (categories, classes, ...) are skipped
+                section = 'transactions' if kind in ('bank', 'cash', 'ccard', 'oth a', 'oth l') else None
+            elif header.startswith('!option') or header.startswith('!clear'):
+                continue
+            else:
+                section = None
+            fields = {}
+            continue
+
+        code, value = line[0], line[1:].strip()
+        if code == '^':
+            if section == 'account':
+                account = fields.get('N') or account
+            elif section == 'transactions' and fields:
+                yield account, line_number, _qif_transaction(fields, day_first)
+            fields = {}
+        elif code in fields and code in ('A', 'M'):
+            continue  # only the first address / memo line is kept
+        else:
+            fields[code] = value
+
+    if section == 'transactions' and fields:
+        # Last record without a closing '^'
+        yield account, line_number, _qif_transaction(fields, day_first)
+
+
+def _qif_transaction(fields, day_first):
+    """Values of one QIF record, or ValueError if it's unusable."""
+    try:
+        on_date = parse_qif_date(fields.get('D', ''), day_first)
+    except ValueError:
+        return ValueError(f'invalid date "{fields.get("D", "")}"')
+
+    raw_amount = fields.get('T') or fields.get('U') or ''
+    amount = parse_amount(raw_amount)
+    if amount is None:
+        return ValueError(f'invalid amount "{raw_amount}"')
+
+    category = fields.get('L') or ''
+    if category.startswith('['):
+        category = ''  # "[Savings]" is a transfer to another account, not a category
+
+    values = transaction_values(
+        on_date, amount,
+        description=fields.get('P') or fields.get('M'),
+        location=fields.get('A'),
+    )
+    # "Food:Groceries" is a subcategory; the importer tries both names
+    values['category_name'] = category.split('/')[0] or None
+    return values
+
+
+def parse_qif_date(text, day_first=False):
+    """
+    Parse the date styles QIF exporters use: 3/5/2026, 03/05/26, 3/5'26, 2026-03-05.
+    """
+    text = text.strip().replace("'", '/').replace(' ', '')
+    parts = [int(part) for part in re.split(r'[/.\-]', text) if part]
+    if len(parts) != 3:
+        raise ValueError(text)
+    if parts[0] > 31:
+        year, month, day = parts
+    elif day_first:
+        day, month, year = parts
+    else:
+        month, day, year = parts
+    if year < 100:
+        year += 2000 if year < 70 else 1900
+    return date(year, month, day)
+
+
+def detect_format(filename, head):
+    """
+    Guess the statement format from the file name and its first bytes.
+
+    Returns:
+        'ofx', 'qif' or 'csv'
+    """
+    extension = (filename or '').rsplit('.', 1)[-1].lower()
+    if extension in ('ofx', 'qfx'):
+        return 'ofx'
+    if extension == 'qif':
+        return 'qif'
+    start = head.lstrip().upper()
+    if start.startswith('OFXHEADER') or start.startswith('<?XML') or start.startswith('<OFX'):
+        return 'ofx'
+    if start.startswith('!'):
+        return 'qif'
+    return 'csv'
@@ -0,0 +1,238 @@
+"""
+Transaction List - Queries behind the transactions page.
+
+Transactions are shown newest first and paged with keyset ("seek")
+pagination on (date, id): instead of OFFSET, each page starts right after
+the last row of the previous one. Every page costs the same no matter how
+deep into the history the user has scrolled.
+
+Cursors are plain strings like "2026-03-05.123" (date and id of a row).
+
+Rows are plain projections (see transaction_rows()), not Transaction
+objects, so templates never trigger extra queries per row.
+
+TransactionFilters narrows the list (dates, accounts, categories, amounts,
+income/expense, uncategorized). Every filter is written so the database can
+answer it from the indexes in models.py:
+- the user and account filters pick accounts via ix_accounts_user_id, and
+  the date range is a seek inside ix_transactions_account_date
+- category filters (and "uncategorized", category_id IS NULL) can seek
+  ix_transactions_category_date instead
+- amount and type are checked on the rows found that way; they never
+  decide which rows are read
+"""
+from datetime import datetime
+from sqlalchemy import tuple_, func, type_coerce
+from models import db, Transaction, Account, Category
+from money import Money
+
+
+class Page:
+    """One page of transactions plus cursors for the neighbouring pages."""
+
+    def __init__(self, items, per_page, has_newer, has_older):
+        self.items = items
+        self.per_page = per_page
+        self.has_newer = has_newer and bool(items)
+        self.has_older = has_older and bool(items)
+
+    @property
+    def newer_cursor(self):
+        """Cursor for the page before this one (newer transactions)."""
+        return make_cursor(self.items[0]) if self.has_newer else None
+
+    @property
+    def older_cursor(self):
+        """Cursor for the page after this one (older transactions)."""
+        return make_cursor(self.items[-1]) if self.has_older else None
+
+
+def make_cursor(transaction):
+    """Cursor pointing at a transaction: "YYYY-MM-DD.id"."""
+    return f'{transaction.date.isoformat()}.{transaction.id}'
+
+
+def parse_cursor(cursor):
+    """
+    Turn a cursor back into (date, id).
+
+    Returns:
+        (date, id) tuple, or None if the cursor is missing or invalid
+    """
+    if not cursor:
+        return None
+    try:
+        date_str, id_str = cursor.split('.', 1)
+        return datetime.strptime(date_str, '%Y-%m-%d').date(), int(id_str)
+    except ValueError:
+        return None
+
+
+def transaction_rows(user_id):
+    """
+    All transactions of one user as lightweight rows (not ORM objects).
+
+    One statement fetches everything the list templates show, joined in:
+    id, date, amount, description, location, account_name, account_currency,
+    category_name, category_icon (category fields are None without a category).
+    Nothing is lazy-loaded per row, so rendering N rows costs one query.
+    """
+    return db.session.query(
+        Transaction.id,
+        Transaction.date,
+        Transaction.amount,
+        Transaction.description,
+        Transaction.location,
+        Account.name.label('account_name'),
+        Account.currency.label('account_currency'),
+        Category.name.label('category_name'),
+        Category.icon.label('category_icon'),
+    ).join(Account, Account.id == Transaction.account_id) \
+     .outerjoin(Category, Category.id == Transaction.category_id) \
+     .filter(Account.user_id == user_id)
+
+
+class TransactionFilters:
+    """
+    Filters for the transaction list, read from the query string:
+        ?start=2026-01-01&end=2026-03-31    date range (inclusive)
+        ?account=1&account=2                 any of these accounts
+        ?category=5&category=7               any of these categories
+        ?min_amount=10&max_amount=100        size of the amount (ignores the sign)
+        ?type=income|expense                 money in or money out
+        ?uncategorized=1                     only transactions without a category
+    Missing or invalid values are ignored.
+    """
+
+    TYPES = ('income', 'expense')
+
+    def __init__(self, start=None, end=None, account_ids=(), category_ids=(),
+                 min_amount=None, max_amount=None, kind=None, uncategorized=False):
+        self.start = start
+        self.end = end
+        self.account_ids = sorted(set(account_ids))
+        self.category_ids = sorted(set(category_ids))
+        self.min_amount = min_amount
+        self.max_amount = max_amount
+        self.kind = kind if kind in self.TYPES else None
+        self.uncategorized = bool(uncategorized)
+
+    @classmethod
+    def from_args(cls, args):
+        """Build filters from request.args."""
+        return cls(
+            start=_parse_date(args.get('start')),
+            end=_parse_date(args.get('end')),
+            account_ids=args.getlist('account', type=int),
+            category_ids=args.getlist('category', type=int),
+            min_amount=args.get('min_amount', type=float),
+            max_amount=args.get('max_amount', type=float),
+            kind=args.get('type'),
+            uncategorized=args.get('uncategorized') in ('1', 'true', 'on'),
+        )
+
+    @property
+    def active(self):
+        """Is any filter set?"""
+        return bool(self.as_args())
+
+    def as_args(self):
+        """The filters as query string arguments (to keep them in page links)."""
+        args = {
+            'start': self.start.isoformat() if self.start else None,
+            'end': self.end.isoformat() if self.end else None,
+            'account': self.account_ids or None,
+            'category': self.category_ids or None,
+            'min_amount': self.min_amount,
+            'max_amount': self.max_amount,
+            'type': self.kind,
+            'uncategorized': 1 if self.uncategorized else None,
+        }
+        return {key: value for key, value in args.items() if value is not None}
+
+    def apply(self, query):
+        """Add the filters to a transaction query (e.g. from transaction_rows())."""
+        if self.start:
+            query = query.filter(Transaction.date >= self.start)
+        if self.end:
+            query = query.filter(Transaction.date <= self.end)
+        if self.account_ids:
+            query = query.filter(Transaction.account_id.in_(self.account_ids))
+        if self.uncategorized:
+            query = query.filter(Transaction.category_id.is_(None))
+        elif self.category_ids:
+            query = query.filter(Transaction.category_id.in_(self.category_ids))
+        if self.kind == 'income':
+            query = query.filter(Transaction.amount > 0)
+        elif self.kind == 'expense':
+            query = query.filter(Transaction.amount < 0)
+        # type_coerce: compare in cents, like the column
+        size = type_coerce(func.abs(Transaction.amount), Money)
+        if self.min_amount is not None:
+            query = query.filter(size >= self.min_amount)
+        if self.max_amount is not None:
+            query = query.filter(size <= self.max_amount)
+        return query
+
+
+def _parse_date(value):
+    """'YYYY-MM-DD' to a date, or None if missing or invalid."""
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date() if value else None
+    except ValueError:
+        return None
+
+
+def row_to_dict(row):
+    """A transaction row as JSON-friendly dict (for the JSON API)."""
+    return {
+        'id': row.id,
+        'date': row.date.isoformat(),
+        'amount': row.amount,
+        'description': row.description,
+        'location': row.location,
+        'account': row.account_name,
+        'currency': row.account_currency,
+        'category': row.category_name,
+        'category_icon': row.category_icon,
+    }
+
+
+def keyset_page(query, per_page, before=None, after=None):
+    """
+    Get one page of a transaction query, newest first.
+
+    Args:
+        query: Query over transactions (e.g. from transaction_rows())
+        per_page: Number of rows per page
+        before: Cursor - return the rows right after it (older transactions)
+        after: Cursor - return the rows right before it (newer transactions)
+        (with neither, the newest page is returned)
+
+    Returns:
+        Page
+    """
+    sort_key = tuple_(Transaction.date, Transaction.id)
+    before = parse_cursor(before)
+    after = parse_cursor(after) if before is None else None
+
+    if after is not None:
+        # Walk towards newer rows, then flip back to newest-first
+        rows = query.filter(sort_key > after) \
+            .order_by(Transaction.date.asc(), Transaction.id.asc()) \
+            .limit(per_page + 1) \
+            .all()
+        if len(rows) <= per_page:
+            # Reached the newest rows: show a full first page instead
+            return keyset_page(query, per_page)
+        return Page(list(reversed(rows[:per_page])), per_page,
+                    has_newer=True, has_older=True)
+
+    if before is not None:
+        query = query.filter(sort_key < before)
+    rows = query.order_by(Transaction.date.desc(), Transaction.id.desc()) \
+        .limit(per_page + 1) \
+        .all()
+    has_older = len(rows) > per_page
+    return Page(rows[:per_page], per_page,
+                has_newer=before is not None, has_older=has_older)
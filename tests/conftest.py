@@ -0,0 +1,10 @@
+"""
+Test setup shared by all test files.
+
+`import app` builds the module-level app (for Gunicorn) from FLASK_ENV.
+Make that a testing app too, so running the tests never writes to the
+development database (finance.db).
+"""
+import os
+
+os.environ.setdefault('FLASK_ENV', 'testing')
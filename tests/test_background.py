@@ -0,0 +1,87 @@
+"""
+Test Background Jobs
+
+Batches that lose a race on a unique index are started over; periodic jobs
+keep running after a failure.
+"""
+import threading
+import pytest
+from sqlalchemy.exc import IntegrityError
+from app import create_app
+from models import db, User
+from services import background
+
+
+@pytest.fixture
+def app():
+    """Create a test app."""
+    app = create_app('testing')
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    app.config['TESTING'] = True
+    app.config['WTF_CSRF_ENABLED'] = False
+
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.drop_all()
+
+
+def add_user(email):
+    """Write (but don't commit) a user."""
+    user = User(name='Test User', email=email)
+    user.set_password('password123')
+    db.session.add(user)
+    db.session.flush()
+    return user.id
+
+
+class TestCommitBatch:
+    """Tests for retrying a conflicting batch."""
+
+    def test_conflicting_batch_is_started_over(self, app):
+        """The first attempt hits the unique index and is rolled back; the second commits."""
+        with app.app_context():
+            add_user('taken@example.com')
+            db.session.commit()
+            emails = iter(['taken@example.com', 'free@example.com'])
+
+            user_id = background.commit_batch(lambda: add_user(next(emails)))
+
+            assert db.session.get(User, user_id).email == 'free@example.com'
+            assert User.query.filter_by(email='taken@example.com').count() == 1
+
+    def test_gives_up_after_the_retries(self, app):
+        """A batch that always conflicts raises once the retries are used up."""
+        with app.app_context():
+            add_user('taken@example.com')
+            db.session.commit()
+            attempts = []
+
+            def work():
+                attempts.append(1)
+                add_user('taken@example.com')
+
+            with pytest.raises(IntegrityError):
+                background.commit_batch(work)
+            assert len(attempts) == background.RETRIES
+
+
+class TestStartPeriodic:
+    """Tests for the background thread."""
+
+    def test_keeps_running_after_a_failure(self, app):
+        """A failing run is logged and the next run still happens."""
+        runs = []
+        second_run = threading.Event()
+
+        def job():
+            runs.append(1)
+            if len(runs) == 1:
+                raise RuntimeError('boom')
+            second_run.set()
+
+        stop = background.start_periodic(app, 0.01, 'test-job', job)
+        try:
+            assert second_run.wait(5)
+        finally:
+            stop.set()
@@ -0,0 +1,173 @@
+"""
+Test Budget Alerts
+
+Writes only queue "category touched" events; the worker turns them into
+alerts when a budget reaches 80% or 100%, once per period and threshold.
+"""
+from datetime import date
+import pytest
+from app import create_app
+from models import db, User, Account, Category, Budget, BudgetEvent, BudgetAlert
+from services import budget_alerts
+
+
+@pytest.fixture
+def app():
+    """Create a test app."""
+    app = create_app('testing')
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    app.config['TESTING'] = True
+    app.config['WTF_CSRF_ENABLED'] = False
+
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    """Create a test client."""
+    return app.test_client()
+
+
+@pytest.fixture
+def budgeted_user(client, app):
+    """Create and login a user with Food > Groceries and a monthly 100.00 budget on Food."""
+    with app.app_context():
+        # Events queued by the demo data are not part of these tests
+        budget_alerts.process_events()
+
+        user = User(name='Test User', email='test@example.com')
+        user.set_password('password123')
+        db.session.add(user)
+        db.session.flush()
+
+        account = Account(user_id=user.id, name='Checking', account_type='bank', balance=1000.00)
+        food = Category(user_id=user.id, name='Food', category_type='expense')
+        db.session.add_all([account, food])
+        db.session.flush()
+        groceries = Category(user_id=user.id, name='Groceries', category_type='expense', parent_id=food.id)
+        db.session.add_all([groceries, Budget(user_id=user.id, category_id=food.id, amount=100, period='monthly')])
+        db.session.commit()
+
+        data = {
+            'user_id': user.id,
+            'account_id': account.id,
+            'food': food.id,
+            'groceries': groceries.id,
+        }
+
+    client.post('/auth/login', data={
+        'email': 'test@example.com',
+        'password': 'password123'
+    })
+    return data
+
+
+def add_expense(client, data, amount, category_id):
+    """Add an expense in March 2026 through the form."""
+    client.post('/transactions/add', data={
+        'amount': str(amount), 'date': '2026-03-05', 'description': 'Shopping',
+        'account_id': data['account_id'], 'category_id': category_id, 'type': 'expense'
+    })
+
+
+def alerts(user_id):
+    """The user's alerts as (threshold, spent)."""
+    return [(a.threshold, a.spent) for a in
+            BudgetAlert.query.filter_by(user_id=user_id).order_by(BudgetAlert.threshold).all()]
+
+
+class TestQueue:
+    """Tests for the write side."""
+
+    def test_write_only_queues_an_event(self, client, app, budgeted_user):
+        """Adding an expense queues an event but writes no alert by itself."""
+        add_expense(client, budgeted_user, 95, budgeted_user['groceries'])
+
+        with app.app_context():
+            events = BudgetEvent.query.filter_by(user_id=budgeted_user['user_id']).all()
+            assert [e.category_id for e in events] == [budgeted_user['groceries']]
+            assert alerts(budgeted_user['user_id']) == []
+
+    def test_income_and_uncategorized_queue_nothing(self, client, app, budgeted_user):
+        """Only more spending in a category can push a budget over."""
+        client.post('/transactions/add', data={
+            'amount': '50', 'date': '2026-03-05', 'description': 'Refund',
+            'account_id': budgeted_user['account_id'], 'category_id': budgeted_user['food'], 'type': 'income'
+        })
+        add_expense(client, budgeted_user, 20, '')
+
+        with app.app_context():
+            assert BudgetEvent.query.filter_by(user_id=budgeted_user['user_id']).count() == 0
+
+    def test_unbudgeted_categories_queue_nothing(self, client, app, budgeted_user):
+        """Spending no budget covers leaves the queue empty, even when no worker runs."""
+        with app.app_context():
+            fun = Category(user_id=budgeted_user['user_id'], name='Fun', category_type='expense')
+            db.session.add(fun)
+            db.session.commit()
+            fun_id = fun.id
+
+        add_expense(client, budgeted_user, 20, fun_id)
+        add_expense(client, budgeted_user, 20, budgeted_user['food'])
+
+        with app.app_context():
+            events = BudgetEvent.query.filter_by(user_id=budgeted_user['user_id']).all()
+            assert [e.category_id for e in events] == [budgeted_user['food']]
+
+
+class TestWorker:
+    """Tests for turning events into alerts."""
+
+    def test_thresholds_alert_once_per_period(self, client, app, budgeted_user):
+        """80% and 100% each alert once; more spending in the period adds nothing."""
+        add_expense(client, budgeted_user, 85, budgeted_user['groceries'])
+        with app.app_context():
+            result = budget_alerts.process_events(today=date(2026, 3, 31))
+            assert (result.events, result.budgets, result.alerts) == (1, 1, 1)
+            assert alerts(budgeted_user['user_id']) == [(80, 85)]
+            assert BudgetEvent.query.count() == 0
+
+        add_expense(client, budgeted_user, 20, budgeted_user['food'])
+        add_expense(client, budgeted_user, 5, budgeted_user['groceries'])
+        with app.app_context():
+            assert budget_alerts.process_events(today=date(2026, 3, 31)).alerts == 1
+            assert alerts(budgeted_user['user_id']) == [(80, 85), (100, 110)]
+
+        add_expense(client, budgeted_user, 5, budgeted_user['groceries'])
+        with app.app_context():
+            result = budget_alerts.process_events(today=date(2026, 3, 31))
+            assert (result.events, result.alerts) == (1, 0)
+
+    def test_only_touched_budgets_are_evaluated(self, client, app, budgeted_user):
+        """A budget over an untouched category is left alone, even if it is over."""
+        with app.app_context():
+            fun = Category(user_id=budgeted_user['user_id'], name='Fun', category_type='expense')
+            db.session.add(fun)
+            db.session.flush()
+            db.session.add(Budget(user_id=budgeted_user['user_id'], category_id=fun.id, amount=10))
+            db.session.commit()
+            fun_id = fun.id
+
+        add_expense(client, budgeted_user, 50, fun_id)
+        add_expense(client, budgeted_user, 1, budgeted_user['groceries'])
+        with app.app_context():
+            BudgetEvent.query.filter_by(category_id=fun_id).delete()
+            db.session.commit()
+
+            result = budget_alerts.process_events(today=date(2026, 3, 31))
+            assert (result.budgets, result.alerts) == (1, 0)
+
+    def test_batches(self, client, app, budgeted_user):
+        """Events are handled a batch at a time until none are left."""
+        for _ in range(5):
+            add_expense(client, budgeted_user, 20, budgeted_user['groceries'])
+        with app.app_context():
+            result = budget_alerts.process_events(today=date(2026, 3, 31), batch_size=2)
+            assert result.events == 5
+            assert alerts(budgeted_user['user_id']) == [(80, 100), (100, 100)]
+
+        html = client.get('/budgets/').get_data(as_text=True)
+        assert 'reached 100% of its budget' in html
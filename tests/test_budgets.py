@@ -0,0 +1,185 @@
+"""
+Test Budgets
+
+Each budget's spending is added up for its own period (week, month or
+year), including subcategories, for all budgets in one query.
+"""
+from datetime import date
+import pytest
+from sqlalchemy import event
+from app import create_app
+from models import db, User, Account, Category, Budget, Transaction
+from services import budgets
+
+
+@pytest.fixture
+def app():
+    """Create a test app."""
+    app = create_app('testing')
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    app.config['TESTING'] = True
+    app.config['WTF_CSRF_ENABLED'] = False
+
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    """Create a test client."""
+    return app.test_client()
+
+
+@pytest.fixture
+def logged_in_user(client, app):
+    """Create and login a user with an account and Food > Groceries, Fun categories."""
+    with app.app_context():
+        user = User(name='Test User', email='test@example.com')
+        user.set_password('password123')
+        db.session.add(user)
+        db.session.flush()
+
+        account = Account(user_id=user.id, name='Checking', account_type='bank', balance=1000.00)
+        food = Category(user_id=user.id, name='Food', category_type='expense')
+        fun = Category(user_id=user.id, name='Fun', category_type='expense')
+        db.session.add_all([account, food, fun])
+        db.session.flush()
+        groceries = Category(user_id=user.id, name='Groceries', category_type='expense', parent_id=food.id)
+        db.session.add(groceries)
+        db.session.commit()
+
+        data = {
+            'user_id': user.id,
+            'account_id': account.id,
+            'food': food.id,
+            'fun': fun.id,
+            'groceries': groceries.id,
+        }
+
+    client.post('/auth/login', data={
+        'email': 'test@example.com',
+        'password': 'password123'
+    })
+    return data
+
+
+def spend(account_id, category_id, amount, on_date):
+    """Add an expense (call inside an app context)."""
+    db.session.add(Transaction(account_id=account_id, category_id=category_id, amount=-amount,
+                               date=on_date, description='Spent'))
+    db.session.commit()
+
+
+class TestPeriods:
+    """Tests for the period windows."""
+
+    def test_windows(self):
+        """Weeks run Monday to Sunday, months and years are calendar ones."""
+        wednesday = date(2026, 3, 4)
+        assert budgets.period_window('weekly', wednesday) == (date(2026, 3, 2), date(2026, 3, 8))
+        assert budgets.period_window('monthly', date(2024, 2, 10)) == (date(2024, 2, 1), date(2024, 2, 29))
+        assert budgets.period_window('yearly', wednesday) == (date(2026, 1, 1), date(2026, 12, 31))
+
+
+class TestEvaluate:
+    """Tests for adding up spending per budget."""
+
+    def test_each_budget_uses_its_own_period(self, app, logged_in_user):
+        """Weekly, monthly and yearly budgets only count their own window."""
+        with app.app_context():
+            account = logged_in_user['account_id']
+            spend(account, logged_in_user['groceries'], 40, date(2026, 3, 3))   # this week, under Food
+            spend(account, logged_in_user['food'], 10, date(2026, 2, 27))       # last week, last month
+            spend(account, logged_in_user['fun'], 30, date(2026, 3, 2))
+            spend(account, logged_in_user['fun'], 25, date(2026, 1, 15))
+            db.session.add_all([
+                Budget(user_id=logged_in_user['user_id'], category_id=logged_in_user['food'],
+                       amount=45, period='weekly'),
+                Budget(user_id=logged_in_user['user_id'], category_id=logged_in_user['fun'],
+                       amount=50, period='yearly'),
+                Budget(user_id=logged_in_user['user_id'], category_id=logged_in_user['groceries'],
+                       amount=100, period='monthly'),
+            ])
+            db.session.commit()
+
+            statuses = budgets.evaluate(logged_in_user['user_id'], date(2026, 3, 4))
+            assert [(s.name, s.period, s.spent, s.level) for s in statuses] == [
+                ('Food', 'weekly', 40, 'warning'),
+                ('Fun', 'yearly', 55, 'over'),
+                ('Groceries', 'monthly', 40, 'ok'),
+            ]
+            assert statuses[1].percent == 110
+
+    def test_one_query_for_any_number_of_budgets(self, app, logged_in_user):
+        """Evaluating many budgets costs the same single query as evaluating one."""
+        with app.app_context():
+            user_id = logged_in_user['user_id']
+            db.session.add(Budget(user_id=user_id, category_id=logged_in_user['fun'], amount=10))
+            db.session.commit()
+            statements = []
+            listener = lambda *args: statements.append(args[2])
+            event.listen(db.engine, 'before_cursor_execute', listener)
+            try:
+                assert len(budgets.evaluate(user_id, date(2026, 3, 4))) == 1
+
+                for i in range(50):
+                    category = Category(user_id=user_id, name=f'Extra {i:02d}', category_type='expense')
+                    category.budget = Budget(user_id=user_id, amount=10, period=budgets.PERIODS[i % 3])
+                    db.session.add(category)
+                db.session.commit()
+                before = len(statements)
+                assert len(budgets.evaluate(user_id, date(2026, 3, 4))) == 51
+                assert len(statements) - before == 1
+            finally:
+                event.remove(db.engine, 'before_cursor_execute', listener)
+
+
+class TestBudgetPages:
+    """Tests for the budgets page and the dashboard widget."""
+
+    def test_set_replace_and_delete(self, client, app, logged_in_user):
+        """A category has one budget; setting it again replaces it."""
+        client.post('/budgets/', data={'category_id': logged_in_user['fun'], 'amount': '100', 'period': 'monthly'})
+        client.post('/budgets/', data={'category_id': logged_in_user['fun'], 'amount': '80', 'period': 'weekly'})
+
+        with app.app_context():
+            budget = Budget.query.filter_by(user_id=logged_in_user['user_id']).one()
+            assert (budget.amount, budget.period) == (80, 'weekly')
+            budget_id = budget.id
+
+        html = client.get('/budgets/').get_data(as_text=True)
+        assert 'Fun' in html and 'weekly' in html
+
+        client.post(f'/budgets/delete/{budget_id}')
+        with app.app_context():
+            assert Budget.query.filter_by(user_id=logged_in_user['user_id']).count() == 0
+
+    def test_other_users_category_is_rejected(self, client, app, logged_in_user):
+        """Budgets can only be set on your own expense categories."""
+        with app.app_context():
+            other = User(name='Other', email='other@example.com')
+            other.set_password('password123')
+            db.session.add(other)
+            db.session.flush()
+            foreign = Category(user_id=other.id, name='Theirs', category_type='expense')
+            db.session.add(foreign)
+            db.session.commit()
+            foreign_id = foreign.id
+
+        client.post('/budgets/', data={'category_id': foreign_id, 'amount': '10', 'period': 'monthly'})
+        with app.app_context():
+            assert Budget.query.filter_by(category_id=foreign_id).count() == 0
+
+    def test_dashboard_widget(self, client, app, logged_in_user):
+        """The dashboard shows the budgets of the selected month."""
+        with app.app_context():
+            spend(logged_in_user['account_id'], logged_in_user['fun'], 30, date(2026, 3, 10))
+            db.session.add(Budget(user_id=logged_in_user['user_id'], category_id=logged_in_user['fun'],
+                                  amount=40, period='monthly'))
+            db.session.commit()
+
+        html = client.get('/?year=2026&month=3').get_data(as_text=True)
+        assert '$30.00 of $40.00' in html
+        assert '(75%)' in html
@@ -302,6 +302,151 @@ class TestDeleteCategory:
             assert transaction.category_id == category2_id
 
 
+class TestTransactionCounts:
+    """Category.transaction_count follows every way transactions are written."""
+    
+    @pytest.fixture
+    def categories(self, app, logged_in_user):
+        """An account and two expense categories; returns their ids."""
+        with app.app_context():
+            account = Account(user_id=logged_in_user, name='Checking', account_type='bank', balance=1000)
+            food = Category(user_id=logged_in_user, name='Food', category_type='expense')
+            fun = Category(user_id=logged_in_user, name='Fun', category_type='expense')
+            db.session.add_all([account, food, fun])
+            db.session.commit()
+            return {'account': account.id, 'food': food.id, 'fun': fun.id}
+    
+    def assert_counts_match(self, ids):
+        """Stored counts equal a real COUNT(*) (call inside an app context)."""
+        for category_id in (ids['food'], ids['fun']):
+            stored = db.session.get(Category, category_id).transaction_count
+            assert stored == Transaction.query.filter_by(category_id=category_id).count()
+    
+    def test_counts_follow_single_and_bulk_writes(self, client, app, categories):
+        """Adding, editing, deleting, bulk recategorizing and deleting keep the counts right."""
+        ids = categories
+        for amount, description in (('10', 'Lunch'), ('0', 'Free sample'), ('25', 'Dinner')):
+            client.post('/transactions/add', data={
+                'amount': amount, 'date': '2026-03-05', 'description': description,
+                'account_id': ids['account'], 'category_id': ids['food'], 'type': 'expense'
+            })
+        with app.app_context():
+            assert db.session.get(Category, ids['food']).transaction_count == 3
+            lunch = Transaction.query.filter_by(description='Lunch').one()
+            dinner_id = Transaction.query.filter_by(description='Dinner').one().id
+            lunch.category_id = ids['fun']
+            db.session.commit()
+            self.assert_counts_match(ids)
+        
+        client.post(f'/transactions/delete/{dinner_id}')
+        with app.app_context():
+            self.assert_counts_match(ids)
+        
+        client.post('/transactions/bulk', data={
+            'action': 'recategorize', 'category': ids['food'], 'category_id': ids['fun']
+        })
+        with app.app_context():
+            assert db.session.get(Category, ids['fun']).transaction_count == 2
+            self.assert_counts_match(ids)
+        
+        client.post('/transactions/bulk', data={'action': 'delete', 'category': ids['fun']})
+        with app.app_context():
+            assert db.session.get(Category, ids['fun']).transaction_count == 0
+            self.assert_counts_match(ids)
+    
+    def test_counts_follow_category_and_account_deletes(self, client, app, categories):
+        """Moving a deleted category's transactions adds them up; deleting the account removes them."""
+        ids = categories
+        with app.app_context():
+            for amount, category in ((-5, 'food'), (0, 'food'), (-7, 'fun')):
+                db.session.add(Transaction(account_id=ids['account'], category_id=ids[category],
+                                           amount=amount, description='x', date=date.today()))
+            db.session.commit()
+        
+        client.post(f'/categories/delete/{ids["food"]}', data={'new_category_id': str(ids['fun'])})
+        with app.app_context():
+            assert db.session.get(Category, ids['fun']).transaction_count == 3
+        
+        client.post(f'/accounts/delete/{ids["account"]}')
+        with app.app_context():
+            assert db.session.get(Category, ids['fun']).transaction_count == 0
+    
+    def test_list_page_does_not_count(self, client, app, categories):
+        """The categories page shows the stored counts with one query for all categories."""
+        from sqlalchemy import event
+        with app.app_context():
+            db.session.add(Transaction(account_id=categories['account'], category_id=categories['food'],
+                                       amount=-5, description='x', date=date.today()))
+            db.session.commit()
+            statements = []
+            
+            def record(conn, cursor, statement, *args):
+                statements.append(statement)
+            event.listen(db.engine, 'before_cursor_execute', record)
+            try:
+                response = client.get('/categories/')
+            finally:
+                event.remove(db.engine, 'before_cursor_execute', record)
+        
+        assert b'1 transaction\n' in response.data
+        assert not any('count(' in statement.lower() for statement in statements)
+        assert sum('FROM categories' in statement for statement in statements) == 1
+
+
+class TestBatchedCategoryMove:
+    """Big categories are emptied in short, separately committed batches."""
+    
+    @pytest.fixture
+    def big_category(self, app, logged_in_user):
+        """A category with 25 transactions over three months, and an empty one."""
+        with app.app_context():
+            account = Account(user_id=logged_in_user, name='Checking', account_type='bank', balance=0)
+            big = Category(user_id=logged_in_user, name='Big', category_type='expense')
+            other = Category(user_id=logged_in_user, name='Other', category_type='expense')
+            db.session.add_all([account, big, other])
+            db.session.flush()
+            db.session.add_all([
+                Transaction(account_id=account.id, category_id=big.id, amount=-(i + 1),
+                            description=f'Row {i}', date=date(2026, 1 + i % 3, 1))
+                for i in range(25)
+            ])
+            db.session.commit()
+            return {'user_id': logged_in_user, 'big': big.id, 'other': other.id}
+    
+    def test_moves_in_batches_and_stays_consistent(self, app, big_category):
+        """Every batch leaves counts and rollups matching the transactions."""
+        from services.bulk_actions import move_category_in_batches
+        from services.rollups import month_aggregates
+        ids = big_category
+        with app.app_context():
+            seen = []
+            
+            def progress(moved, total):
+                seen.append((moved, total))
+                for category_id in (ids['big'], ids['other']):
+                    stored = db.session.get(Category, category_id).transaction_count
+                    assert stored == Transaction.query.filter_by(category_id=category_id).count()
+            
+            moved = move_category_in_batches(ids['user_id'], ids['big'], ids['other'],
+                                             batch_size=10, progress=progress)
+            
+            assert moved == 25
+            assert seen == [(10, 25), (20, 25), (25, 25)]
+            spending = {row.name: row.total for row in month_aggregates(ids['user_id'], 2026, 1)[2]}
+            assert spending == {'Other': -sum(i + 1 for i in range(0, 25, 3))}
+    
+    def test_delete_route_moves_in_batches(self, client, app, big_category):
+        """Deleting the category moves everything, whatever the batch size."""
+        ids = big_category
+        app.config['CATEGORY_MOVE_BATCH_SIZE'] = 7
+        client.post(f'/categories/delete/{ids["big"]}', data={'new_category_id': 'none'})
+        
+        with app.app_context():
+            assert db.session.get(Category, ids['big']) is None
+            moved = Transaction.query.filter(Transaction.description.like('Row %'))
+            assert {t.category_id for t in moved} == {None} and moved.count() == 25
+
+
 class TestCategoryValidation:
     """Tests for category validation."""
     
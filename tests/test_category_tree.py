@@ -0,0 +1,230 @@
+"""
+Test Category Tree
+
+Parent categories are stored as a closure table (CategoryPath). The paths
+must follow every add, move and delete, and the dashboard totals of a
+parent include everything under it.
+"""
+from datetime import date
+import pytest
+from app import create_app
+from models import db, User, Account, Category, CategoryPath, Transaction
+from services import category_tree
+from services.dashboard_cache import dashboard_cache
+from services.rollups import month_aggregates
+
+
+@pytest.fixture
+def app():
+    """Create a test app."""
+    app = create_app('testing')
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    app.config['TESTING'] = True
+    app.config['WTF_CSRF_ENABLED'] = False
+
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    """Create a test client."""
+    return app.test_client()
+
+
+@pytest.fixture
+def tree(client, app):
+    """Create and login a user with Food > Groceries > Organic, Food > Dining and Fun."""
+    with app.app_context():
+        user = User(name='Test User', email='test@example.com')
+        user.set_password('password123')
+        db.session.add(user)
+        db.session.flush()
+
+        account = Account(user_id=user.id, name='Checking', account_type='bank', balance=1000.00)
+        food = Category(user_id=user.id, name='Food', category_type='expense')
+        fun = Category(user_id=user.id, name='Fun', category_type='expense')
+        db.session.add_all([account, food, fun])
+        db.session.flush()
+        groceries = Category(user_id=user.id, name='Groceries', category_type='expense', parent_id=food.id)
+        dining = Category(user_id=user.id, name='Dining', category_type='expense', parent_id=food.id)
+        db.session.add_all([groceries, dining])
+        db.session.flush()
+        organic = Category(user_id=user.id, name='Organic', category_type='expense', parent_id=groceries.id)
+        db.session.add(organic)
+        db.session.commit()
+
+        data = {
+            'user_id': user.id,
+            'account_id': account.id,
+            'food': food.id,
+            'fun': fun.id,
+            'groceries': groceries.id,
+            'dining': dining.id,
+            'organic': organic.id,
+        }
+
+    client.post('/auth/login', data={
+        'email': 'test@example.com',
+        'password': 'password123'
+    })
+    return data
+
+
+def paths(ids):
+    """The closure rows between the given categories as {(ancestor, descendant): depth}."""
+    return {
+        (p.ancestor_id, p.descendant_id): p.depth
+        for p in CategoryPath.query.filter(CategoryPath.descendant_id.in_(ids)).all()
+    }
+
+
+def spend(account_id, category_id, amount, description='Spent'):
+    """Add an expense in March 2026 (call inside an app context)."""
+    db.session.add(Transaction(account_id=account_id, category_id=category_id, amount=-amount,
+                               date=date(2026, 3, 10), description=description))
+    db.session.commit()
+
+
+def chart_labels(response):
+    """The pie chart labels written into the dashboard page."""
+    return response.get_data(as_text=True).split('const chartLabels = ')[1].split(';')[0]
+
+
+class TestPaths:
+    """Tests for keeping the closure table in sync."""
+
+    def test_new_categories_get_all_ancestor_paths(self, app, tree):
+        """Each category has a path to itself and to every category above it."""
+        with app.app_context():
+            food, groceries, organic = tree['food'], tree['groceries'], tree['organic']
+            assert paths([food, groceries, organic]) == {
+                (food, food): 0,
+                (food, groceries): 1,
+                (food, organic): 2,
+                (groceries, groceries): 0,
+                (groceries, organic): 1,
+                (organic, organic): 0,
+            }
+            assert [c.name for c in category_tree.ancestors(organic)] == ['Food', 'Groceries', 'Organic']
+
+    def test_moving_a_category_moves_its_subtree(self, app, tree):
+        """Groceries (with Organic) moved under Fun leaves Food behind."""
+        with app.app_context():
+            db.session.get(Category, tree['groceries']).parent_id = tree['fun']
+            db.session.commit()
+
+            assert category_tree.is_below(tree['organic'], tree['fun'])
+            assert not category_tree.is_below(tree['organic'], tree['food'])
+            assert paths([tree['organic']])[(tree['fun'], tree['organic'])] == 2
+
+            db.session.get(Category, tree['groceries']).parent_id = None
+            db.session.commit()
+            assert paths([tree['organic']]) == {
+                (tree['groceries'], tree['organic']): 1,
+                (tree['organic'], tree['organic']): 0,
+            }
+
+    def test_deleting_a_category_moves_children_up(self, app, tree):
+        """Organic ends up directly under Food when Groceries is deleted."""
+        with app.app_context():
+            db.session.delete(db.session.get(Category, tree['groceries']))
+            db.session.commit()
+
+            assert db.session.get(Category, tree['organic']).parent_id == tree['food']
+            assert paths([tree['organic']]) == {
+                (tree['food'], tree['organic']): 1,
+                (tree['organic'], tree['organic']): 0,
+            }
+
+
+class TestSubtreeTotals:
+    """Tests for spending per level of the tree."""
+
+    def test_parent_totals_include_subcategories(self, app, tree):
+        """Food's slice is everything under it; drilling in shows its children."""
+        with app.app_context():
+            spend(tree['account_id'], tree['organic'], 30)
+            spend(tree['account_id'], tree['groceries'], 20)
+            spend(tree['account_id'], tree['dining'], 15)
+            spend(tree['account_id'], tree['food'], 5)
+            spend(tree['account_id'], tree['fun'], 10)
+            spend(tree['account_id'], None, 1)
+
+            income, spending, top = month_aggregates(tree['user_id'], 2026, 3)
+            assert spending == -81
+            assert {row.name: (row.total, row.has_children) for row in top} == {
+                'Food': (-70, True), 'Fun': (-10, False), 'Uncategorized': (-1, False)
+            }
+
+            _, spending, food = month_aggregates(tree['user_id'], 2026, 3, parent_id=tree['food'])
+            assert spending == -81
+            assert {row.name: row.total for row in food} == {
+                'Groceries': -50, 'Dining': -15, 'Food (other)': -5
+            }
+
+    def test_dashboard_drills_down(self, client, app, tree):
+        """?category= shows the subcategories with a breadcrumb; moves refresh the cached pie."""
+        with app.app_context():
+            spend(tree['account_id'], tree['organic'], 30)
+            spend(tree['account_id'], tree['dining'], 15)
+
+        labels = chart_labels(client.get('/?year=2026&month=3'))
+        assert 'Food' in labels and 'Dining' not in labels
+
+        response = client.get(f'/?year=2026&month=3&category={tree["food"]}')
+        labels = chart_labels(response)
+        assert 'Groceries' in labels and 'Dining' in labels
+        assert 'All categories' in response.get_data(as_text=True)
+
+        with app.app_context():
+            db.session.get(Category, tree['dining']).parent_id = None
+            db.session.commit()
+            assert dashboard_cache.get(tree['user_id'], 2026, 3) is None
+
+        assert 'Dining' in chart_labels(client.get('/?year=2026&month=3'))
+
+    def test_renaming_a_parent_refreshes_the_cached_pie(self, client, app, tree):
+        """A parent labels its subtree's slice, so renaming it drops months it only has through children."""
+        with app.app_context():
+            spend(tree['account_id'], tree['organic'], 30)
+
+        assert 'Food' in chart_labels(client.get('/?year=2026&month=3'))
+
+        with app.app_context():
+            db.session.get(Category, tree['food']).name = 'Eating'
+            db.session.commit()
+            assert dashboard_cache.get(tree['user_id'], 2026, 3) is None
+
+        assert 'Eating' in chart_labels(client.get('/?year=2026&month=3'))
+
+
+class TestCategoryForms:
+    """Tests for picking a parent on the category pages."""
+
+    def test_parent_is_validated(self, client, app, tree):
+        """A category can't move under itself or under a category of the other type."""
+        client.post(f'/categories/edit/{tree["food"]}', data={
+            'name': 'Food', 'category_type': 'expense', 'parent_id': str(tree['organic'])
+        })
+        client.post('/categories/add', data={
+            'name': 'Salary', 'category_type': 'income', 'parent_id': str(tree['food'])
+        })
+        client.post('/categories/add', data={
+            'name': 'Bakery', 'category_type': 'expense', 'parent_id': str(tree['groceries'])
+        })
+
+        with app.app_context():
+            assert db.session.get(Category, tree['food']).parent_id is None
+            assert Category.query.filter_by(user_id=tree['user_id'], name='Salary').first() is None
+            bakery = Category.query.filter_by(user_id=tree['user_id'], name='Bakery').one()
+            assert bakery.parent_id == tree['groceries']
+            assert category_tree.is_below(bakery.id, tree['food'])
+
+    def test_list_shows_tree_order(self, client, tree):
+        """Subcategories are listed right under their parent."""
+        html = client.get('/categories/').data.decode()
+        positions = [html.index(f'>{name}<') for name in ('Food', 'Groceries', 'Organic', 'Dining', 'Fun')]
+        assert positions == sorted(positions)
@@ -0,0 +1,316 @@
+"""
+Test Dashboard Calculations
+
+Tests for the dashboard numbers (balances as of a month, monthly totals)
+and for the number of database queries a dashboard load costs.
+"""
+import pytest
+from contextlib import contextmanager
+from sqlalchemy import event
+from app import create_app
+from models import db, User, Account, Transaction, Category
+from services.balances import balances_at_month
+from services import rollups
+from services.dashboard_cache import DashboardCache, dashboard_cache
+from datetime import date
+
+
+@pytest.fixture
+def app():
+    """Create a test app."""
+    app = create_app('testing')
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    app.config['TESTING'] = True
+    app.config['WTF_CSRF_ENABLED'] = False
+
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    """Create a test client."""
+    return app.test_client()
+
+
+@pytest.fixture
+def logged_in_user(client, app):
+    """Create and login a user with one account and one expense category."""
+    with app.app_context():
+        user = User(name='Test User', email='test@example.com')
+        user.set_password('password123')
+        db.session.add(user)
+        db.session.flush()
+
+        account = Account(
+            user_id=user.id,
+            name='Checking',
+            account_type='bank',
+            balance=1000.00,
+            starting_balance=1000.00,
+            starting_date=date(2026, 1, 1),
+            currency='USD'
+        )
+        category = Category(user_id=user.id, name='Food', category_type='expense')
+        db.session.add_all([account, category])
+        db.session.commit()
+
+        data = {'user_id': user.id, 'account_id': account.id, 'category_id': category.id}
+
+    client.post('/auth/login', data={
+        'email': 'test@example.com',
+        'password': 'password123'
+    })
+
+    return data
+
+
+def add_transaction(account_id, amount, on_date, category_id=None, description=''):
+    """Insert a transaction and keep the account balance in sync."""
+    account = db.session.get(Account, account_id)
+    db.session.add(Transaction(
+        account_id=account_id,
+        category_id=category_id,
+        amount=amount,
+        date=on_date,
+        description=description
+    ))
+    account.balance += amount
+    db.session.commit()
+
+
+@contextmanager
+def count_queries():
+    """Count the SQL statements executed inside the block."""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+
+
+def add_accounts(user_id, count):
+    """Add `count` extra accounts, each with one transaction in March 2026."""
+    for i in range(count):
+        account = Account(
+            user_id=user_id,
+            name=f'Extra {i}',
+            account_type='bank',
+            balance=100.00,
+            starting_date=date(2026, 1, 1)
+        )
+        db.session.add(account)
+        db.session.flush()
+        add_transaction(account.id, -10.00, date(2026, 3, 5))
+
+
+class TestBalancesAt:
+    """Tests for the balance engine."""
+
+    def test_balance_excludes_later_transactions(self, app, logged_in_user):
+        """Balance at the end of a month ignores transactions after it."""
+        account_id = logged_in_user['account_id']
+        with app.app_context():
+            add_transaction(account_id, -100.00, date(2026, 2, 10))
+            add_transaction(account_id, -50.00, date(2026, 3, 10))
+            add_transaction(account_id, 200.00, date(2026, 4, 1))
+
+            account = db.session.get(Account, account_id)
+            assert account.balance == 1050.00
+            assert balances_at_month([account], 2026, 2) == {account_id: 900.00}
+            assert balances_at_month([account], 2026, 3) == {account_id: 850.00}
+            assert balances_at_month([account], 2026, 4) == {account_id: 1050.00}
+
+    def test_account_not_yet_opened_is_none(self, app, logged_in_user):
+        """Accounts opened after the date have no balance."""
+        with app.app_context():
+            account = db.session.get(Account, logged_in_user['account_id'])
+            assert balances_at_month([account], 2025, 12) == {account.id: None}
+
+    def test_dashboard_shows_balance_at_month(self, client, app, logged_in_user):
+        """Dashboard balance uses the selected month, not today."""
+        with app.app_context():
+            add_transaction(logged_in_user['account_id'], -100.00, date(2026, 2, 10))
+            add_transaction(logged_in_user['account_id'], -50.00, date(2026, 3, 10))
+
+        html = client.get('/?year=2026&month=2').data.decode()
+        assert '$900.00' in html
+
+
+class TestDashboardQueryCount:
+    """The dashboard should cost the same number of queries for any account count."""
+
+    def test_query_count_independent_of_accounts(self, client, app, logged_in_user):
+        """Adding accounts does not add queries to a dashboard load."""
+        client.get('/?year=2026&month=3')  # warm up session/user loading
+        with app.app_context():
+            dashboard_cache.clear()
+            with count_queries() as few_accounts:
+                client.get('/?year=2026&month=3')
+
+            add_accounts(logged_in_user['user_id'], 15)
+
+            dashboard_cache.clear()
+            with count_queries() as many_accounts:
+                client.get('/?year=2026&month=3')
+
+        assert len(many_accounts) == len(few_accounts)
+
+
+class TestMonthAggregates:
+    """Income, spending and spending by category from one query."""
+
+    def test_totals_and_categories_in_one_query(self, app, logged_in_user):
+        """One statement returns all three dashboard aggregates."""
+        data = logged_in_user
+        with app.app_context():
+            add_transaction(data['account_id'], -30.00, date(2026, 3, 2), category_id=data['category_id'])
+            add_transaction(data['account_id'], -20.00, date(2026, 3, 9), category_id=data['category_id'])
+            add_transaction(data['account_id'], 500.00, date(2026, 3, 1))
+
+            with count_queries() as statements:
+                income, spending, by_category = rollups.month_aggregates(data['user_id'], 2026, 3)
+
+            assert len(statements) == 1
+            assert income == 500.00
+            assert spending == -50.00
+            assert [(row.name, row.total) for row in by_category] == [('Food', -50.00)]
+
+    def test_uncategorized_spending_gets_its_own_bucket(self, client, app, logged_in_user):
+        """Spending without a category is no longer dropped from the chart."""
+        data = logged_in_user
+        with app.app_context():
+            add_transaction(data['account_id'], -30.00, date(2026, 3, 2), category_id=data['category_id'])
+            add_transaction(data['account_id'], -12.50, date(2026, 3, 4))
+
+            income, spending, by_category = rollups.month_aggregates(data['user_id'], 2026, 3)
+
+            assert spending == -42.50
+            assert ('Uncategorized', -12.50) in [(row.name, row.total) for row in by_category]
+
+        html = client.get('/?year=2026&month=3').data.decode()
+        assert 'Uncategorized' in html
+
+
+class TestDashboardCache:
+    """Tests for the per-user dashboard cache."""
+
+    def test_second_visit_is_a_cache_hit(self, client, app, logged_in_user):
+        """Visiting the same month twice computes it once."""
+        dashboard_cache.clear()
+        client.get('/?year=2026&month=3')
+        client.get('/?year=2026&month=3')
+
+        stats = dashboard_cache.stats()
+        assert stats['misses'] == 1
+        assert stats['hits'] == 1
+
+    def test_transaction_drops_its_month_and_later(self, client, app, logged_in_user):
+        """A new transaction in March drops March and April but keeps February."""
+        user_id = logged_in_user['user_id']
+        for month in (2, 3, 4):
+            client.get(f'/?year=2026&month={month}')
+
+        client.post('/transactions/add', data={
+            'amount': '100.00',
+            'date': '2026-03-15',
+            'account_id': logged_in_user['account_id'],
+            'category_id': logged_in_user['category_id'],
+            'type': 'expense'
+        })
+
+        assert dashboard_cache.get(user_id, 2026, 2) is not None
+        assert dashboard_cache.get(user_id, 2026, 3) is None
+        assert dashboard_cache.get(user_id, 2026, 4) is None
+
+        html = client.get('/?year=2026&month=3').data.decode()
+        assert '$900.00' in html  # balance end of March
+        assert '-$100.00' in html  # spent in March
+
+    def test_category_rename_drops_months_using_it(self, client, app, logged_in_user):
+        """Renaming a category drops only the months where it has spending."""
+        user_id = logged_in_user['user_id']
+        with app.app_context():
+            add_transaction(logged_in_user['account_id'], -20.00, date(2026, 3, 5),
+                            category_id=logged_in_user['category_id'])
+        client.get('/?year=2026&month=2')
+        client.get('/?year=2026&month=3')
+
+        client.post(f'/categories/edit/{logged_in_user["category_id"]}', data={
+            'name': 'Groceries',
+            'category_type': 'expense',
+        })
+
+        assert dashboard_cache.get(user_id, 2026, 2) is not None
+        assert dashboard_cache.get(user_id, 2026, 3) is None
+        assert 'Groceries' in client.get('/?year=2026&month=3').data.decode()
+
+    def test_account_change_drops_all_months(self, client, app, logged_in_user):
+        """Renaming an account drops every cached month of that user."""
+        user_id = logged_in_user['user_id']
+        client.get('/?year=2026&month=2')
+        client.get('/?year=2026&month=3')
+
+        client.post(f'/accounts/edit/{logged_in_user["account_id"]}', data={
+            'name': 'Main Checking',
+            'account_type': 'bank',
+        })
+
+        assert dashboard_cache.get(user_id, 2026, 2) is None
+        assert dashboard_cache.get(user_id, 2026, 3) is None
+
+
+class TestDashboardCacheLimits:
+    """Tests for eviction in the cache class itself."""
+
+    def test_least_recently_used_is_evicted(self):
+        """The entry not used for the longest time goes first."""
+        cache = DashboardCache(max_entries=2)
+        cache.put(1, 2026, 1, {'n': 1}, cache.generation(1))
+        cache.put(1, 2026, 2, {'n': 2}, cache.generation(1))
+        cache.get(1, 2026, 1)
+        cache.put(1, 2026, 3, {'n': 3}, cache.generation(1))
+
+        assert cache.get(1, 2026, 2) is None
+        assert cache.get(1, 2026, 1) == {'n': 1}
+        assert cache.stats()['evictions'] == 1
+
+    def test_memory_bound(self):
+        """The cache never holds more than max_bytes."""
+        cache = DashboardCache(max_entries=100, max_bytes=5000)
+        for month in range(1, 13):
+            cache.put(1, 2026, month, {'labels': ['x' * 100] * 5}, cache.generation(1))
+
+        stats = cache.stats()
+        assert 0 < stats['bytes'] <= 5000
+        assert stats['entries'] < 12
+
+    def test_entries_expire(self, monkeypatch):
+        """Writes from other processes (cron jobs) show up once the entry is max_age old."""
+        from services import dashboard_cache as module
+        now = [1000.0]
+        monkeypatch.setattr(module.time, 'monotonic', lambda: now[0])
+        cache = DashboardCache(max_age=60)
+        cache.put(1, 2026, 3, {'n': 3}, cache.generation(1))
+
+        now[0] += 60
+        assert cache.get(1, 2026, 3) == {'n': 3}
+        now[0] += 1
+        assert cache.get(1, 2026, 3) is None
+        assert cache.stats()['entries'] == 0
+
+    def test_stale_payload_is_not_stored(self):
+        """A payload computed before an invalidation is thrown away."""
+        cache = DashboardCache()
+        generation = cache.generation(1)
+        cache.invalidate(1, from_month=(2026, 1))
+        cache.put(1, 2026, 3, {'n': 3}, generation)
+
+        assert cache.get(1, 2026, 3) is None
@@ -0,0 +1,402 @@
+"""
+Test Statement Import
+
+CSV imports must write the same data a row-by-row entry would (balances,
+rollups) while only running a few statements per batch.
+"""
+import io
+import pytest
+from sqlalchemy import event
+from app import create_app
+from models import db, User, Account, Transaction, Category, MonthlyRollup
+from services import rollups
+from services.importer import import_csv, ColumnMapping, parse_amount
+from datetime import date
+
+
+@pytest.fixture
+def app():
+    """Create a test app."""
+    app = create_app('testing')
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    app.config['TESTING'] = True
+    app.config['WTF_CSRF_ENABLED'] = False
+
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    """Create a test client."""
+    return app.test_client()
+
+
+@pytest.fixture
+def user_with_account(client, app):
+    """Create and login a user with one account and a Food category."""
+    with app.app_context():
+        user = User(name='Test User', email='test@example.com')
+        user.set_password('password123')
+        db.session.add(user)
+        db.session.flush()
+        account = Account(user_id=user.id, name='Checking', account_type='bank', balance=100.00)
+        category = Category(user_id=user.id, name='Food', category_type='expense')
+        db.session.add_all([account, category])
+        db.session.commit()
+        data = {'user_id': user.id, 'account_id': account.id, 'category_id': category.id}
+
+    client.post('/auth/login', data={
+        'email': 'test@example.com',
+        'password': 'password123'
+    })
+    return data
+
+
+def upload(client, account_id, content, **mapping):
+    """POST a CSV file to the import page."""
+    form = {'account_id': account_id, 'file': (io.BytesIO(content.encode()), 'statement.csv')}
+    form.update(mapping)
+    return client.post('/transactions/import', data=form, content_type='multipart/form-data')
+
+
+def rollup_totals(user_id):
+    """A user's rollup rows as {key: (income, expense, income_count, expense_count)}."""
+    return {
+        (r.account_id, r.category_id, r.year, r.month):
+            (round(r.income_total, 2), round(r.expense_total, 2), r.income_count, r.expense_count)
+        for r in MonthlyRollup.query.filter_by(user_id=user_id).all()
+    }
+
+
+class TestCsvImport:
+    """Tests for importing CSV statements."""
+
+    def test_import_updates_balance_and_rollups(self, client, app, user_with_account):
+        """Imported rows change the balance and rollups like added rows would."""
+        data = user_with_account
+        response = upload(client, data['account_id'],
+                          'Date,Amount,Description,Category\n'
+                          '2026-03-01,2500.00,Salary,\n'
+                          '2026-03-02,-12.50,Lunch,food\n'
+                          '2026-04-01,-40.00,Dinner,Food\n')
+
+        assert b'Imported 3 transactions' in response.data
+        with app.app_context():
+            assert db.session.get(Account, data['account_id']).balance == 100.00 + 2447.50
+            lunch = Transaction.query.filter_by(description='Lunch').one()
+            assert lunch.category_id == data['category_id']
+
+            incremental = rollup_totals(data['user_id'])
+            rollups.rebuild(data['user_id'])
+            db.session.commit()
+            assert incremental == rollup_totals(data['user_id'])
+
+    def test_bad_rows_are_skipped_and_reported(self, client, app, user_with_account):
+        """Invalid rows are listed by line number; the good ones are imported."""
+        response = upload(client, user_with_account['account_id'],
+                          'date,amount,description\n'
+                          '2026-03-01,-5.00,Coffee\n'
+                          'yesterday,-5.00,Bad date\n'
+                          '2026-03-03,lots,Bad amount\n')
+
+        html = response.data.decode()
+        assert 'Imported 1 transactions' in html
+        assert 'Line 3: invalid date' in html
+        assert 'Line 4: invalid amount' in html
+        with app.app_context():
+            assert Transaction.query.filter_by(account_id=user_with_account['account_id']).count() == 1
+
+    def test_custom_mapping(self, client, app, user_with_account):
+        """Other column names, debit/credit columns, day-first dates and decimal commas."""
+        upload(client, user_with_account['account_id'],
+               'Buchungstag;Soll;Haben;Text\n'.replace(';', ',') +
+               '05.03.2026,"1.234,50",,Miete\n'
+               '06.03.2026,,"99,00",Erstattung\n',
+               date_column='Buchungstag', debit_column='Soll', credit_column='Haben',
+               description_column='Text', date_format='%d.%m.%Y', decimal=',')
+
+        with app.app_context():
+            rows = Transaction.query.order_by(Transaction.date).all()
+            rows = [(t.date, t.amount, t.description) for t in rows
+                    if t.account_id == user_with_account['account_id']]
+            assert rows == [(date(2026, 3, 5), -1234.50, 'Miete'),
+                            (date(2026, 3, 6), 99.00, 'Erstattung')]
+
+    def test_amounts_are_rounded_to_the_account_currency(self, client, app, user_with_account):
+        """A yen account gets whole yen, in the row, the balance and the fingerprint."""
+        with app.app_context():
+            account = db.session.get(Account, user_with_account['account_id'])
+            account.currency = 'JPY'
+            db.session.commit()
+
+        upload(client, user_with_account['account_id'], 'date,amount,description\n2026-03-01,-1234.50,Ramen\n')
+        response = upload(client, user_with_account['account_id'], 'date,amount,description\n2026-03-01,-1235,Ramen\n')
+
+        assert b'1 duplicates skipped' in response.data
+        with app.app_context():
+            assert Transaction.query.filter_by(description='Ramen').one().amount == -1235
+            assert db.session.get(Account, user_with_account['account_id']).balance == 100 - 1235
+
+    def test_missing_column(self, client, app, user_with_account):
+        """A file without the mapped columns imports nothing."""
+        html = upload(client, user_with_account['account_id'], 'when,what\n2026-03-01,x\n').data.decode()
+        assert 'missing column(s): date, amount' in html
+
+    def test_cannot_import_into_other_users_account(self, client, app, user_with_account):
+        """The target account must belong to the logged-in user."""
+        with app.app_context():
+            other = User(name='Other', email='other@example.com')
+            other.set_password('password123')
+            db.session.add(other)
+            db.session.flush()
+            account = Account(user_id=other.id, name='Other Bank', account_type='bank', balance=0)
+            db.session.add(account)
+            db.session.commit()
+            account_id = account.id
+
+        upload(client, account_id, 'date,amount\n2026-03-01,-5\n')
+        with app.app_context():
+            assert Transaction.query.filter_by(account_id=account_id).count() == 0
+
+    def test_statements_per_batch_not_per_row(self, app, user_with_account):
+        """Each batch costs one INSERT, one rollup upsert and one balance update."""
+        lines = ['date,amount,description']
+        lines += [f'2026-01-{1 + i % 28:02d},-1.00,Row {i}' for i in range(2500)]
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        with app.app_context():
+            account = db.session.get(Account, user_with_account['account_id'])
+            event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+            try:
+                result = import_csv(account, io.StringIO('\n'.join(lines)), ColumnMapping(), batch_size=1000)
+                db.session.commit()
+            finally:
+                event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+
+            assert result.imported == 2500
+            inserts = [s for s in statements if s.startswith('INSERT INTO transactions')]
+            updates = [s for s in statements if s.startswith('UPDATE accounts')]
+            assert len(inserts) == 3
+            assert len(updates) == 3
+            assert db.session.get(Account, account.id).balance == 100.00 - 2500
+
+
+OFX_SGML = """OFXHEADER:100
+DATA:OFXSGML
+VERSION:102
+
+<OFX>
+<BANKMSGSRSV1><STMTTRNRS><STMTRS>
+<CURDEF>USD
+<BANKACCTFROM><BANKID>123<ACCTID>000011113333<ACCTTYPE>CHECKING</BANKACCTFROM>
+<BANKTRANLIST>
+<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20260305120000[-5:EST]<TRNAMT>-12.50<FITID>1<NAME>Corner Cafe</STMTTRN>
+<STMTTRN><TRNTYPE>CREDIT<DTPOSTED>20260301<TRNAMT>2500.00<FITID>2<NAME>Payroll</STMTTRN>
+</BANKTRANLIST>
+</STMTRS></STMTTRNRS></BANKMSGSRSV1>
+<CREDITCARDMSGSRSV1><CCSTMTTRNRS><CCSTMTRS>
+<CCACCTFROM><ACCTID>4000000000007777</CCACCTFROM>
+<BANKTRANLIST>
+<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20260310<TRNAMT>-40.00<FITID>3<NAME>Bookshop<MEMO>Gift</STMTTRN>
+<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>notadate<TRNAMT>-1.00<FITID>4<NAME>Broken</STMTTRN>
+</BANKTRANLIST>
+</CCSTMTRS></CCSTMTTRNRS></CREDITCARDMSGSRSV1>
+</OFX>
+"""
+
+QIF_MULTI = """!Account
+NChecking
+TBank
+^
+!Type:Bank
+D03/05/2026
+T-12.50
+PCorner Cafe
+LFood:Coffee
+AMain Street 1
+AOld Town
+^
+D3/6'26
+T-100.00
+PTo savings
+L[Savings]
+^
+!Account
+NSavings
+TBank
+^
+!Type:Bank
+D03/06/2026
+T100.00
+PFrom checking
+^
+"""
+
+
+class TestStatementImport:
+    """Tests for OFX and QIF files."""
+
+    @pytest.fixture
+    def accounts(self, app, user_with_account):
+        """Add a savings account and a card account named after its number."""
+        with app.app_context():
+            savings = Account(user_id=user_with_account['user_id'], name='Savings',
+                              account_type='savings', balance=0)
+            card = Account(user_id=user_with_account['user_id'], name='Visa 7777',
+                           account_type='credit', balance=0)
+            db.session.add_all([savings, card])
+            db.session.commit()
+            return dict(user_with_account, savings_id=savings.id, card_id=card.id)
+
+    def imported(self, account_id):
+        """(date, amount, description, category_id) of an account's transactions."""
+        rows = Transaction.query.filter_by(account_id=account_id).order_by(Transaction.date).all()
+        return [(t.date, t.amount, t.description, t.category_id) for t in rows]
+
+    def test_ofx_with_two_accounts(self, client, app, accounts):
+        """Each statement goes to the matching account; unmatched ones to the picked account."""
+        response = client.post('/transactions/import', data={
+            'account_id': accounts['account_id'],
+            'file': (io.BytesIO(OFX_SGML.encode()), 'export.ofx'),
+        }, content_type='multipart/form-data')
+
+        html = response.data.decode()
+        assert 'Imported 2 transactions into Checking' in html
+        assert 'Imported 1 transactions into Visa 7777' in html
+        assert 'Line 4: invalid date' in html
+        with app.app_context():
+            assert self.imported(accounts['account_id']) == [
+                (date(2026, 3, 1), 2500.00, 'Payroll', None),
+                (date(2026, 3, 5), -12.50, 'Corner Cafe', None),
+            ]
+            assert self.imported(accounts['card_id']) == [(date(2026, 3, 10), -40.00, 'Bookshop', None)]
+            assert db.session.get(Account, accounts['card_id']).balance == -40.00
+
+    def test_ofx_xml(self, app, accounts):
+        """OFX 2 (XML, with closing tags) reads the same way."""
+        from services.statement_parsers import parse_ofx
+        xml = ('<?xml version="1.0"?><?OFX OFXHEADER="200"?><OFX><BANKACCTFROM><ACCTID>42</ACCTID>'
+               '</BANKACCTFROM><STMTTRN><DTPOSTED>20260102</DTPOSTED><TRNAMT>-3.00</TRNAMT>'
+               '<NAME>Tea &amp; Cake</NAME></STMTTRN></OFX>')
+        with app.app_context():
+            [(label, position, values)] = list(parse_ofx(io.StringIO(xml)))
+        assert label == '42'
+        assert (values['date'], values['amount'], values['description']) == \
+            (date(2026, 1, 2), -3.00, 'Tea & Cake')
+
+    def test_ofx_is_read_in_pieces(self, app, monkeypatch):
+        """Tags split across read boundaries are still parsed correctly."""
+        from services import statement_parsers
+        with app.app_context():
+            whole = list(statement_parsers.parse_ofx(io.StringIO(OFX_SGML)))
+            monkeypatch.setattr(statement_parsers, '_OFX_CHUNK', 7)
+            pieces = list(statement_parsers.parse_ofx(io.StringIO(OFX_SGML)))
+        assert len(whole) == 4
+        assert [(a, p, str(v)) for a, p, v in pieces] == [(a, p, str(v)) for a, p, v in whole]
+
+    def test_qif_with_two_accounts(self, client, app, accounts):
+        """QIF !Account sections pick the account; categories match by name."""
+        client.post('/transactions/import', data={
+            'account_id': accounts['account_id'],
+            'file': (io.BytesIO(QIF_MULTI.encode()), 'money.qif'),
+        }, content_type='multipart/form-data')
+
+        with app.app_context():
+            assert self.imported(accounts['account_id']) == [
+                (date(2026, 3, 5), -12.50, 'Corner Cafe', accounts['category_id']),
+                (date(2026, 3, 6), -100.00, 'To savings', None),
+            ]
+            assert self.imported(accounts['savings_id']) == [
+                (date(2026, 3, 6), 100.00, 'From checking', None)
+            ]
+            cafe = Transaction.query.filter_by(description='Corner Cafe').one()
+            assert cafe.location == 'Main Street 1'
+            assert db.session.get(Account, accounts['account_id']).balance == 100.00 - 112.50
+
+    def test_qif_day_first_dates(self):
+        """Day-first exports are read when asked to."""
+        from services.statement_parsers import parse_qif_date
+        assert parse_qif_date('05/03/2026', day_first=True) == date(2026, 3, 5)
+        assert parse_qif_date('05/03/2026') == date(2026, 5, 3)
+        assert parse_qif_date("3/6'26") == date(2026, 3, 6)
+
+
+class TestParseAmount:
+    """Amounts as banks write them."""
+
+    def test_formats(self):
+        """Symbols, separators and negative styles."""
+        assert parse_amount('$1,234.56') == 1234.56
+        assert parse_amount('-12.00') == -12.00
+        assert parse_amount('12.00-') == -12.00
+        assert parse_amount('(7.25)') == -7.25
+        assert parse_amount('1.234,56', decimal=',') == 1234.56
+        assert parse_amount('') is None
+        assert parse_amount('n/a') is None
+
+
+class TestDuplicates:
+    """Re-importing an overlapping statement doesn't add transactions twice."""
+
+    STATEMENT = ('date,amount,description\n'
+                 '2026-03-01,-4.50,Coffee\n'
+                 '2026-03-01,-4.50,Coffee\n'
+                 '2026-03-02,-20.00,Books\n')
+
+    def test_reimport_skips_everything(self, client, app, user_with_account):
+        """The same file twice: the second import adds nothing."""
+        upload(client, user_with_account['account_id'], self.STATEMENT)
+        html = upload(client, user_with_account['account_id'], self.STATEMENT).data.decode()
+
+        assert '3 duplicates skipped' in html
+        with app.app_context():
+            assert Transaction.query.filter_by(account_id=user_with_account['account_id']).count() == 3
+            assert db.session.get(Account, user_with_account['account_id']).balance == 100.00 - 29.00
+
+    def test_overlap_and_repeated_rows(self, client, app, user_with_account):
+        """Only rows beyond the existing ones are new; identical rows are counted, not merged."""
+        upload(client, user_with_account['account_id'], 'date,amount,description\n2026-03-01,-4.50,Coffee\n')
+        html = upload(client, user_with_account['account_id'],
+                      self.STATEMENT.replace('Coffee', '  COFFEE ', 1)).data.decode()
+
+        assert '1 duplicates skipped' in html
+        with app.app_context():
+            coffees = Transaction.query.filter_by(description='Coffee').count()
+            assert coffees == 2
+
+    def test_manual_transactions_are_matched(self, client, app, user_with_account):
+        """A transaction entered by hand is recognized in a later import."""
+        client.post('/transactions/add', data={
+            'amount': '20.00', 'description': 'books', 'date': '2026-03-02',
+            'account_id': user_with_account['account_id'], 'type': 'expense',
+        })
+        html = upload(client, user_with_account['account_id'], self.STATEMENT).data.decode()
+
+        assert 'Imported 2 transactions' in html
+        assert '1 duplicates skipped' in html
+
+    def test_one_duplicate_query_per_batch(self, app, user_with_account):
+        """The duplicate check runs once per batch, not once per row."""
+        lines = ['date,amount,description'] + [f'2026-01-01,-{i}.00,Row {i}' for i in range(1, 251)]
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        with app.app_context():
+            account = db.session.get(Account, user_with_account['account_id'])
+            event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+            try:
+                import_csv(account, io.StringIO('\n'.join(lines)), ColumnMapping(), batch_size=100)
+                db.session.commit()
+            finally:
+                event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+
+        checks = [s for s in statements if 'fingerprint IN' in s]
+        assert len(checks) == 3
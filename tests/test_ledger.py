@@ -0,0 +1,149 @@
+"""
+Test Ledger Verification
+
+The verification job recomputes every balance from the starting balance
+and the transactions, reports the ones that drifted and can repair them.
+"""
+from datetime import timedelta
+import pytest
+from sqlalchemy import text
+from app import create_app
+from models import db, User, Account, LedgerCheck
+from services import ledger
+
+
+@pytest.fixture
+def app():
+    """Create a test app."""
+    app = create_app('testing')
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    app.config['TESTING'] = True
+    app.config['WTF_CSRF_ENABLED'] = False
+
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    """Create a test client."""
+    return app.test_client()
+
+
+def add_accounts(count):
+    """A user with `count` accounts of 100.00 each (call inside an app context)."""
+    user = User(name='Test User', email='test@example.com')
+    user.set_password('password123')
+    db.session.add(user)
+    db.session.flush()
+    accounts = [Account(user_id=user.id, name=f'Account {i}', account_type='bank',
+                        balance=100.00, starting_balance=100.00)
+                for i in range(count)]
+    db.session.add_all(accounts)
+    db.session.commit()
+    return [account.id for account in accounts]
+
+
+def corrupt(account_id, balance):
+    """Overwrite a balance behind the app's back, like a lost update would."""
+    with db.engine.begin() as connection:
+        connection.execute(text('UPDATE accounts SET balance = :cents WHERE id = :id'),
+                           {'cents': int(balance * 100), 'id': account_id})
+
+
+def wrong_accounts(result, account_ids):
+    """Ids of the given accounts that the run found wrong."""
+    return sorted(drift.account_id for drift in result.drifts if drift.account_id in account_ids)
+
+
+class TestVerify:
+    """Tests for finding and repairing drift."""
+
+    def test_app_writes_keep_balances_right(self, client, app):
+        """Balances changed by adding, editing and transferring still add up."""
+        with app.app_context():
+            first, second = add_accounts(2)
+        client.post('/auth/login', data={'email': 'test@example.com', 'password': 'password123'})
+        client.post('/transactions/add', data={
+            'amount': '12.34', 'date': '2026-03-05', 'description': 'Lunch',
+            'account_id': first, 'category_id': '', 'type': 'expense'
+        })
+        client.post('/transactions/transfer', data={
+            'from_account_id': first, 'to_account_id': second,
+            'amount': '50.05', 'date': '2026-03-06', 'description': 'Savings'
+        })
+
+        with app.app_context():
+            result = ledger.verify_ledger(batch_size=1)
+            assert wrong_accounts(result, [first, second]) == []
+            assert result.checked == Account.query.count()
+
+    def test_drift_is_reported_and_repaired(self, app):
+        """A wrong balance is reported, and fixed only when asked to."""
+        with app.app_context():
+            ids = add_accounts(3)
+            corrupt(ids[1], 90.10)
+
+            result = ledger.verify_ledger()
+            drift = next(d for d in result.drifts if d.account_id == ids[1])
+            assert (drift.stored, drift.expected) == (90.10, 100.00)
+            assert db.session.get(Account, ids[1]).balance == 90.10
+
+            result = ledger.verify_ledger(repair=True)
+            assert wrong_accounts(result, ids) == [ids[1]]
+            assert db.session.get(Account, ids[1]).balance == 100.00
+            assert wrong_accounts(ledger.verify_ledger(), ids) == []
+
+            run = LedgerCheck.query.order_by(LedgerCheck.id.desc()).first()
+            assert run.finished_at is not None and run.accounts_checked == result.checked
+
+    def test_incremental_checks_changed_accounts_only(self, client, app, monkeypatch):
+        """After a full run, an incremental run only looks at accounts written since."""
+        monkeypatch.setattr(ledger, 'WATERMARK_OVERLAP', timedelta(0))
+        with app.app_context():
+            quiet, busy = add_accounts(2)
+            ledger.verify_ledger()
+            corrupt(quiet, 1.00)  # not a balance change the app knows about
+        client.post('/auth/login', data={'email': 'test@example.com', 'password': 'password123'})
+        client.post('/transactions/add', data={
+            'amount': '5', 'date': '2026-03-05', 'description': 'Coffee',
+            'account_id': busy, 'category_id': '', 'type': 'expense'
+        })
+
+        with app.app_context():
+            corrupt(busy, 1.00)  # keeps the change time of the add above
+            result = ledger.verify_ledger(incremental=True)
+            assert result.checked == 1
+            assert wrong_accounts(result, [quiet, busy]) == [busy]
+
+            assert wrong_accounts(ledger.verify_ledger(), [quiet, busy]) == [quiet, busy]
+
+
+class TestProcessPool:
+    """Batches can be checked by several processes."""
+
+    def test_workers_find_and_repair_drift(self, tmp_path, monkeypatch):
+        """Each worker process checks and repairs its batches on its own connection."""
+        from config import config, TestingConfig
+
+        class FileConfig(TestingConfig):
+            DEBUG = False  # no demo data
+            SQLALCHEMY_DATABASE_URI = f'sqlite:///{tmp_path / "ledger.db"}'
+
+        monkeypatch.setitem(config, 'ledger_file', FileConfig)
+        app = create_app('ledger_file')
+        with app.app_context():
+            ids = add_accounts(7)
+            corrupt(ids[0], 0.01)
+            corrupt(ids[5], 250.00)
+
+            result = ledger.verify_ledger(repair=True, batch_size=2, workers=2)
+
+            assert result.checked == 7
+            assert wrong_accounts(result, ids) == [ids[0], ids[5]]
+            assert result.repaired == 2
+            assert {account.balance for account in Account.query.all()} == {100.00}
+            db.session.remove()
+            db.engine.dispose()
@@ -0,0 +1,203 @@
+"""
+Test Schema Migrations
+
+Existing databases must end up with the same indexes as new ones, and the
+hot queries must actually use them.
+"""
+import pytest
+from sqlalchemy import inspect, text
+from app import create_app
+from models import db, SchemaMigration
+import schema_migrations
+
+
+@pytest.fixture
+def app():
+    """Create a test app."""
+    app = create_app('testing')
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    app.config['TESTING'] = True
+    app.config['WTF_CSRF_ENABLED'] = False
+
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.drop_all()
+
+
+def index_names(table):
+    """Names of the indexes on a table."""
+    return {index['name'] for index in inspect(db.engine).get_indexes(table)}
+
+
+def legacy_database():
+    """
+    A database as older versions left it: money columns declared FLOAT and
+    holding amounts (not cents), no fingerprints, no migrations recorded.
+    One account (1000.00 at the start) with one -12.34 expense on 2026-03-05.
+    """
+    from sqlalchemy import create_engine
+    from money import Money
+    engine = create_engine('sqlite://')
+    db.metadata.create_all(engine)
+    with engine.begin() as connection:
+        for table in db.metadata.sorted_tables:
+            money_columns = [c.name for c in table.columns if isinstance(c.type, Money)]
+            if not money_columns:
+                continue
+            create_sql = connection.execute(text(
+                "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"
+            ), {'name': table.name}).scalar()
+            for name in money_columns:
+                create_sql = create_sql.replace(f'\t{name} BIGINT', f'\t{name} FLOAT')
+            connection.execute(text(f'DROP TABLE {table.name}'))
+            connection.execute(text(create_sql))
+
+        connection.execute(text(
+            "INSERT INTO users (id, email, password_hash, name) VALUES (1, 'old@example.com', 'x', 'Old')"
+        ))
+        connection.execute(text(
+            "INSERT INTO accounts (id, user_id, name, account_type, balance, starting_balance, currency) "
+            "VALUES (1, 1, 'Checking', 'bank', 987.66, 1000.0, 'USD')"
+        ))
+        connection.execute(text(
+            "INSERT INTO transactions (id, account_id, amount, description, date) "
+            "VALUES (1, 1, -12.34, 'Lunch', '2026-03-05')"
+        ))
+    return engine
+
+
+class TestMigrationRunner:
+    """Tests for schema_migrations.upgrade()."""
+
+    def test_new_database_is_at_latest_version(self, app):
+        """After startup every migration is recorded and nothing is pending."""
+        with app.app_context():
+            schema_migrations.upgrade(db.engine)
+            latest = schema_migrations.MIGRATIONS[-1][0]
+            assert db.session.get(SchemaMigration, latest) is not None
+            assert schema_migrations.pending_migrations(db.engine) == []
+            assert schema_migrations.upgrade(db.engine) == []
+
+    def test_old_database_gets_indexes(self, app):
+        """A database from before the indexes existed is upgraded."""
+        with app.app_context():
+            with db.engine.begin() as connection:
+                connection.execute(text('DROP INDEX IF EXISTS ix_transactions_account_date'))
+                connection.execute(text('DROP INDEX IF EXISTS ix_accounts_user_id'))
+                connection.execute(text('DELETE FROM schema_migrations'))
+            assert 'ix_transactions_account_date' not in index_names('transactions')
+
+            applied = schema_migrations.upgrade(db.engine)
+
+            assert 1 in applied
+            assert 'ix_transactions_account_date' in index_names('transactions')
+            assert 'ix_accounts_user_id' in index_names('accounts')
+
+    def test_fingerprints_are_backfilled(self, app):
+        """Transactions from before fingerprints existed get one on upgrade."""
+        from models import Transaction
+        with app.app_context():
+            with db.engine.begin() as connection:
+                connection.execute(text('UPDATE transactions SET fingerprint = NULL'))
+                connection.execute(text('DELETE FROM schema_migrations WHERE version = 3'))
+
+            assert schema_migrations.upgrade(db.engine) == [3]
+            assert Transaction.query.filter(Transaction.fingerprint.is_(None)).count() == 0
+
+    def test_legacy_float_database_gets_right_fingerprints(self, app):
+        """Fingerprints of an upgraded float database match the ones new writes compute."""
+        from datetime import date
+        from services.duplicates import fingerprint
+        old = legacy_database()
+        with app.app_context():
+            schema_migrations.upgrade(old)
+
+        with old.connect() as connection:
+            amount, stored = connection.execute(text(
+                'SELECT amount, fingerprint FROM transactions WHERE id = 1'
+            )).one()
+        assert amount == -1234
+        assert stored == fingerprint(1, date(2026, 3, 5), -12.34, 'Lunch')
+
+    def test_legacy_database_gets_rollups(self, app):
+        """Upgrading fills the monthly rollups, so the dashboard has totals right away."""
+        old = legacy_database()
+        with app.app_context():
+            schema_migrations.upgrade(old)
+
+        with old.connect() as connection:
+            rollup = connection.execute(text(
+                'SELECT account_id, year, month, expense_total, expense_count FROM monthly_rollups'
+            )).all()
+        assert [tuple(row) for row in rollup] == [(1, 2026, 3, -1234, 1)]
+
+    def test_float_money_becomes_cents(self, app):
+        """Money stored as floats by older versions is converted to whole cents."""
+        from sqlalchemy import create_engine
+        old = create_engine('sqlite://')
+        with old.begin() as connection:
+            connection.execute(text('CREATE TABLE budgets (id INTEGER PRIMARY KEY, amount FLOAT)'))
+            connection.execute(text('INSERT INTO budgets (amount) VALUES (12.34), (-0.1), (1500)'))
+
+        with app.app_context():
+            schema_migrations.money_to_minor_units(old)
+            # Already-integer columns (the test app's own database) are left alone
+            schema_migrations.money_to_minor_units(db.engine)
+
+        with old.connect() as connection:
+            amounts = connection.execute(text('SELECT amount FROM budgets ORDER BY id')).scalars().all()
+        assert amounts == [1234, -10, 150000]
+
+    def test_money_conversion_is_safe_to_rerun(self, app):
+        """The conversion is recorded with it, so running the step again doesn't multiply twice."""
+        old = legacy_database()
+        with app.app_context():
+            schema_migrations.money_to_minor_units(old)
+            schema_migrations.money_to_minor_units(old)
+            assert 5 in schema_migrations.applied_versions(old)
+            schema_migrations.upgrade(old)
+
+        with old.connect() as connection:
+            amount = connection.execute(text('SELECT amount FROM transactions WHERE id = 1')).scalar()
+        assert amount == -1234
+
+    def test_status_command_lists_pending(self, app):
+        """`flask migrate-db --status` lists pending migrations without applying them."""
+        with app.app_context():
+            with db.engine.begin() as connection:
+                connection.execute(text('DELETE FROM schema_migrations'))
+
+        runner = app.test_cli_runner()
+        result = runner.invoke(args=['migrate-db', '--status'])
+        assert '1: ' in result.output
+
+        result = runner.invoke(args=['migrate-db'])
+        assert f'Applied {len(schema_migrations.MIGRATIONS)} migration(s)' in result.output
+
+
+class TestQueryPlans:
+    """The hot queries are served by the new indexes."""
+
+    def explain(self, sql):
+        """SQLite's plan for a statement as one string."""
+        rows = db.session.execute(text(f'EXPLAIN QUERY PLAN {sql}')).all()
+        return ' '.join(row[-1] for row in rows)
+
+    def test_balance_query_uses_account_date_index(self, app):
+        """Sum of an account up to a date seeks on (account_id, date)."""
+        with app.app_context():
+            plan = self.explain(
+                "SELECT SUM(amount) FROM transactions "
+                "WHERE account_id = 1 AND date <= '2026-03-31'"
+            )
+            assert 'ix_transactions_account_date' in plan
+
+    def test_dashboard_rollups_use_user_month_index(self, app):
+        """The month aggregate query seeks on (user_id, year, month)."""
+        with app.app_context():
+            plan = self.explain(
+                "SELECT category_id, SUM(expense_total) FROM monthly_rollups "
+                "WHERE user_id = 1 AND year = 2026 AND month = 3 GROUP BY category_id"
+            )
+            assert 'ix_monthly_rollups_user_month' in plan or 'uq_monthly_rollups_key' in plan
@@ -0,0 +1,179 @@
+"""
+Test Money
+
+Amounts are stored as whole cents, so sums are exact. Each currency is
+rounded and shown with its own number of decimals (none for JPY).
+"""
+from datetime import date
+import pytest
+from sqlalchemy import func, text
+from app import create_app
+from models import db, User, Account, Transaction, Category
+from money import to_minor, from_minor, round_money, format_money, parse_money
+from services.balances import add_to_balances
+
+
+@pytest.fixture
+def app():
+    """Create a test app."""
+    app = create_app('testing')
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    app.config['TESTING'] = True
+    app.config['WTF_CSRF_ENABLED'] = False
+
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    """Create a test client."""
+    return app.test_client()
+
+
+@pytest.fixture
+def user_with_accounts(client, app):
+    """Create and login a user with a USD and a JPY account."""
+    with app.app_context():
+        user = User(name='Test User', email='test@example.com')
+        user.set_password('password123')
+        db.session.add(user)
+        db.session.flush()
+        dollars = Account(user_id=user.id, name='Checking', account_type='bank',
+                          balance=0.0, currency='USD')
+        yen = Account(user_id=user.id, name='Tokyo', account_type='bank',
+                      balance=10000, currency='JPY')
+        db.session.add_all([dollars, yen])
+        db.session.commit()
+        data = {'user_id': user.id, 'dollars': dollars.id, 'yen': yen.id}
+
+    client.post('/auth/login', data={
+        'email': 'test@example.com',
+        'password': 'password123'
+    })
+    return data
+
+
+class TestConversions:
+    """Tests for the money helpers."""
+
+    def test_minor_units_follow_the_currency(self):
+        """USD has cents, JPY has no minor unit; halves round up."""
+        assert to_minor(12.345, 'USD') == 1235
+        assert to_minor(1.005) == 101
+        assert to_minor(1234.5, 'JPY') == 1235
+        assert from_minor(1235, 'USD') == 12.35
+        assert from_minor(1235, 'JPY') == 1235
+
+    def test_round_and_format(self):
+        """Entered amounts are rounded, shown amounts formatted per currency."""
+        assert round_money(19.999, 'EUR') == 20.0
+        assert round_money(-99.5, 'JPY') == -100
+        assert format_money(1234.5, 'USD') == '1234.50'
+        assert format_money(1234.0, 'JPY') == '1234'
+        assert format_money(None) == '0.00'
+
+    def test_only_finite_amounts(self):
+        """Infinity and NaN are refused like any other text that isn't an amount."""
+        assert parse_money(' 12.5 ') == 12.5
+        for text in ('abc', 'inf', '-Infinity', 'nan'):
+            with pytest.raises(ValueError):
+                parse_money(text)
+        for amount in (float('inf'), float('nan')):
+            with pytest.raises(ValueError):
+                round_money(amount)
+
+
+class TestStorage:
+    """Tests for amounts in the database."""
+
+    def test_amounts_are_stored_as_cents(self, app, user_with_accounts):
+        """The database holds integers; Python still sees 12.34."""
+        with app.app_context():
+            db.session.add(Transaction(account_id=user_with_accounts['dollars'], amount=12.34,
+                                       date=date(2026, 3, 1), description='Lunch'))
+            db.session.commit()
+
+            raw = db.session.execute(text(
+                "SELECT amount, typeof(amount) FROM transactions WHERE description = 'Lunch'"
+            )).one()
+            assert tuple(raw) == (1234, 'integer')
+            assert Transaction.query.filter_by(description='Lunch').one().amount == 12.34
+
+    def test_sums_are_exact(self, app, user_with_accounts):
+        """A thousand 0.10 amounts add up to exactly 100 (floats would drift)."""
+        with app.app_context():
+            db.session.add_all([
+                Transaction(account_id=user_with_accounts['dollars'], amount=0.1,
+                            date=date(2026, 3, 1), description=f'Fee {i}')
+                for i in range(1000)
+            ])
+            db.session.commit()
+
+            drifting = 0.0
+            for _ in range(1000):
+                drifting += 0.1
+            assert drifting != 100
+            total = db.session.query(func.sum(Transaction.amount)) \
+                .filter(Transaction.account_id == user_with_accounts['dollars']).scalar()
+            assert total == 100
+
+            for _ in range(1000):
+                add_to_balances({user_with_accounts['dollars']: 0.1})
+            db.session.commit()
+            assert db.session.get(Account, user_with_accounts['dollars']).balance == 100
+
+
+class TestCurrencies:
+    """Tests for currencies without cents."""
+
+    def test_yen_amounts_are_whole(self, client, app, user_with_accounts):
+        """A JPY transaction is rounded to whole yen and shown without decimals."""
+        client.post('/transactions/add', data={
+            'amount': '1234.5', 'date': '2026-03-05', 'description': 'Ramen',
+            'account_id': user_with_accounts['yen'], 'category_id': '', 'type': 'expense'
+        })
+
+        with app.app_context():
+            assert Transaction.query.filter_by(description='Ramen').one().amount == -1235
+            assert db.session.get(Account, user_with_accounts['yen']).balance == 8765
+
+        response = client.get('/transactions/')
+        assert '¥1235<' in response.get_data(as_text=True).replace(' ', '').replace('\n', '')
+
+    def test_forms_refuse_infinity_and_nan(self, client, app, user_with_accounts):
+        """Non-finite amounts get the usual error message instead of a server error."""
+        with app.app_context():
+            food = Category(user_id=user_with_accounts['user_id'], name='Food', category_type='expense')
+            db.session.add(food)
+            db.session.commit()
+            food_id = food.id
+
+        for amount in ('inf', 'nan'):
+            response = client.post('/transactions/add', data={
+                'amount': amount, 'date': '2026-03-05', 'description': 'Broken',
+                'account_id': user_with_accounts['dollars'], 'category_id': '', 'type': 'expense'
+            }, follow_redirects=True)
+            assert response.status_code == 200
+            assert 'The amount must be a number.' in response.get_data(as_text=True)
+
+            response = client.post('/transactions/transfer', data={
+                'from_account_id': user_with_accounts['dollars'], 'to_account_id': user_with_accounts['yen'],
+                'amount': amount, 'date': '2026-03-05'
+            }, follow_redirects=True)
+            assert 'The amount must be a number.' in response.get_data(as_text=True)
+
+            response = client.post('/budgets/', data={'category_id': food_id, 'amount': amount, 'period': 'monthly'},
+                                   follow_redirects=True)
+            assert 'The limit must be a number.' in response.get_data(as_text=True)
+
+            response = client.post('/accounts/add', data={
+                'name': 'Broken', 'account_type': 'bank', 'balance': amount, 'currency': 'USD'
+            }, follow_redirects=True)
+            assert 'The balance must be a number.' in response.get_data(as_text=True)
+
+        with app.app_context():
+            assert Transaction.query.filter_by(description='Broken').count() == 0
+            assert Account.query.filter_by(name='Broken').count() == 0
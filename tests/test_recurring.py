@@ -0,0 +1,224 @@
+"""
+Test Recurring Transactions
+
+The scheduler posts every due occurrence for all users in a few batched
+statements, and re-running it must never post anything twice.
+"""
+from datetime import date
+import pytest
+from sqlalchemy import event, text
+from app import create_app
+from models import db, User, Account, Transaction, Category, RecurringTransaction, MonthlyRollup
+from services.recurring import post_due, add_months, due_dates
+
+
+@pytest.fixture
+def app():
+    """Create a test app."""
+    app = create_app('testing')
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    app.config['TESTING'] = True
+    app.config['WTF_CSRF_ENABLED'] = False
+
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    """Create a test client."""
+    return app.test_client()
+
+
+@pytest.fixture
+def user_with_account(client, app):
+    """Create and login a user with one account and a Rent category."""
+    with app.app_context():
+        user = User(name='Test User', email='test@example.com')
+        user.set_password('password123')
+        db.session.add(user)
+        db.session.flush()
+        account = Account(user_id=user.id, name='Checking', account_type='bank', balance=1000.00)
+        category = Category(user_id=user.id, name='Rent', category_type='expense')
+        db.session.add_all([account, category])
+        db.session.commit()
+        data = {'user_id': user.id, 'account_id': account.id, 'category_id': category.id}
+
+    client.post('/auth/login', data={
+        'email': 'test@example.com',
+        'password': 'password123'
+    })
+    return data
+
+
+def add_item(data, amount=-500.00, frequency='monthly', start=date(2026, 1, 31), end=None, interval=1):
+    """Add a recurring item for the test user (call inside an app context)."""
+    item = RecurringTransaction(user_id=data['user_id'], account_id=data['account_id'],
+                                category_id=data['category_id'], amount=amount, description='Rent',
+                                frequency=frequency, interval=interval, start_date=start,
+                                end_date=end, next_date=start)
+    db.session.add(item)
+    db.session.commit()
+    return item.id
+
+
+def posted_dates(item_id):
+    return sorted(t.date for t in Transaction.query.filter_by(recurring_id=item_id).all())
+
+
+class TestSchedule:
+    """Tests for the occurrence dates."""
+
+    def test_month_end_is_clamped_but_not_drifting(self):
+        """Jan 31 monthly: Feb 28, then back to Mar 31."""
+        assert add_months(date(2026, 1, 31), 1) == date(2026, 2, 28)
+        assert add_months(date(2026, 1, 31), 2) == date(2026, 3, 31)
+        assert add_months(date(2024, 2, 29), 12) == date(2025, 2, 28)
+
+    def test_due_dates_stop_at_end_date(self):
+        """Occurrences after the end date are not due, and the item ends."""
+        item = RecurringTransaction(frequency='weekly', interval=2, start_date=date(2026, 1, 1),
+                                    next_date=date(2026, 1, 1), end_date=date(2026, 1, 31))
+        dates, next_date = due_dates(item, date(2026, 6, 1))
+        assert dates == [date(2026, 1, 1), date(2026, 1, 15), date(2026, 1, 29)]
+        assert next_date is None
+
+
+class TestPostDue:
+    """Tests for the scheduler."""
+
+    def test_posts_due_occurrences_once(self, app, user_with_account):
+        """All occurrences up to today are posted; a second run posts nothing."""
+        data = user_with_account
+        with app.app_context():
+            item_id = add_item(data)
+
+            result = post_due(today=date(2026, 4, 15))
+            again = post_due(today=date(2026, 4, 15))
+
+            assert posted_dates(item_id) == [date(2026, 1, 31), date(2026, 2, 28), date(2026, 3, 31)]
+            assert (result.posted, again.posted) == (3, 0)
+            assert db.session.get(RecurringTransaction, item_id).next_date == date(2026, 4, 30)
+            assert db.session.get(Account, data['account_id']).balance == pytest.approx(-500.00)
+            rollup = MonthlyRollup.query.filter_by(account_id=data['account_id'], year=2026, month=2).one()
+            assert (rollup.category_id, rollup.expense_total, rollup.expense_count) == \
+                (data['category_id'], -500.00, 1)
+
+    def test_rerun_after_crash_does_not_double_post(self, app, user_with_account):
+        """Occurrences already posted (next_date not moved yet) are skipped."""
+        data = user_with_account
+        with app.app_context():
+            item_id = add_item(data)
+            post_due(today=date(2026, 2, 28))
+            # As if the run had crashed between posting and moving next_date
+            with db.engine.begin() as connection:
+                connection.execute(text('UPDATE recurring_transactions SET next_date = :start'),
+                                   {'start': '2026-01-31'})
+
+            result = post_due(today=date(2026, 3, 31))
+
+            assert (result.posted, result.skipped) == (1, 2)
+            assert posted_dates(item_id) == [date(2026, 1, 31), date(2026, 2, 28), date(2026, 3, 31)]
+            assert db.session.get(Account, data['account_id']).balance == pytest.approx(-500.00)
+
+    def test_unique_index_blocks_double_posting(self, app, user_with_account):
+        """The database refuses a second transaction for the same item and date."""
+        from sqlalchemy.exc import IntegrityError
+        data = user_with_account
+        with app.app_context():
+            item_id = add_item(data)
+            post_due(today=date(2026, 1, 31))
+            db.session.add(Transaction(account_id=data['account_id'], amount=-500.00,
+                                       date=date(2026, 1, 31), recurring_id=item_id))
+            with pytest.raises(IntegrityError):
+                db.session.commit()
+
+    def test_all_users_in_a_few_statements(self, app, user_with_account):
+        """Many users' items are posted in batches, not one statement set per item."""
+        data = user_with_account
+        with app.app_context():
+            for i in range(40):
+                user = User(name=f'User {i}', email=f'user{i}@example.com')
+                user.set_password('password123')
+                db.session.add(user)
+                db.session.flush()
+                account = Account(user_id=user.id, name='Bank', account_type='bank', balance=0)
+                db.session.add(account)
+                db.session.flush()
+                db.session.add(RecurringTransaction(
+                    user_id=user.id, account_id=account.id, amount=2000.00, description='Salary',
+                    frequency='monthly', interval=1, start_date=date(2026, 1, 1),
+                    next_date=date(2026, 1, 1)))
+            db.session.commit()
+
+            statements = []
+
+            def listener(conn, cursor, statement, parameters, context, executemany):
+                statements.append(statement)
+
+            event.listen(db.engine, 'before_cursor_execute', listener)
+            try:
+                result = post_due(today=date(2026, 3, 1), batch_size=25)
+            finally:
+                event.remove(db.engine, 'before_cursor_execute', listener)
+
+            assert result.posted == 120
+            assert len(statements) <= 20
+            assert Account.query.filter_by(name='Bank').first().balance == pytest.approx(6000.00)
+
+    def test_cli_command(self, app, user_with_account):
+        """`flask post-recurring --date` posts and reports what it did."""
+        data = user_with_account
+        with app.app_context():
+            add_item(data, frequency='daily', start=date(2026, 1, 1))
+
+        result = app.test_cli_runner().invoke(args=['post-recurring', '--date', '2026-01-10'])
+
+        assert 'Posted 10 transaction(s) from 1 recurring item(s)' in result.output
+
+
+class TestRecurringPages:
+    """Tests for managing recurring transactions."""
+
+    def test_add_and_delete(self, client, app, user_with_account):
+        """An item can be added (expense = negative) and deleted; posted rows stay."""
+        data = user_with_account
+        client.post('/transactions/recurring', data={
+            'type': 'expense', 'amount': '15.99', 'description': 'Streaming',
+            'account_id': data['account_id'], 'frequency': 'monthly', 'interval': '1',
+            'start_date': '2026-01-05'
+        })
+
+        with app.app_context():
+            item = RecurringTransaction.query.filter_by(user_id=data['user_id']).one()
+            assert (item.amount, item.next_date) == (-15.99, date(2026, 1, 5))
+            post_due(today=date(2026, 1, 5))
+            item_id = item.id
+
+        client.post(f'/transactions/recurring/delete/{item_id}')
+
+        with app.app_context():
+            assert RecurringTransaction.query.filter_by(user_id=data['user_id']).count() == 0
+            assert Transaction.query.filter_by(description='Streaming').one().recurring_id is None
+
+    def test_other_users_account_rejected(self, client, app, user_with_account):
+        """Items can only be added to your own accounts."""
+        with app.app_context():
+            other = User(name='Other', email='other@example.com')
+            other.set_password('password123')
+            db.session.add(other)
+            db.session.flush()
+            account = Account(user_id=other.id, name='Theirs', account_type='bank', balance=0)
+            db.session.add(account)
+            db.session.commit()
+            their_account_id = account.id
+
+        client.post('/transactions/recurring', data={
+            'type': 'income', 'amount': '10', 'account_id': their_account_id,
+            'frequency': 'daily', 'start_date': '2026-01-01'
+        })
+
+        with app.app_context():
+            assert RecurringTransaction.query.count() == 0
@@ -0,0 +1,212 @@
+"""
+Test Monthly Rollups
+
+The rollup table must always match what a full scan of the transactions
+table would give, no matter which route wrote the transactions.
+"""
+import pytest
+from app import create_app
+from models import db, User, Account, Transaction, Category, MonthlyRollup
+from services import rollups
+from datetime import date
+
+
+@pytest.fixture
+def app():
+    """Create a test app."""
+    app = create_app('testing')
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    app.config['TESTING'] = True
+    app.config['WTF_CSRF_ENABLED'] = False
+
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    """Create a test client."""
+    return app.test_client()
+
+
+@pytest.fixture
+def user_with_accounts(client, app):
+    """Create and login a user with two accounts and two expense categories."""
+    with app.app_context():
+        user = User(name='Test User', email='test@example.com')
+        user.set_password('password123')
+        db.session.add(user)
+        db.session.flush()
+
+        checking = Account(user_id=user.id, name='Checking', account_type='bank', balance=1000.00)
+        savings = Account(user_id=user.id, name='Savings', account_type='savings', balance=5000.00)
+        food = Category(user_id=user.id, name='Food', category_type='expense')
+        fun = Category(user_id=user.id, name='Fun', category_type='expense')
+        db.session.add_all([checking, savings, food, fun])
+        db.session.commit()
+
+        data = {
+            'user_id': user.id,
+            'checking_id': checking.id,
+            'savings_id': savings.id,
+            'food_id': food.id,
+            'fun_id': fun.id,
+        }
+
+    client.post('/auth/login', data={
+        'email': 'test@example.com',
+        'password': 'password123'
+    })
+
+    return data
+
+
+def rollup_snapshot(user_id):
+    """A user's rollup rows as {key: (income, expense, income_count, expense_count)}, empty rows left out."""
+    return {
+        (r.user_id, r.account_id, r.category_id, r.year, r.month):
+            (round(r.income_total, 2), round(r.expense_total, 2), r.income_count, r.expense_count)
+        for r in MonthlyRollup.query.filter_by(user_id=user_id).all()
+        if r.income_count or r.expense_count
+    }
+
+
+def assert_matches_rebuild(user_id):
+    """Incrementally maintained rollups must equal a full rebuild."""
+    incremental = rollup_snapshot(user_id)
+    rollups.rebuild(user_id)
+    db.session.commit()
+    assert incremental == rollup_snapshot(user_id)
+
+
+def add(client, data, amount, on_date, category_id=None, kind='expense', account='checking_id'):
+    """Add a transaction through the route."""
+    form = {
+        'amount': str(amount),
+        'description': 'Test',
+        'date': on_date.strftime('%Y-%m-%d'),
+        'account_id': data[account],
+        'type': kind,
+    }
+    if category_id:
+        form['category_id'] = category_id
+    client.post('/transactions/add', data=form)
+
+
+class TestRollupMaintenance:
+    """Every write path keeps the rollups correct."""
+
+    def test_add_transaction_updates_rollup(self, client, app, user_with_accounts):
+        """Adding transactions fills in the month's rollup row."""
+        data = user_with_accounts
+        add(client, data, 50, date(2026, 3, 5), data['food_id'])
+        add(client, data, 25, date(2026, 3, 20), data['food_id'])
+        add(client, data, 1000, date(2026, 3, 1), kind='income')
+
+        with app.app_context():
+            key = (data['user_id'], data['checking_id'], data['food_id'], 2026, 3)
+            assert rollup_snapshot(data['user_id'])[key] == (0, -75.00, 0, 2)
+            assert rollups.month_aggregates(data['user_id'], 2026, 3)[:2] == (1000.00, -75.00)
+            assert_matches_rebuild(data['user_id'])
+
+    def test_edit_transaction_moves_rollup(self, client, app, user_with_accounts):
+        """Changing date, account and category moves the totals."""
+        data = user_with_accounts
+        add(client, data, 50, date(2026, 3, 5), data['food_id'])
+        with app.app_context():
+            transaction_id = Transaction.query.filter_by(description='Test').first().id
+
+        client.post(f'/transactions/edit/{transaction_id}', data={
+            'amount': '80',
+            'description': 'Moved',
+            'date': '2026-04-02',
+            'account_id': data['savings_id'],
+            'category_id': data['fun_id'],
+            'type': 'expense',
+        })
+
+        with app.app_context():
+            snapshot = rollup_snapshot(data['user_id'])
+            assert snapshot == {
+                (data['user_id'], data['savings_id'], data['fun_id'], 2026, 4): (0, -80.00, 0, 1)
+            }
+            assert_matches_rebuild(data['user_id'])
+
+    def test_delete_transaction_removes_rollup(self, client, app, user_with_accounts):
+        """Deleting a transaction subtracts it again."""
+        data = user_with_accounts
+        add(client, data, 50, date(2026, 3, 5), data['food_id'])
+        with app.app_context():
+            transaction_id = Transaction.query.filter_by(description='Test').first().id
+
+        client.post(f'/transactions/delete/{transaction_id}')
+
+        with app.app_context():
+            assert rollup_snapshot(data['user_id']) == {}
+            assert rollups.month_aggregates(data['user_id'], 2026, 3) == (0, 0, [])
+
+    def test_transfer_updates_both_accounts(self, client, app, user_with_accounts):
+        """A transfer shows up as uncategorized in both accounts."""
+        data = user_with_accounts
+        client.post('/transactions/transfer', data={
+            'from_account_id': data['checking_id'],
+            'to_account_id': data['savings_id'],
+            'amount': '200',
+            'date': '2026-03-10',
+        })
+
+        with app.app_context():
+            assert rollup_snapshot(data['user_id']) == {
+                (data['user_id'], data['checking_id'], 0, 2026, 3): (0, -200.00, 0, 1),
+                (data['user_id'], data['savings_id'], 0, 2026, 3): (200.00, 0, 1, 0),
+            }
+            assert_matches_rebuild(data['user_id'])
+
+    def test_delete_category_migrates_rollup(self, client, app, user_with_accounts):
+        """Migrating transactions to another category moves the rollup totals."""
+        data = user_with_accounts
+        add(client, data, 50, date(2026, 3, 5), data['food_id'])
+        add(client, data, 30, date(2026, 3, 6), data['fun_id'])
+
+        client.post(f'/categories/delete/{data["food_id"]}', data={
+            'new_category_id': data['fun_id']
+        })
+
+        with app.app_context():
+            assert rollup_snapshot(data['user_id']) == {
+                (data['user_id'], data['checking_id'], data['fun_id'], 2026, 3): (0, -80.00, 0, 2)
+            }
+            assert_matches_rebuild(data['user_id'])
+
+    def test_delete_account_removes_rollups(self, client, app, user_with_accounts):
+        """Rollups of a deleted account are removed with it."""
+        data = user_with_accounts
+        add(client, data, 50, date(2026, 3, 5), data['food_id'])
+
+        client.post(f'/accounts/delete/{data["checking_id"]}')
+
+        with app.app_context():
+            assert MonthlyRollup.query.filter_by(account_id=data['checking_id']).count() == 0
+
+
+class TestRebuildCommand:
+    """Tests for `flask rebuild-rollups`."""
+
+    def test_rebuild_backfills_missing_rollups(self, app, user_with_accounts):
+        """Rollups wiped (e.g. an old database) are restored by the command."""
+        data = user_with_accounts
+        with app.app_context():
+            db.session.add(Transaction(account_id=data['checking_id'], category_id=data['food_id'],
+                                       amount=-40.00, date=date(2026, 2, 1)))
+            db.session.commit()
+            expected = rollup_snapshot(data['user_id'])
+            MonthlyRollup.query.filter_by(user_id=data['user_id']).delete()
+            db.session.commit()
+
+        result = app.test_cli_runner().invoke(args=['rebuild-rollups', '--user-id', str(data['user_id'])])
+
+        assert 'Rebuilt 1 rollup rows' in result.output
+        with app.app_context():
+            assert rollup_snapshot(data['user_id']) == expected
@@ -0,0 +1,277 @@
+"""
+Test Categorization Rules
+
+Rules pick the category of new and imported transactions. They are compiled
+into one matcher per user, which must be rebuilt whenever the rules change.
+"""
+import io
+import time
+import pytest
+from app import create_app
+from models import db, User, Account, Transaction, Category, CategoryRule
+from services.categorizer import CompiledRules, rules_for, validate_pattern
+
+
+@pytest.fixture
+def app():
+    """Create a test app."""
+    app = create_app('testing')
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    app.config['TESTING'] = True
+    app.config['WTF_CSRF_ENABLED'] = False
+
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    """Create a test client."""
+    return app.test_client()
+
+
+@pytest.fixture
+def user_with_categories(client, app):
+    """Create and login a user with two accounts and a few categories."""
+    with app.app_context():
+        user = User(name='Test User', email='test@example.com')
+        user.set_password('password123')
+        db.session.add(user)
+        db.session.flush()
+        checking = Account(user_id=user.id, name='Checking', account_type='bank', balance=100.00)
+        card = Account(user_id=user.id, name='Card', account_type='credit', balance=0.00)
+        food = Category(user_id=user.id, name='Food', category_type='expense')
+        coffee = Category(user_id=user.id, name='Coffee', category_type='expense')
+        rent = Category(user_id=user.id, name='Rent', category_type='expense')
+        db.session.add_all([checking, card, food, coffee, rent])
+        db.session.commit()
+        data = {'user_id': user.id, 'checking': checking.id, 'card': card.id,
+                'food': food.id, 'coffee': coffee.id, 'rent': rent.id}
+
+    client.post('/auth/login', data={
+        'email': 'test@example.com',
+        'password': 'password123'
+    })
+    return data
+
+
+def add_rule(data, category, **conditions):
+    """Add a rule for the test user (call inside an app context)."""
+    rule = CategoryRule(user_id=data['user_id'], category_id=data[category], **conditions)
+    db.session.add(rule)
+    db.session.commit()
+    return rule
+
+
+class TestMatching:
+    """Tests for the compiled matcher."""
+
+    def test_contains_is_case_insensitive_and_literal(self, app, user_with_categories):
+        """A plain pattern matches anywhere in the description; regex characters are literal."""
+        data = user_with_categories
+        with app.app_context():
+            add_rule(data, 'coffee', description_pattern='STARBUCKS')
+            add_rule(data, 'food', description_pattern='a+b')
+            rules = rules_for(data['user_id'])
+
+            assert rules.match('Card payment starbucks #123', None, data['checking'], -4.5) == data['coffee']
+            assert rules.match('deli a+b', None, data['checking'], -4.5) == data['food']
+            assert rules.match('deli aab', None, data['checking'], -4.5) is None
+
+    def test_regex_and_priority(self, app, user_with_categories):
+        """The lowest priority number wins when several rules match."""
+        data = user_with_categories
+        with app.app_context():
+            add_rule(data, 'food', description_pattern=r'^(lidl|aldi)\b', is_regex=True, priority=50)
+            add_rule(data, 'coffee', description_pattern='aldi', priority=10)
+            rules = rules_for(data['user_id'])
+
+            assert rules.match('ALDI Sued 42', None, None, -30) == data['coffee']
+            assert rules.match('Lidl Berlin', None, None, -30) == data['food']
+            assert rules.match('Visit to lidl', None, None, -30) is None
+
+    def test_amount_account_and_location_conditions(self, app, user_with_categories):
+        """Every condition that is set must match."""
+        data = user_with_categories
+        with app.app_context():
+            add_rule(data, 'rent', description_pattern='transfer', account_id=data['checking'],
+                     min_amount=800, max_amount=1500)
+            add_rule(data, 'coffee', location_pattern='airport')
+            rules = rules_for(data['user_id'])
+
+            assert rules.match('Transfer May', None, data['checking'], -1200) == data['rent']
+            assert rules.match('Transfer May', None, data['card'], -1200) is None
+            assert rules.match('Transfer May', None, data['checking'], -50) is None
+            assert rules.match('Kiosk', 'Munich Airport T2', data['card'], -3) == data['coffee']
+            assert rules.match('Kiosk', None, data['card'], -3) is None
+
+    def test_validate_pattern(self):
+        """Broken or unsupported regular expressions are rejected before saving."""
+        assert validate_pattern('coffee (to go', is_regex=False) is None
+        assert validate_pattern('coffee (to go', is_regex=True) is not None
+        assert validate_pattern(r'(a)\1', is_regex=True) is not None
+        assert validate_pattern('(?P<x>a)', is_regex=True) is not None
+        assert validate_pattern(r'^uber\s+(trip|eats)', is_regex=True) is None
+
+    def test_backtracking_patterns_are_refused(self, app, user_with_categories):
+        """Nested repetitions are rejected; one saved before is skipped instead of hanging."""
+        assert validate_pattern(r'(a+)+$', is_regex=True) is not None
+        assert validate_pattern(r'(\w+\s?)*$', is_regex=True) is not None
+        assert validate_pattern(r'(a|ab)*c', is_regex=True) is not None
+        assert validate_pattern(r'(a|b)+\d{2,}', is_regex=True) is None
+
+        data = user_with_categories
+        with app.app_context():
+            add_rule(data, 'food', description_pattern=r'(a+)+$', is_regex=True)
+            add_rule(data, 'coffee', description_pattern=r'a+b', is_regex=True)
+            rules = rules_for(data['user_id'])
+
+            started = time.perf_counter()
+            assert rules.match('a' * 254 + 'c', None, data['checking'], -3) is None
+            assert rules.match('a' * 1000 + 'b', None, data['checking'], -3) is None  # past 255 chars
+            assert rules.match('aab', None, data['checking'], -3) == data['coffee']
+            assert time.perf_counter() - started < 1
+
+    def test_many_rules_match_in_microseconds(self):
+        """Hundreds of rules still cost only microseconds per row."""
+        class Rule:
+            def __init__(self, id, pattern):
+                self.id = self.category_id = id
+                self.priority = 100
+                self.description_pattern = pattern
+                self.is_regex = False
+                self.location_pattern = None
+                self.account_id = self.min_amount = self.max_amount = None
+
+        rules = CompiledRules([Rule(i, f'merchant {i:03d}') for i in range(300)])
+        descriptions = [f'card payment merchant {i % 400:03d} ref 123456' for i in range(2000)]
+
+        started = time.perf_counter()
+        matched = [rules.match(text, None, 1, -10) for text in descriptions]
+        per_row = (time.perf_counter() - started) / len(descriptions)
+
+        assert matched[5] == 5 and matched[350] is None
+        assert per_row < 0.0002
+
+
+class TestRuleCache:
+    """Tests for keeping the compiled rules up to date."""
+
+    def test_cached_until_rules_change(self, app, user_with_categories):
+        """The compiled rules are reused, and rebuilt after a rule is added or deleted."""
+        data = user_with_categories
+        with app.app_context():
+            rule = add_rule(data, 'coffee', description_pattern='espresso')
+            first = rules_for(data['user_id'])
+            assert rules_for(data['user_id']) is first
+
+            add_rule(data, 'food', description_pattern='bakery')
+            second = rules_for(data['user_id'])
+            assert second is not first
+            assert second.match('Bakery Schmidt', None, None, -3) == data['food']
+
+            db.session.delete(rule)
+            db.session.commit()
+            assert rules_for(data['user_id']).match('espresso bar', None, None, -3) is None
+
+    def test_deleting_category_drops_its_rules(self, app, user_with_categories):
+        """Rules of a deleted category no longer match."""
+        data = user_with_categories
+        with app.app_context():
+            add_rule(data, 'coffee', description_pattern='espresso')
+            assert rules_for(data['user_id']).match('espresso', None, None, -3) == data['coffee']
+
+            db.session.delete(db.session.get(Category, data['coffee']))
+            db.session.commit()
+
+            assert CategoryRule.query.filter_by(user_id=data['user_id']).count() == 0
+            assert rules_for(data['user_id']).match('espresso', None, None, -3) is None
+
+
+class TestApplyingRules:
+    """Tests for rules on new and imported transactions."""
+
+    def test_add_transaction_uses_rules(self, client, app, user_with_categories):
+        """A transaction added without a category gets one from the rules."""
+        data = user_with_categories
+        with app.app_context():
+            add_rule(data, 'coffee', description_pattern='starbucks')
+
+        for description, category_id in (('Starbucks', ''), ('Starbucks beans', data['food'])):
+            client.post('/transactions/add', data={
+                'amount': '4.50', 'date': '2026-03-05', 'description': description,
+                'account_id': data['checking'], 'category_id': category_id, 'type': 'expense'
+            })
+
+        with app.app_context():
+            picked = {t.description: t.category_id
+                      for t in Transaction.query.filter_by(account_id=data['checking']).all()}
+            assert picked == {'Starbucks': data['coffee'], 'Starbucks beans': data['food']}
+
+    def test_import_uses_rules_for_uncategorized_rows(self, client, app, user_with_categories):
+        """Imported rows without a category column value are categorized by the rules."""
+        data = user_with_categories
+        with app.app_context():
+            add_rule(data, 'rent', description_pattern='landlord', min_amount=500)
+
+        content = ('date,amount,description,category\n'
+                   '2026-03-01,-900.00,Landlord March,\n'
+                   '2026-03-02,-20.00,Landlord fee,\n'
+                   '2026-03-03,-950.00,Landlord deposit,Food\n')
+        client.post('/transactions/import', data={
+            'account_id': data['checking'],
+            'file': (io.BytesIO(content.encode()), 'statement.csv')
+        }, content_type='multipart/form-data')
+
+        with app.app_context():
+            picked = {t.description: t.category_id
+                      for t in Transaction.query.filter_by(account_id=data['checking']).all()}
+            assert picked == {'Landlord March': data['rent'], 'Landlord fee': None,
+                              'Landlord deposit': data['food']}
+
+
+class TestRulePages:
+    """Tests for managing rules."""
+
+    def test_add_and_delete_rule(self, client, app, user_with_categories):
+        """Rules can be added and deleted from the rules page."""
+        data = user_with_categories
+        response = client.post('/categories/rules', data={
+            'category_id': data['coffee'], 'description_pattern': 'cafe', 'priority': '5'
+        }, follow_redirects=True)
+        assert response.status_code == 200
+        assert b'cafe' in response.data
+
+        with app.app_context():
+            rule = CategoryRule.query.filter_by(user_id=data['user_id']).one()
+            assert (rule.category_id, rule.priority) == (data['coffee'], 5)
+            rule_id = rule.id
+
+        client.post(f'/categories/rules/delete/{rule_id}')
+        with app.app_context():
+            assert CategoryRule.query.filter_by(user_id=data['user_id']).count() == 0
+
+    def test_invalid_rules_rejected(self, client, app, user_with_categories):
+        """Bad regular expressions, missing conditions and other users' categories are refused."""
+        data = user_with_categories
+        with app.app_context():
+            other = User(name='Other', email='other@example.com')
+            other.set_password('password123')
+            db.session.add(other)
+            db.session.flush()
+            foreign = Category(user_id=other.id, name='Theirs', category_type='expense')
+            db.session.add(foreign)
+            db.session.commit()
+            foreign_id = foreign.id
+
+        for form in (
+            {'category_id': data['food'], 'description_pattern': '(unclosed', 'is_regex': '1'},
+            {'category_id': data['food']},
+            {'category_id': foreign_id, 'description_pattern': 'x'},
+        ):
+            client.post('/categories/rules', data=form)
+
+        with app.app_context():
+            assert CategoryRule.query.count() == 0
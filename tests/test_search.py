@@ -0,0 +1,136 @@
+"""
+Test Transaction Search
+
+Full-text search must only return the user's own transactions, stay in sync
+with every write, and use the full-text index instead of scanning.
+"""
+import pytest
+from sqlalchemy import text
+from app import create_app
+from models import db, User, Account, Transaction
+from services.search import search_transactions, search_terms
+from datetime import date
+
+
+@pytest.fixture
+def app():
+    """Create a test app."""
+    app = create_app('testing')
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    app.config['TESTING'] = True
+    app.config['WTF_CSRF_ENABLED'] = False
+
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    """Create a test client."""
+    return app.test_client()
+
+
+@pytest.fixture
+def two_users(client, app):
+    """Two users with a coffee transaction each; the first one is logged in."""
+    with app.app_context():
+        ids = {}
+        for name in ('alice', 'bob'):
+            user = User(name=name, email=f'{name}@example.com')
+            user.set_password('password123')
+            db.session.add(user)
+            db.session.flush()
+            account = Account(user_id=user.id, name='Checking', account_type='bank', balance=0)
+            db.session.add(account)
+            db.session.flush()
+            db.session.add(Transaction(account_id=account.id, amount=-4.50, date=date(2026, 3, 2),
+                                       description=f'{name} coffee', location='Blue Bottle'))
+            ids[f'{name}_id'] = user.id
+            ids[f'{name}_account'] = account.id
+        db.session.commit()
+
+    client.post('/auth/login', data={
+        'email': 'alice@example.com',
+        'password': 'password123'
+    })
+    return ids
+
+
+def descriptions(rows):
+    """Descriptions of search results, in order."""
+    return [row.description for row in rows]
+
+
+class TestSearch:
+    """Tests for search_transactions()."""
+
+    def test_only_own_transactions(self, app, two_users):
+        """Another user's matching transaction is never returned."""
+        with app.app_context():
+            assert descriptions(search_transactions(two_users['alice_id'], 'coffee')) == ['alice coffee']
+
+    def test_prefix_and_location(self, app, two_users):
+        """Partial words match, and the location is searched too."""
+        with app.app_context():
+            assert descriptions(search_transactions(two_users['alice_id'], 'coff')) == ['alice coffee']
+            assert descriptions(search_transactions(two_users['alice_id'], 'blue bott')) == ['alice coffee']
+            assert search_transactions(two_users['alice_id'], 'coffee tea') == []
+
+    def test_best_match_first(self, app, two_users):
+        """A transaction matching the word twice ranks above one matching it once."""
+        with app.app_context():
+            db.session.add(Transaction(account_id=two_users['alice_account'], amount=-9.00,
+                                       date=date(2026, 1, 1), description='Coffee coffee beans',
+                                       location='Coffee Roasters'))
+            db.session.commit()
+            results = search_transactions(two_users['alice_id'], 'coffee')
+            assert descriptions(results) == ['Coffee coffee beans', 'alice coffee']
+
+    def test_index_follows_edits_and_deletes(self, app, two_users):
+        """Updated and deleted transactions are found (or not) right away."""
+        with app.app_context():
+            transaction = Transaction.query.filter_by(account_id=two_users['alice_account']).one()
+            transaction.description = 'Bakery'
+            db.session.commit()
+            assert search_transactions(two_users['alice_id'], 'coffee') == []
+            assert descriptions(search_transactions(two_users['alice_id'], 'bakery')) == ['Bakery']
+
+            # Bulk statements that skip the ORM are picked up as well
+            Transaction.query.filter_by(id=transaction.id).delete()
+            db.session.commit()
+            assert search_transactions(two_users['alice_id'], 'bakery') == []
+
+    def test_search_syntax_is_ignored(self, app, two_users):
+        """Quotes and operators in the search box are treated as plain text."""
+        with app.app_context():
+            assert search_terms('"coffee" OR * -(blue)') == ['coffee', 'OR', 'blue']
+            assert search_transactions(two_users['alice_id'], '"*()') == []
+
+    def test_uses_full_text_index(self, app, two_users):
+        """The search is answered from the FTS index, not a scan of transactions."""
+        with app.app_context():
+            rows = db.session.execute(text(
+                "EXPLAIN QUERY PLAN SELECT transactions.id FROM transactions_fts "
+                "JOIN transactions ON transactions.id = transactions_fts.rowid "
+                "WHERE transactions_fts MATCH '\"coffee\"*'"
+            )).all()
+            plan = ' '.join(row[-1] for row in rows)
+            assert 'VIRTUAL TABLE INDEX' in plan
+            assert 'SEARCH transactions USING INTEGER PRIMARY KEY' in plan
+
+
+class TestSearchPage:
+    """Tests for GET /transactions/search."""
+
+    def test_search_page_shows_matches(self, client, two_users):
+        """The search page lists matching transactions of the logged-in user."""
+        html = client.get('/transactions/search?q=coffee').data.decode()
+        assert 'alice coffee' in html
+        assert 'bob coffee' not in html
+
+    def test_no_matches_message(self, client, two_users):
+        """A search with no results says so."""
+        html = client.get('/transactions/search?q=nothing').data.decode()
+        assert 'No transactions match' in html
@@ -363,3 +363,660 @@ class TestTransactionValidation:
         }, follow_redirects=True)
         
         assert response.status_code in [200, 400]
+
+
+class TestTransactionListPagination:
+    """Tests for keyset pagination of the transactions page."""
+    
+    def create_transactions(self, app, account_id, count):
+        """Create `count` transactions, one per day, descriptions Item 0..n."""
+        with app.app_context():
+            for i in range(count):
+                db.session.add(Transaction(
+                    account_id=account_id,
+                    amount=-1.00,
+                    description=f'Item {i}',
+                    date=date(2026, 1, 1 + i)
+                ))
+            db.session.commit()
+    
+    def descriptions(self, html, count):
+        """Which of the Item n descriptions appear on the page."""
+        return [i for i in range(count) if f'Item {i}<' in html]
+    
+    def test_first_page_is_newest(self, client, app, user_with_accounts):
+        """The first page holds the newest transactions only."""
+        self.create_transactions(app, user_with_accounts['account1_id'], 7)
+        
+        html = client.get('/transactions/?per_page=3').data.decode()
+        
+        assert self.descriptions(html, 7) == [4, 5, 6]
+        assert 'Older' in html
+        assert 'Newer' not in html
+    
+    def test_walk_older_and_back_newer(self, client, app, user_with_accounts):
+        """Following the cursors visits every row exactly once, in both directions."""
+        self.create_transactions(app, user_with_accounts['account1_id'], 7)
+        with app.app_context():
+            from services.transaction_list import transaction_rows, keyset_page
+            query = transaction_rows(user_with_accounts['user_id'])
+            
+            first = keyset_page(query, 3)
+            second = keyset_page(query, 3, before=first.older_cursor)
+            third = keyset_page(query, 3, before=second.older_cursor)
+            
+            assert [t.description for t in second.items] == ['Item 3', 'Item 2', 'Item 1']
+            assert [t.description for t in third.items] == ['Item 0']
+            assert not third.has_older
+            
+            back = keyset_page(query, 3, after=third.newer_cursor)
+            assert [t.description for t in back.items] == ['Item 3', 'Item 2', 'Item 1']
+            assert back.has_newer
+    
+    def test_page_size_is_capped(self, client, app, user_with_accounts):
+        """A huge per_page is limited to the configured maximum."""
+        app.config['TRANSACTIONS_MAX_PER_PAGE'] = 2
+        self.create_transactions(app, user_with_accounts['account1_id'], 5)
+        
+        html = client.get('/transactions/?per_page=100000').data.decode()
+        
+        assert self.descriptions(html, 5) == [3, 4]
+    
+    def test_invalid_cursor_shows_first_page(self, client, app, user_with_accounts):
+        """A broken cursor falls back to the newest page."""
+        self.create_transactions(app, user_with_accounts['account1_id'], 3)
+        
+        response = client.get('/transactions/?before=not-a-cursor')
+        
+        assert response.status_code == 200
+        assert self.descriptions(response.data.decode(), 3) == [0, 1, 2]
+
+
+class TestTransactionListQueryCount:
+    """Rendering the list must not run extra queries per row."""
+    
+    def add_rows(self, app, data, count):
+        """Add transactions, each with its own category, spread over both accounts."""
+        with app.app_context():
+            for i in range(count):
+                category = Category(user_id=data['user_id'], name=f'Cat {i}', category_type='expense')
+                db.session.add(category)
+                db.session.flush()
+                db.session.add(Transaction(
+                    account_id=data['account1_id'] if i % 2 else data['account2_id'],
+                    category_id=category.id,
+                    amount=-1.00,
+                    description=f'Row {i}',
+                    date=date(2026, 1, 1)
+                ))
+            db.session.commit()
+    
+    def count_statements(self, app, url, client):
+        """Number of SQL statements a GET request runs."""
+        from sqlalchemy import event
+        statements = []
+        
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        
+        with app.app_context():
+            event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+            try:
+                client.get(url)
+            finally:
+                event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+        return len(statements)
+    
+    def test_statement_count_does_not_grow_with_rows(self, client, app, user_with_accounts):
+        """5 rows and 45 rows cost the same number of statements."""
+        self.add_rows(app, user_with_accounts, 5)
+        few = self.count_statements(app, '/transactions/?per_page=200', client)
+        
+        self.add_rows(app, user_with_accounts, 40)
+        many = self.count_statements(app, '/transactions/?per_page=200', client)
+        
+        assert many == few
+    
+    def test_dashboard_recent_transactions_statement_count(self, client, app, user_with_accounts):
+        """The dashboard's recent list also uses the joined projection."""
+        from services.dashboard_cache import dashboard_cache
+        self.add_rows(app, user_with_accounts, 2)
+        dashboard_cache.clear()
+        few = self.count_statements(app, '/', client)
+        
+        self.add_rows(app, user_with_accounts, 10)
+        dashboard_cache.clear()
+        many = self.count_statements(app, '/', client)
+        
+        assert many == few
+
+
+class TestStreamAllTransactions:
+    """Tests for the streamed "all transactions" view."""
+    
+    def test_all_rows_are_streamed(self, client, app, user_with_accounts):
+        """?all=1 streams every row, not just one page."""
+        app.config['TRANSACTIONS_STREAM_BATCH_SIZE'] = 7
+        app.config['TRANSACTIONS_STREAM_CHUNK_BYTES'] = 1024
+        with app.app_context():
+            for i in range(120):
+                db.session.add(Transaction(
+                    account_id=user_with_accounts['account1_id'],
+                    amount=-1.00,
+                    description=f'Streamed {i}',
+                    date=date(2026, 1, 1)
+                ))
+            db.session.commit()
+        
+        response = client.get('/transactions/?all=1', buffered=False)
+        assert response.is_streamed
+        
+        chunks = list(response.response)
+        html = b''.join(c if isinstance(c, bytes) else c.encode() for c in chunks).decode()
+        assert len(chunks) > 1
+        assert all(f'Streamed {i}<' in html for i in range(120))
+        assert html.rstrip().endswith('</html>')
+    
+    def test_other_users_rows_are_not_streamed(self, client, app, user_with_accounts):
+        """The streamed view is scoped to the logged-in user like the paged one."""
+        with app.app_context():
+            other = User(name='Other', email='other@example.com')
+            other.set_password('password123')
+            db.session.add(other)
+            db.session.flush()
+            account = Account(user_id=other.id, name='Other Bank', account_type='bank', balance=0)
+            db.session.add(account)
+            db.session.flush()
+            db.session.add(Transaction(account_id=account.id, amount=-5.00,
+                                       description='Not yours', date=date(2026, 1, 1)))
+            db.session.commit()
+        
+        html = client.get('/transactions/?all=1').data.decode()
+        
+        assert 'Not yours' not in html
+
+
+class TestTransactionFilters:
+    """Tests for the filters on the transactions page and the JSON API."""
+    
+    @pytest.fixture
+    def rows(self, app, user_with_accounts):
+        """A small mix of income/expense, accounts, categories and dates."""
+        data = user_with_accounts
+        with app.app_context():
+            for description, account, category, amount, day in [
+                ('Lunch', 'account1_id', 'category_id', -12.00, date(2026, 1, 5)),
+                ('Dinner', 'account1_id', 'category_id', -80.00, date(2026, 2, 5)),
+                ('Salary', 'account1_id', None, 3000.00, date(2026, 2, 1)),
+                ('Cash', 'account2_id', None, -40.00, date(2026, 3, 1)),
+            ]:
+                db.session.add(Transaction(
+                    account_id=data[account],
+                    category_id=data[category] if category else None,
+                    amount=amount,
+                    description=description,
+                    date=day
+                ))
+            db.session.commit()
+        return data
+    
+    def api(self, client, query=''):
+        """Descriptions returned by the JSON API, newest first."""
+        response = client.get(f'/transactions/api?{query}')
+        assert response.status_code == 200
+        return [t['description'] for t in response.get_json()['transactions']]
+    
+    def test_date_range(self, client, rows):
+        """Start and end dates are inclusive."""
+        assert self.api(client, 'start=2026-02-01&end=2026-02-05') == ['Dinner', 'Salary']
+    
+    def test_accounts_and_categories(self, client, rows):
+        """Account and category filters accept several ids."""
+        assert self.api(client, f'account={rows["account2_id"]}') == ['Cash']
+        assert self.api(client, f'account={rows["account1_id"]}&account={rows["account2_id"]}') \
+            == ['Cash', 'Dinner', 'Salary', 'Lunch']
+        assert self.api(client, f'category={rows["category_id"]}') == ['Dinner', 'Lunch']
+    
+    def test_type_amount_and_uncategorized(self, client, rows):
+        """Amounts compare by size; type and uncategorized narrow further."""
+        assert self.api(client, 'type=income') == ['Salary']
+        assert self.api(client, 'type=expense&min_amount=20') == ['Cash', 'Dinner']
+        assert self.api(client, 'max_amount=50') == ['Cash', 'Lunch']
+        assert self.api(client, 'uncategorized=1&type=expense') == ['Cash']
+    
+    def test_invalid_values_are_ignored(self, client, rows):
+        """Garbage in the query string doesn't break the page."""
+        assert len(self.api(client, 'start=yesterday&account=abc&type=weird')) == 4
+    
+    def test_other_users_accounts_are_not_reachable(self, client, app, rows):
+        """Filtering on someone else's account id returns nothing."""
+        with app.app_context():
+            other = User(name='Other', email='other@example.com')
+            other.set_password('password123')
+            db.session.add(other)
+            db.session.flush()
+            account = Account(user_id=other.id, name='Other Bank', account_type='bank', balance=0)
+            db.session.add(account)
+            db.session.flush()
+            db.session.add(Transaction(account_id=account.id, amount=-5.00,
+                                       description='Not yours', date=date(2026, 1, 1)))
+            db.session.commit()
+            account_id = account.id
+        
+        assert self.api(client, f'account={account_id}') == []
+    
+    def test_page_links_keep_filters(self, client, rows):
+        """Paging through filtered results keeps the filters."""
+        html = client.get('/transactions/?per_page=1&type=expense').data.decode()
+        assert 'type=expense' in html
+        
+        data = client.get('/transactions/api?per_page=1&type=expense').get_json()
+        older = client.get(f'/transactions/api?per_page=1&type=expense&before={data["older_cursor"]}')
+        assert [t['description'] for t in older.get_json()['transactions']] == ['Dinner']
+
+
+@pytest.fixture(scope='module')
+def million_rows():
+    """
+    A database with 1,000,000 transactions spread over several users.
+    
+    Loaded with one INSERT ... SELECT and ANALYZEd, so SQLite's planner sees
+    realistic table sizes. Shared by the whole module (it takes a few seconds).
+    """
+    from sqlalchemy import text
+    app = create_app('testing')
+    with app.app_context():
+        with db.engine.begin() as connection:
+            connection.execute(text(
+                "INSERT INTO users (id, name, email, password_hash) VALUES "
+                "(500, 'Big', 'big@example.com', 'x'), (501, 'Other', 'other@example.com', 'x')"
+            ))
+            # 5 accounts / 20 categories for user 500, the rest for user 501
+            connection.execute(text(
+                "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 40) "
+                "INSERT INTO accounts (id, user_id, name, account_type, balance) "
+                "SELECT 1000 + i, 500 + (i > 5), 'Account ' || i, 'bank', 0 FROM n"
+            ))
+            connection.execute(text(
+                "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 200) "
+                "INSERT INTO categories (id, user_id, name, category_type) "
+                "SELECT 1000 + i, 500 + (i > 20), 'Category ' || i, 'expense' FROM n"
+            ))
+            connection.execute(text(
+                "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 1000000) "
+                "INSERT INTO transactions (account_id, category_id, amount, date, description) "
+                "SELECT 1001 + (i % 40), CASE WHEN i % 7 = 0 THEN NULL ELSE 1001 + (i % 200) END, "
+                "((i % 1000) - 700) * 100, date('2016-01-01', '+' || (i % 3650) || ' days'), 'Row' FROM n"
+            ))
+            connection.execute(text('ANALYZE'))
+        yield app
+        db.drop_all()
+
+
+class TestTransactionFilterPlans:
+    """Every common filter combination is answered from indexes, never a full scan."""
+    
+    COMBINATIONS = [
+        {},
+        {'start': date(2024, 1, 1), 'end': date(2024, 3, 31)},
+        {'account_ids': [1002, 1003]},
+        {'category_ids': [1002, 1003]},
+        {'uncategorized': True},
+        {'kind': 'expense', 'min_amount': 100},
+        {'account_ids': [1002], 'start': date(2024, 1, 1), 'kind': 'income'},
+        {'category_ids': [1002], 'start': date(2024, 1, 1), 'end': date(2024, 12, 31)},
+        {'uncategorized': True, 'start': date(2025, 1, 1), 'max_amount': 50},
+    ]
+    
+    def plan(self, filters):
+        """SQLite's query plan for one page of filtered transactions."""
+        from sqlalchemy import text
+        from services.transaction_list import transaction_rows
+        query = filters.apply(transaction_rows(500)) \
+            .order_by(Transaction.date.desc(), Transaction.id.desc()) \
+            .limit(51)
+        sql = query.statement.compile(db.engine, compile_kwargs={'literal_binds': True})
+        return [row[-1] for row in db.session.execute(text(f'EXPLAIN QUERY PLAN {sql}'))]
+    
+    @pytest.mark.parametrize('combination', COMBINATIONS)
+    def test_no_full_scans(self, million_rows, combination):
+        """Each table is reached through an index (SEARCH), none is scanned."""
+        from services.transaction_list import TransactionFilters
+        with million_rows.app_context():
+            plan = self.plan(TransactionFilters(**combination))
+        
+        assert not [step for step in plan if step.startswith('SCAN')], plan
+        assert any('ix_transactions_' in step for step in plan), plan
+
+
+class TestExport:
+    """Tests for the streamed CSV / JSON Lines export."""
+    
+    def test_csv_export(self, client, app, user_with_accounts):
+        """The CSV has a header and one line per transaction, oldest first."""
+        import csv
+        import io
+        with app.app_context():
+            db.session.add(Transaction(account_id=user_with_accounts['account1_id'],
+                                       category_id=user_with_accounts['category_id'],
+                                       amount=-4.50, description='Coffee, large', date=date(2026, 3, 2)))
+            db.session.add(Transaction(account_id=user_with_accounts['account2_id'],
+                                       amount=100.00, description='Interest', date=date(2026, 3, 1)))
+            db.session.commit()
+        
+        response = client.get('/transactions/export.csv')
+        
+        assert response.mimetype == 'text/csv'
+        assert 'attachment' in response.headers['Content-Disposition']
+        rows = list(csv.DictReader(io.StringIO(response.data.decode())))
+        assert [(r['date'], r['amount'], r['description'], r['account'], r['category']) for r in rows] == [
+            ('2026-03-01', '100.0', 'Interest', 'Savings', ''),
+            ('2026-03-02', '-4.5', 'Coffee, large', 'Checking', 'Food'),
+        ]
+    
+    def test_gzipped_jsonl_with_filters(self, client, app, user_with_accounts):
+        """JSON Lines can be gzipped and filtered like the list."""
+        import gzip
+        import json
+        with app.app_context():
+            for i in range(3):
+                db.session.add(Transaction(account_id=user_with_accounts['account1_id'],
+                                           amount=-1.00 - i, description=f'Row {i}', date=date(2026, 1, 1 + i)))
+            db.session.commit()
+        
+        response = client.get('/transactions/export.jsonl?gzip=1&min_amount=2')
+        
+        assert response.mimetype == 'application/gzip'
+        lines = gzip.decompress(response.data).decode().splitlines()
+        assert [json.loads(line)['description'] for line in lines] == ['Row 1', 'Row 2']
+    
+    def test_unknown_format(self, client, user_with_accounts):
+        """Only csv and jsonl exist."""
+        assert client.get('/transactions/export.xml').status_code == 404
+    
+    def test_memory_stays_flat(self, app, user_with_accounts):
+        """Exporting 50,000 rows (3+ MB) stays under a fixed 2 MB memory ceiling."""
+        import tracemalloc
+        from sqlalchemy import text
+        from services.exporter import export_chunks
+        from services.transaction_list import transaction_rows
+        with app.app_context():
+            db.session.execute(text(
+                "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 50000) "
+                "INSERT INTO transactions (account_id, amount, date, description) "
+                "SELECT :account_id, -125, date('2020-01-01', '+' || (i % 2000) || ' days'), "
+                "'Exported row number ' || i FROM n"
+            ), {'account_id': user_with_accounts['account1_id']})
+            db.session.commit()
+            
+            rows = transaction_rows(user_with_accounts['user_id']) \
+                .order_by(Transaction.date, Transaction.id).yield_per(500)
+            tracemalloc.start()
+            try:
+                size = sum(len(chunk) for chunk in export_chunks(rows, 'csv'))
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+        
+        assert size > 3_000_000
+        assert peak < 2 * 1024 * 1024
+
+
+class TestBulkActions:
+    """Tests for bulk recategorize / move / delete."""
+    
+    def add_rows(self, app, data, count, description='Coffee shop'):
+        """Add `count` uncategorized expenses of 2.00 to the first account (balance adjusted)."""
+        with app.app_context():
+            account = db.session.get(Account, data['account1_id'])
+            for i in range(count):
+                db.session.add(Transaction(account_id=account.id, amount=-2.00,
+                                           description=description, date=date(2026, 1 + i % 3, 1)))
+                account.balance -= 2.00
+            db.session.commit()
+    
+    def rollups_match_rebuild(self, user_id):
+        """Are the incrementally kept rollups the same as freshly rebuilt ones?"""
+        from models import MonthlyRollup
+        from services import rollups
+        
+        def snapshot():
+            return sorted(
+                (r.account_id, r.category_id, r.year, r.month, round(r.income_total, 2),
+                 round(r.expense_total, 2), r.income_count, r.expense_count)
+                for r in MonthlyRollup.query.filter_by(user_id=user_id).all()
+                if r.income_count or r.expense_count
+            )
+        
+        kept = snapshot()
+        rollups.rebuild(user_id)
+        return kept == snapshot()
+    
+    def test_recategorize_by_filter(self, client, app, user_with_accounts):
+        """All matching transactions get the category in one request; rollups follow."""
+        data = user_with_accounts
+        self.add_rows(app, data, 6)
+        self.add_rows(app, data, 2, description='Rent')
+        
+        response = client.post('/transactions/bulk', data={
+            'action': 'recategorize', 'category_id': data['category_id'],
+            'account': data['account1_id'], 'max_amount': '2', 'start': '2026-02-01'
+        }, follow_redirects=True)
+        
+        assert b'recategorized' in response.data
+        with app.app_context():
+            categorized = Transaction.query.filter_by(category_id=data['category_id']).all()
+            assert len(categorized) == 5  # 6 + 2 rows, minus the 3 in January
+            assert all(t.date >= date(2026, 2, 1) for t in categorized)
+            assert self.rollups_match_rebuild(data['user_id'])
+    
+    def test_delete_by_ids_adjusts_balance(self, client, app, user_with_accounts):
+        """Deleting picked ids restores the balance with one delta per account."""
+        data = user_with_accounts
+        self.add_rows(app, data, 4)
+        with app.app_context():
+            ids = [t.id for t in Transaction.query.filter_by(account_id=data['account1_id']).all()][:3]
+        
+        client.post('/transactions/bulk', data={'action': 'delete', 'id': ids})
+        
+        with app.app_context():
+            assert Transaction.query.filter_by(account_id=data['account1_id']).count() == 1
+            assert db.session.get(Account, data['account1_id']).balance == pytest.approx(998.00)
+            assert self.rollups_match_rebuild(data['user_id'])
+    
+    def test_move_account(self, client, app, user_with_accounts):
+        """Moving transactions moves their amounts between balances and updates fingerprints."""
+        from services.duplicates import fingerprint
+        data = user_with_accounts
+        self.add_rows(app, data, 5)
+        
+        client.post('/transactions/bulk', data={
+            'action': 'move_account', 'account_id': data['account2_id'], 'account': data['account1_id']
+        })
+        
+        with app.app_context():
+            moved = Transaction.query.filter_by(account_id=data['account2_id']).all()
+            assert len(moved) == 5
+            assert all(t.fingerprint == fingerprint(t.account_id, t.date, t.amount, t.description)
+                       for t in moved)
+            assert db.session.get(Account, data['account1_id']).balance == pytest.approx(1000.00)
+            assert db.session.get(Account, data['account2_id']).balance == pytest.approx(4990.00)
+            assert self.rollups_match_rebuild(data['user_id'])
+    
+    def test_other_users_transactions_untouched(self, client, app, user_with_accounts):
+        """Ids of another user's transactions are not matched."""
+        with app.app_context():
+            other = User(name='Other', email='other@example.com')
+            other.set_password('password123')
+            db.session.add(other)
+            db.session.flush()
+            account = Account(user_id=other.id, name='Theirs', account_type='bank', balance=10.00)
+            db.session.add(account)
+            db.session.flush()
+            theirs = Transaction(account_id=account.id, amount=-5.00, date=date(2026, 1, 1))
+            db.session.add(theirs)
+            db.session.commit()
+            their_id, their_account_id = theirs.id, account.id
+        
+        client.post('/transactions/bulk', data={'action': 'delete', 'id': [their_id]})
+        
+        with app.app_context():
+            assert db.session.get(Transaction, their_id) is not None
+            assert db.session.get(Account, their_account_id).balance == 10.00
+    
+    def test_needs_ids_or_filters(self, client, app, user_with_accounts):
+        """A bulk delete without a selection does nothing."""
+        data = user_with_accounts
+        self.add_rows(app, data, 2)
+        
+        client.post('/transactions/bulk', data={'action': 'delete'})
+        
+        with app.app_context():
+            assert Transaction.query.filter_by(account_id=data['account1_id']).count() == 2
+    
+    def test_rows_are_locked_before_the_totals(self, app, user_with_accounts):
+        """The picked rows are read FOR UPDATE before they are added up and changed."""
+        from sqlalchemy import event
+        from sqlalchemy.dialects import postgresql
+        from services.bulk_actions import bulk_update
+        data = user_with_accounts
+        self.add_rows(app, data, 3)
+        
+        with app.app_context():
+            ids = [t.id for t in Transaction.query.filter_by(account_id=data['account1_id']).all()]
+            statements = []
+            
+            def before_execute(conn, clauseelement, multiparams, params, execution_options):
+                statements.append(str(clauseelement.compile(dialect=postgresql.dialect())))
+            
+            event.listen(db.engine, 'before_execute', before_execute)
+            try:
+                bulk_update(data['user_id'], 'recategorize', ids=ids, category_id=data['category_id'])
+            finally:
+                event.remove(db.engine, 'before_execute', before_execute)
+            db.session.rollback()
+        
+        assert statements[0].startswith('SELECT transactions.id')
+        assert statements[0].endswith('FOR UPDATE OF transactions')
+        assert 'sum(' in statements[1]
+        assert statements[2].startswith('UPDATE transactions')
+    
+    def test_statement_count_does_not_grow_with_rows(self, client, app, user_with_accounts):
+        """Recategorizing 300 rows runs about as many statements as 3 rows."""
+        from sqlalchemy import event
+        data = user_with_accounts
+        
+        def count_statements():
+            statements = []
+            
+            def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+                statements.append(statement)
+            
+            with app.app_context():
+                event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+                try:
+                    client.post('/transactions/bulk', data={
+                        'action': 'recategorize', 'category_id': data['category_id'],
+                        'account': data['account1_id'], 'uncategorized': '1'
+                    })
+                finally:
+                    event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+            return len(statements)
+        
+        self.add_rows(app, data, 3)
+        few = count_statements()
+        self.add_rows(app, data, 300)
+        many = count_statements()
+        
+        assert many == few
+
+
+class TestConcurrentBalanceUpdates:
+    """Parallel requests must not lose balance updates (phone and laptop at once)."""
+    
+    THREADS = 8
+    
+    @pytest.fixture
+    def file_app(self, tmp_path, monkeypatch):
+        """An app on a SQLite file, so every thread gets its own connection."""
+        from config import config, TestingConfig
+        
+        class ConcurrentConfig(TestingConfig):
+            DEBUG = False  # no demo data
+            SQLALCHEMY_DATABASE_URI = f'sqlite:///{tmp_path / "concurrent.db"}'
+            SQLALCHEMY_ENGINE_OPTIONS = {'connect_args': {'timeout': 30}}
+        
+        monkeypatch.setitem(config, 'concurrent', ConcurrentConfig)
+        app = create_app('concurrent')
+        with app.app_context():
+            user = User(name='Test User', email='test@example.com')
+            user.set_password('password123')
+            db.session.add(user)
+            db.session.flush()
+            checking = Account(user_id=user.id, name='Checking', account_type='bank', balance=100.00)
+            savings = Account(user_id=user.id, name='Savings', account_type='savings', balance=0.00)
+            db.session.add_all([checking, savings])
+            db.session.commit()
+            ids = (checking.id, savings.id)
+        yield app, ids
+        with app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+    
+    def run_in_threads(self, app, post):
+        """Call post(client) from THREADS threads at once, each with its own logged-in client."""
+        import threading
+        start = threading.Barrier(self.THREADS)
+        errors = []
+        
+        def worker():
+            client = app.test_client()
+            client.post('/auth/login', data={'email': 'test@example.com', 'password': 'password123'})
+            start.wait()
+            try:
+                post(client)
+            except Exception as error:  # surfaced in the main thread
+                errors.append(error)
+        
+        threads = [threading.Thread(target=worker) for _ in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert errors == []
+    
+    def test_parallel_adds_keep_every_update(self, file_app):
+        """8 threads x 10 expenses of 1.00 take exactly 80.00 off the balance."""
+        app, (checking_id, savings_id) = file_app
+        
+        def post(client):
+            for i in range(10):
+                response = client.post('/transactions/add', data={
+                    'amount': '1.00', 'type': 'expense', 'account_id': checking_id,
+                    'date': '2026-03-01', 'description': f'Parallel {i}'
+                })
+                assert response.status_code == 302
+        
+        self.run_in_threads(app, post)
+        
+        with app.app_context():
+            assert Transaction.query.count() == 80
+            assert db.session.get(Account, checking_id).balance == pytest.approx(20.00)
+    
+    def test_parallel_transfers_never_overdraw(self, file_app):
+        """Transfers racing for the same money: only as many succeed as the balance covers."""
+        app, (checking_id, savings_id) = file_app
+        
+        def post(client):
+            for _ in range(3):
+                client.post('/transactions/transfer', data={
+                    'from_account_id': checking_id, 'to_account_id': savings_id,
+                    'amount': '20.00', 'date': '2026-03-01'
+                })
+        
+        self.run_in_threads(app, post)
+        
+        with app.app_context():
+            assert db.session.get(Account, checking_id).balance == pytest.approx(0.00)
+            assert db.session.get(Account, savings_id).balance == pytest.approx(100.00)
+            assert Transaction.query.count() == 10  # 5 transfers, two rows each
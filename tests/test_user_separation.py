@@ -15,7 +15,7 @@ from datetime import date
 @pytest.fixture
 def app():
     """Create a test app with a temporary database."""
-    app = create_app()
+    app = create_app('testing')
     app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'  # Use in-memory DB
     app.config['TESTING'] = True
     app.config['WTF_CSRF_ENABLED'] = False  # Disable CSRF for testing
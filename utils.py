@@ -39,3 +39,23 @@ def get_currency_symbol(currency_code):
         'CAD': 'C$',
     }
     return currency_symbols.get(currency_code, currency_code)
+
+
+def chunked(pieces, size=8192):
+    """
+    Join many small strings into chunks of about `size` characters.
+    
+    Used for streamed responses: a template yields lots of tiny strings,
+    sending each one separately would be slow.
+    """
+    buffer = []
+    length = 0
+    for piece in pieces:
+        buffer.append(piece)
+        length += len(piece)
+        if length >= size:
+            yield ''.join(buffer)
+            buffer = []
+            length = 0
+    if buffer:
+        yield ''.join(buffer)